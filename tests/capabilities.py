@@ -4,12 +4,15 @@
 # See the COPYING file in the top-level directory.
 
 import os
+import tempfile
 import unittest
+from unittest import mock
 
 from tests import utils
 
 from virtinst import Capabilities
 from virtinst import DomainCapabilities
+from virtinst import capscache
 
 
 class TestCapabilities(unittest.TestCase):
@@ -59,6 +62,54 @@ class TestCapabilities(unittest.TestCase):
         self.assertEqual(cells[0].cpus[3].id, '3')
 
 
+    def testCapsCache(self):
+        conn = utils.URIs.open_testdefault_cached()
+        capsxml = open(
+            "tests/capabilities-xml/test-qemu-with-kvm.xml").read()
+        fetched = []
+        def _fetch():
+            fetched.append(1)
+            return capsxml
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            def _lookup():
+                cache = capscache.CapsCache(conn, tmpdir)
+                return cache.get_capabilities(_fetch)
+
+            # Second lookup is served from disk by a new cache instance
+            self.assertEqual(_lookup(), capsxml)
+            self.assertEqual(_lookup(), capsxml)
+            self.assertEqual(len(fetched), 1)
+
+            # Daemon version change invalidates the cache
+            with mock.patch.object(conn, "daemon_version",
+                                   return_value=1):
+                _lookup()
+            self.assertEqual(len(fetched), 2)
+
+            # So does age
+            with mock.patch.object(capscache.CapsCache, "MAX_AGE", -1):
+                _lookup()
+            self.assertEqual(len(fetched), 3)
+
+            # domcapabilities share the file, keyed by their parameters
+            def _lookup_domcaps(arch):
+                cache = capscache.CapsCache(conn, tmpdir)
+                return cache.get_domain_capabilities("/usr/bin/qemu-kvm",
+                        arch, None, "kvm", lambda: _fetch() and arch)
+            self.assertEqual(_lookup_domcaps("x86_64"), "x86_64")
+            self.assertEqual(_lookup_domcaps("i686"), "i686")
+            self.assertEqual(_lookup_domcaps("x86_64"), "x86_64")
+            self.assertEqual(_lookup(), capsxml)
+            self.assertEqual(len(fetched), 5)
+
+            cache = capscache.CapsCache(conn, tmpdir)
+            cache.clear()
+            _lookup()
+            _lookup_domcaps("x86_64")
+            self.assertEqual(len(fetched), 7)
+
+
     ##############################
     # domcapabilities.py testing #
     ##############################
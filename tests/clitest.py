@@ -31,7 +31,6 @@ TMP_IMAGE_DIR = "/tmp/__virtinst_cli_"
 XMLDIR = "tests/cli-test-xml"
 OLD_OSINFO = utils.has_old_osinfo()
 NO_OSINFO_UNATTEND = not unattended.OSInstallScript.have_new_libosinfo()
-HAS_ISOINFO = shutil.which("isoinfo")
 
 # Images that will be created by virt-install/virt-clone, and removed before
 # each run
@@ -99,11 +98,6 @@ def has_old_osinfo():
         return "osinfo is too old"
 
 
-def missing_isoinfo():
-    if not HAS_ISOINFO:
-        return "isoinfo not installed"
-
-
 def no_osinfo_unattend_cb():
     if NO_OSINFO_UNATTEND:
         return "osinfo is too old for unattended testing"
@@ -939,8 +933,8 @@ c.add_compare("--arch s390x --machine s390-ccw-virtio --connect " + utils.URIs.k
 c.add_compare("--connect " + utils.URIs.kvm_session + " --disk size=8 --os-variant fedora21 --cdrom %(EXISTIMG1)s", "kvm-session-defaults", prerun_check=has_old_osinfo)
 
 # misc KVM config tests
-c.add_compare("--disk none --location %(ISO-NO-OS)s,kernel=frib.img,initrd=/frob.img", "location-manual-kernel", prerun_check=missing_isoinfo)  # --location with an unknown ISO but manually specified kernel paths
-c.add_compare("--disk %(EXISTIMG1)s --location %(ISOTREE)s --nonetworks", "location-iso", prerun_check=missing_isoinfo)  # Using --location iso mounting
+c.add_compare("--disk none --location %(ISO-NO-OS)s,kernel=frib.img,initrd=/frob.img", "location-manual-kernel")  # --location with an unknown ISO but manually specified kernel paths
+c.add_compare("--disk %(EXISTIMG1)s --location %(ISOTREE)s --nonetworks", "location-iso")  # Using --location iso mounting
 c.add_compare("--disk %(EXISTIMG1)s --cdrom %(ISOLABEL)s", "cdrom-centos-label")  # Using --cdrom with centos CD label, should use virtio etc.
 c.add_compare("--disk %(EXISTIMG1)s --install bootdev=network --os-variant rhel5.4", "kvm-rhel5")  # RHEL5 defaults
 c.add_compare("--disk %(EXISTIMG1)s --install kernel=%(ISO-WIN7)s,initrd=%(ISOLABEL)s,kernel_args='foo bar' --os-variant rhel6.4", "kvm-rhel6")  # RHEL6 defaults. ISO paths are just to point at existing files
@@ -1106,6 +1100,16 @@ c.add_valid("test-state-shutoff --edit --boot menu=on", grep="XML did not change
 c.add_valid("test-for-virtxml --edit --graphics password=foo --update --confirm", input_text="no\nno\n")  # prompt exiting
 c.add_valid("test-for-virtxml --edit --cpu host-passthrough --no-define --start --confirm", input_text="no")  # transient prompt exiting
 c.add_valid("test-for-virtxml --edit --metadata name=test-for-virtxml", grep="requested changes will have no effect")
+c.add_valid("test-for-virtxml --no-cache --edit --vcpus 7 --print-diff")  # --no-cache parsing
+c.add_valid("test-clone test-clone-simple --edit --vcpus 7 --print-diff", grep="2 of 2 domains edited successfully")  # batch mode, multiple domains
+c.add_valid("1 test-clone-simple --edit --vcpus 7 --print-diff", grep="2 of 2 domains edited successfully")  # batch mode, domain ID
+c.add_valid("'test-state-*' --filter shutoff --edit --vcpus 3 --no-define --jobs 2", grep="test-state-shutoff")  # batch mode, glob and state filter
+c.add_valid("--all --filter paused --edit --boot menu=on --print-xml", grep="test-state-paused")  # batch mode, --all selector
+c.add_valid("'idontexist-*' --edit --vcpus 7", grep="No domains matched")  # batch glob matching nothing
+c.add_invalid("test idontexist --edit --vcpus 7", grep="Could not find domain 'idontexist'")  # batch with unknown domain
+c.add_invalid("--all --edit --vcpus 7 --confirm", grep="Can't use --confirm with multiple domains")
+c.add_invalid("--all --build-xml --disk /tmp/foo", grep="Can't use --build-xml with multiple domains")
+c.add_invalid("test test-many-devices --edit 50 --disk cache=none --print-diff", grep="0 of 2 domains edited successfully")  # batch with per-domain failure
 c.add_invalid("test --edit 2 --events on_poweroff=destroy", grep="'--edit 2' doesn't make sense with --events")
 c.add_invalid("test --os-variant fedora26 --edit --cpu host-passthrough", grep="--os-variant is not supported")
 c.add_invalid("test-for-virtxml --os-variant fedora26 --remove-device --disk 1", grep="--os-variant is not supported")
@@ -209,3 +209,36 @@ class TestClone(unittest.TestCase):
         cloner = Cloner(conn)
         self.assertEqual(
                 cloner.generate_clone_name("test-clone5"), "test-clone6")
+
+    def testCloneLocalSparse(self):
+        """
+        Test local file cloning copies data correctly, and only
+        allocates blocks for non-zero data when sparse=True
+        """
+        from virtinst import progress
+        from virtinst.diskbackend import CloneStorageCreator
+        conn = utils.URIs.open_testdriver_cached()
+
+        size = 16 * 1024 * 1024
+        with open(FILE1, "wb") as f:
+            f.truncate(size)
+            f.seek(1024 * 1024)
+            f.write(os.urandom(512 * 1024 + 100))
+            f.seek(4 * 1024 * 1024)
+            f.write(b"\0" * (2 * 1024 * 1024))
+            f.seek(10 * 1024 * 1024)
+            f.write(os.urandom(8192))
+        origdata = open(FILE1, "rb").read()
+
+        for sparse in [True, False]:
+            os.unlink(FILE2)
+            creator = CloneStorageCreator(conn, FILE2, FILE1,
+                    size / 1024.0 / 1024.0 / 1024.0, sparse)
+            creator.create(progress.make_meter(quiet=True))
+
+            self.assertEqual(open(FILE2, "rb").read(), origdata)
+            allocated = os.stat(FILE2).st_blocks * 512
+            if sparse:
+                self.assertTrue(allocated < 2 * 1024 * 1024)
+            else:
+                self.assertTrue(allocated >= size)
@@ -0,0 +1,75 @@
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from virtManager.lib import consolebuffer
+
+
+class TestConsoleBuffer(unittest.TestCase):
+    """
+    Tests for the serial console buffers in consolebuffer.py
+    """
+    def testBuffer(self):
+        buf = consolebuffer.ConsoleBuffer()
+        self.assertFalse(buf)
+
+        buf.append(b"hello ")
+        buf.append(b"world")
+        self.assertEqual(len(buf), 11)
+        self.assertEqual(buf.peek(5), b"hello")
+        self.assertEqual(len(buf), 11)
+
+        self.assertEqual(buf.take(6), b"hello ")
+        buf.append(b"!")
+        self.assertEqual(buf.take(), b"world!")
+        self.assertFalse(buf)
+
+        buf.append(b"abc")
+        buf.consume(100)
+        self.assertEqual(len(buf), 0)
+        buf.append(b"abc")
+        buf.clear()
+        self.assertEqual(buf.take(), b"")
+
+    def testLogWriterRotation(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "console.log")
+            with open(path, "wb") as f:
+                f.write(b"old")
+
+            with mock.patch.object(consolebuffer.ConsoleLogWriter,
+                                   "MAX_SIZE", 10):
+                writer = consolebuffer.ConsoleLogWriter(path)
+                # Appends to the existing file, until it would
+                # grow past MAX_SIZE
+                writer.write(b"12345")
+                writer.flush()
+                self.assertEqual(open(path, "rb").read(), b"old12345")
+
+                writer.write(b"abcde")
+                writer.flush()
+                self.assertEqual(open(path + ".old", "rb").read(),
+                                 b"old12345")
+                self.assertEqual(open(path, "rb").read(), b"abcde")
+
+                # A single write bigger than MAX_SIZE goes to a new file
+                writer.write(b"x" * 20)
+                writer.close()
+                self.assertEqual(open(path + ".old", "rb").read(),
+                                 b"abcde")
+                self.assertEqual(open(path, "rb").read(), b"x" * 20)
+
+                # close() is safe to repeat. Writing reopens the file,
+                # which is already too big, so it's rotated first
+                writer.close()
+                writer.write(b"y")
+                writer.close()
+                self.assertEqual(open(path + ".old", "rb").read(),
+                                 b"x" * 20)
+                self.assertEqual(open(path, "rb").read(), b"y")
@@ -8,6 +8,7 @@ import unittest
 
 from virtinst import Guest
 from virtinst import OSDB
+from virtinst import osdict
 from virtinst.install import urldetect
 
 from tests import utils
@@ -28,6 +29,24 @@ class TestOSDB(unittest.TestCase):
     def test_list_os(self):
         OSDB.list_os()
 
+    def test_lazy_db_load(self):
+        # pylint: disable=protected-access
+        db = osdict._OSDB()
+        generic = db.lookup_os("generic")
+        self.assertEqual(generic.name, "generic")
+        self.assertTrue(db._OSDB__all_variants is None)
+
+        f26 = db.lookup_os("fedora26")
+        self.assertTrue(db.lookup_os_by_full_id(f26.full_id) is f26)
+        self.assertEqual(db.lookup_os_by_full_id("http://example.com/os"),
+                         None)
+
+        # The sorted list is cached, but callers get their own copy
+        oslist = db.list_os()
+        self.assertTrue(oslist[-1] is generic)
+        self.assertTrue(oslist is not db.list_os())
+        self.assertEqual(oslist, db.list_os())
+
     def test_recommended_resources(self):
         conn = utils.URIs.open_testdefault_cached()
         guest = Guest(conn)
@@ -0,0 +1,95 @@
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import unittest
+
+from virtinst import pollhelpers
+
+from tests import utils
+
+
+class TestPollHelpers(unittest.TestCase):
+    """
+    Test incremental polling in virtinst.pollhelpers
+    """
+    def _fetch(self, func, conn, origmap, pollcache):
+        # Mimic virt-manager: build a fresh keymap from the previous
+        # 'current' list every poll
+        return func(conn, dict(origmap),
+                    lambda obj, key: obj, pollcache=pollcache)
+
+    def _check_incremental(self, func, listrpcs=1):
+        conn = utils.URIs.open_testdriver_cached()
+        pollcache = pollhelpers.PollCache()
+
+        gone, new, current = self._fetch(func, conn, {}, None)
+        self.assertFalse(gone)
+        self.assertTrue(new)
+        fullmap = dict((obj.name(), obj) for obj in current)
+
+        # First incremental poll reports everything as new
+        pollcache.start_poll()
+        gone, new, current = self._fetch(func, conn, {}, pollcache)
+        self.assertEqual(len(new), len(fullmap))
+        self.assertTrue(pollcache.finish_poll() >= 1)
+        origmap = dict((obj.name(), obj) for obj in current)
+
+        # Unchanged list result: no deltas, and only the list RPCs
+        pollcache.start_poll()
+        gone, new, current = self._fetch(func, conn, origmap, pollcache)
+        self.assertFalse(gone)
+        self.assertFalse(new)
+        self.assertEqual(sorted(o.name() for o in current),
+                         sorted(origmap))
+        self.assertEqual(pollcache.finish_poll(), listrpcs)
+
+        # An object the caller dropped is reported as new again
+        name = sorted(origmap)[0]
+        del(origmap[name])
+        gone, new, current = self._fetch(func, conn, origmap, pollcache)
+        self.assertFalse(gone)
+        self.assertEqual([o.name() for o in new], [name])
+        self.assertEqual(len(current), len(fullmap))
+
+    def testIncrementalVMs(self):
+        self._check_incremental(pollhelpers.fetch_vms)
+
+    def testIncrementalPools(self):
+        self._check_incremental(pollhelpers.fetch_pools)
+
+    def testIncrementalNodedevs(self):
+        self._check_incremental(pollhelpers.fetch_nodedevs)
+
+    def testIncrementalExternalRename(self):
+        # Fresh connection, since we change driver state
+        conn = utils.URIs.openconn(utils.URIs.test_default)
+        pollcache = pollhelpers.PollCache()
+        gone, new, current = self._fetch(
+                pollhelpers.fetch_vms, conn, {}, pollcache)
+        origmap = dict((obj.name(), obj) for obj in current)
+        self.assertTrue("test" in origmap)
+
+        # Like 'virsh domrename', behind the PollCache's back
+        dom = conn.lookupByName("test")
+        dom.destroy()
+        dom.rename("test-renamed", 0)
+
+        gone, new, current = self._fetch(
+                pollhelpers.fetch_vms, conn, origmap, pollcache)
+        self.assertEqual([obj.name() for obj in gone], ["test"])
+        self.assertEqual([obj.name() for obj in new], ["test-renamed"])
+        origmap = dict((obj.name(), obj) for obj in current)
+        self.assertEqual(sorted(origmap), ["test-renamed"])
+
+        # And it converges
+        gone, new, current = self._fetch(
+                pollhelpers.fetch_vms, conn, origmap, pollcache)
+        self.assertFalse(gone)
+        self.assertFalse(new)
+
+    def testIncrementalOldPoll(self):
+        pollhelpers.FORCE_OLD_POLL = True
+        try:
+            self._check_incremental(pollhelpers.fetch_nets, listrpcs=2)
+        finally:
+            pollhelpers.FORCE_OLD_POLL = False
@@ -0,0 +1,66 @@
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+# Generous, the point is catching things like gi or requests creeping
+# back into every command, they pull in dozens of modules each
+MAX_MODULES = 275
+HEAVY_MODULES = ["gi", "requests", "virtinst.install.installer",
+                 "virtinst.install.urlfetcher"]
+
+_MODULES_SCRIPT = """
+import json, runpy, sys
+sys.argv = %r
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit:
+    pass
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Check what simple CLI commands import
+    """
+    def _get_modules(self, argv):
+        out = subprocess.check_output(
+                [sys.executable, "-c", _MODULES_SCRIPT % argv],
+                universal_newlines=True)
+        return json.loads(out.splitlines()[-1])
+
+    def testSimpleCommandImports(self):
+        for app in ["virt-install", "virt-clone", "virt-xml"]:
+            modules = self._get_modules(["./" + app, "--version"])
+            for heavy in HEAVY_MODULES:
+                self.assertFalse(heavy in modules,
+                        "%s --version imported %s" % (app, heavy))
+            self.assertTrue(len(modules) <= MAX_MODULES,
+                    "%s --version imported %d modules, limit is %d" %
+                    (app, len(modules), MAX_MODULES))
+
+    def testProfileStartup(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = os.environ.copy()
+            env["XDG_CACHE_HOME"] = tmpdir
+            proc = subprocess.run(
+                    ["./virt-xml", "--profile-startup", "--version"],
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True, env=env)
+            self.assertEqual(proc.returncode, 0)
+            self.assertTrue(proc.stdout.strip())
+            self.assertTrue("Slowest imports" in proc.stderr)
+
+            outdir = os.path.join(tmpdir, "virt-manager")
+            self.assertTrue(os.path.exists(
+                os.path.join(outdir, "virt-xml-startup.prof")))
+            with open(os.path.join(
+                    outdir, "virt-xml-startup.importtime")) as f:
+                self.assertTrue("virtinst" in f.read())
@@ -0,0 +1,413 @@
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+
+import virtinst
+from virtinst import osdict
+from virtinst import progress
+from virtinst import xmlapi
+from virtinst.install import urlfetcher
+
+# virtManager.config has to come before anything importing baseclass,
+# like it does when virt-manager starts
+import virtManager.config  # pylint: disable=unused-import
+from virtManager.details import serialcon
+
+from tests import utils
+
+
+# pylint: disable=protected-access
+
+MANY_DEVICES_XML = "tests/cli-test-xml/compare/virt-install-many-devices.xml"
+
+
+def _timeit(cb, iterations):
+    start = time.time()
+    for ignore in range(iterations):
+        cb()
+    return time.time() - start
+
+
+def _report(name, before, after):
+    print("\n%s: before=%.3fs after=%.3fs speedup=%.1fx" %
+          (name, before, after, before / max(after, 0.000001)))
+
+
+def _domain_xmls():
+    """
+    Return the first domain XML document of every domain test file
+    """
+    ret = []
+    paths = (glob.glob("tests/xmlparse-xml/*.xml") +
+             glob.glob("tests/cli-test-xml/compare/*.xml"))
+    for path in sorted(paths):
+        xml = open(path).read()
+        if not xml.lstrip().startswith("<domain"):
+            continue
+        # virt-install compare files can contain multiple documents
+        ret.append(xml.split("</domain>", 1)[0] + "</domain>")
+    return ret
+
+
+def _parse_all_children(obj):
+    """
+    Instantiate every child object, which is what XMLBuilder parsing
+    did before child properties were parsed on demand
+    """
+    for propname in obj._all_child_props():
+        for child in virtinst.xmlutil.listify(getattr(obj, propname)):
+            _parse_all_children(child)
+
+
+def _read_all_props(obj):
+    """
+    Read every XMLProperty of obj and all of its children
+    """
+    for propname in obj._all_xml_props():
+        getattr(obj, propname)
+    for propname in obj._all_child_props():
+        for child in virtinst.xmlutil.listify(getattr(obj, propname)):
+            _read_all_props(child)
+
+
+class _FakeConsoleStream(object):
+    """
+    Stand in for a libvirt console stream of a guest printing boot
+    logs at full speed. It returns EOF after total bytes, accepts at
+    most sendmax bytes per send, and tracks the events it's asked for
+    """
+    def __init__(self, chunk, total=None, sendmax=4096):
+        self.chunk = chunk
+        self.total = total
+        self.sendmax = sendmax
+        self.received = 0
+        self.sent = 0
+        self.events = 0
+        self.update_cb = None
+
+    def recv(self, nbytes):
+        ret = self.chunk[:nbytes]
+        if self.total is not None:
+            ret = ret[:self.total - self.received]
+        self.received += len(ret)
+        return ret
+
+    def send(self, data):
+        done = min(len(data), self.sendmax)
+        self.sent += done
+        return done
+
+    def eventAddCallback(self, events, cb, opaque):
+        ignore = cb
+        ignore = opaque
+        self.events = events
+
+    def eventUpdateCallback(self, events):
+        self.events = events
+        if self.update_cb:
+            self.update_cb(events)
+
+    def eventRemoveCallback(self):
+        self.events = 0
+
+    def finish(self):
+        pass
+
+
+class _FakeTerminal(object):
+    def __init__(self):
+        self.fed = 0
+        self.feeds = 0
+        self.maxfeed = 0
+
+    def feed(self, data):
+        self.fed += len(data)
+        self.feeds += 1
+        self.maxfeed = max(self.maxfeed, len(data))
+
+
+class TestPerf(unittest.TestCase):
+    """
+    Micro-benchmarks for performance sensitive code paths. These print
+    before/after timings and are not part of the regular test suite
+    """
+    @property
+    def conn(self):
+        return utils.URIs.open_testdefault_cached()
+
+    def _large_domain_xml(self, copies=20):
+        """
+        Build a large domain XML by duplicating the <devices> content
+        of the many-devices test output
+        """
+        xml = open(MANY_DEVICES_XML).read()
+        start = xml.index("<devices>") + len("<devices>")
+        end = xml.index("</devices>")
+        devices = xml[start:end]
+        return xml[:start] + devices * copies + xml[end:]
+
+    def testXMLAPILookupCache(self):
+        """
+        Property reads of a parsed domain with and without the xpath
+        and node lookup caches
+        """
+        guest = virtinst.Guest(self.conn, parsexml=self._large_domain_xml())
+
+        def _uncached_find(api, fullxpath):
+            xpath = xmlapi._XPath(fullxpath).xpath
+            node = api._ctx.xpathEval(xpath)
+            return (node and node[0] or None)
+
+        with mock.patch.object(xmlapi, "_get_xpath", xmlapi._XPath), \
+             mock.patch.object(xmlapi._Libxml2API, "_find", _uncached_find):
+            before = _timeit(lambda: _read_all_props(guest), 5)
+        after = _timeit(lambda: _read_all_props(guest), 5)
+        _report("xmlapi property reads", before, after)
+
+    def testXMLBuilderLazyChildParse(self):
+        """
+        Parse a few thousand domain XMLs and read their name, like
+        list views do, with all child objects instantiated up front
+        versus parsed on demand
+        """
+        xmls = []
+        for xml in _domain_xmls():
+            try:
+                virtinst.Guest(self.conn, parsexml=xml)
+            except Exception:
+                # Some test files are intentionally invalid
+                continue
+            xmls.append(xml)
+        xmls = (xmls * (3000 // len(xmls) + 1))[:3000]
+
+        def _parse(eager):
+            guests = []
+            for xml in xmls:
+                guest = virtinst.Guest(self.conn, parsexml=xml)
+                if eager:
+                    _parse_all_children(guest)
+                guest.name  # pylint: disable=pointless-statement
+                guests.append(guest)
+            return guests
+
+        def _measure(eager):
+            tracemalloc.start()
+            try:
+                start = time.time()
+                guests = _parse(eager)
+                duration = time.time() - start
+                dummy, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(len(guests), len(xmls))
+            return duration, peak
+
+        before, beforemem = _measure(True)
+        after, aftermem = _measure(False)
+        _report("parse %d domains" % len(xmls), before, after)
+        print("parse %d domains: before=%.1fMiB after=%.1fMiB" %
+              (len(xmls), beforemem / 1024.0 / 1024.0,
+               aftermem / 1024.0 / 1024.0))
+
+    def testISOFetcher(self):
+        """
+        Distro detection style lookups against a 10GB DVD sized ISO.
+        The image is a sparse copy of a test suite ISO, so only the
+        directory structure is realistic
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            iso = os.path.join(tmpdir, "dvd.iso")
+            shutil.copy("tests/cli-test-xml/fake-fedora17-tree.iso", iso)
+            os.truncate(iso, 10 * 1024 * 1024 * 1024)
+            meter = progress.make_meter(quiet=True)
+
+            def _detect():
+                fetcher = urlfetcher.fetcherForURI(iso, tmpdir, meter)
+                for path in [".treeinfo", "images/pxeboot/vmlinuz",
+                             "images/pxeboot/initrd.img", ".discinfo",
+                             "current/images/netboot/mini.iso"]:
+                    fetcher.hasFile(path)
+                fetcher.acquireFileContent(".treeinfo")
+                os.unlink(fetcher.acquireFile("images/pxeboot/vmlinuz"))
+                fetcher._cleanup()
+
+            def _isoinfo_detect():
+                # What each of those lookups cost before
+                subprocess.check_output(
+                        ["isoinfo", "-J", "-i", iso, "-f"])
+                for path in ["/.treeinfo", "/images/pxeboot/vmlinuz"]:
+                    subprocess.check_output(
+                            ["isoinfo", "-J", "-i", iso, "-x", path])
+
+            after = _timeit(_detect, 10) / 10
+            if shutil.which("isoinfo"):
+                before = _timeit(_isoinfo_detect, 10) / 10
+                _report("ISO distro detection", before, after)
+            else:
+                print("\nISO distro detection: after=%.4fs "
+                      "(isoinfo not installed)" % after)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def testOSDBLookups(self):
+        """
+        Repeated list_os and full ID lookups, like the oslist widget
+        and guest XML parsing do, versus re-sorting and scanning the
+        whole OS list each time
+        """
+        db = osdict.OSDB
+        ids = [o.full_id for o in db.list_os() if o.full_id][::10]
+
+        def _old():
+            osdict._sort(db._all_variants)
+            for full_id in ids:
+                for osobj in db._all_variants.values():
+                    if osobj.full_id == full_id:
+                        break
+
+        def _new():
+            db.list_os()
+            for full_id in ids:
+                db.lookup_os_by_full_id(full_id)
+
+        before = _timeit(_old, 20)
+        after = _timeit(_new, 20)
+        _report("OSDB list_os + %d full ID lookups" % len(ids),
+                before, after)
+
+    def testOSDBStartup(self):
+        """
+        Process startup cost of creating a default Guest, with and
+        without a real os-variant, which is what loads the libosinfo DB
+        """
+        script = ("import virtinst; from tests import utils; "
+                  "conn = utils.URIs.open_testdefault_cached(); "
+                  "g = virtinst.Guest(conn); g.set_os_name('%s')")
+
+        def _run(osname):
+            subprocess.check_call([sys.executable, "-c", script % osname])
+
+        generic = _timeit(lambda: _run("generic"), 3) / 3
+        fedora = _timeit(lambda: _run("fedora26"), 3) / 3
+        print("\nstartup: without osinfo=%.3fs with osinfo=%.3fs" %
+              (generic, fedora))
+
+    def testConsoleBuffer(self):
+        """
+        Serial console data flow with a busy main loop: 256 reads of
+        16KiB queue up between terminal updates, and a 1MiB paste is
+        sent in 4KiB pieces. Old bytes/str concatenation and slicing,
+        feeding everything per update, versus ConsoleConnection driven
+        through its stream and terminal callbacks
+        """
+        import libvirt
+
+        chunk = b"[    0.000000] Linux version 6.0 (kernel@build) #1 SMP\n"
+        chunk = (chunk * (16 * 1024 // len(chunk) + 1))[:16 * 1024]
+        paste = "x" * 1024 * 1024
+        reads_per_frame = 256
+        frames = 8
+        total = frames * reads_per_frame * len(chunk)
+        readable = libvirt.VIR_STREAM_EVENT_READABLE
+        writable = libvirt.VIR_STREAM_EVENT_WRITABLE
+        console_cls = serialcon.ConsoleConnection
+
+        def _old():
+            stream = _FakeConsoleStream(chunk)
+            terminal = _FakeTerminal()
+            for ignore in range(frames):
+                queued = b""
+                for ignore2 in range(reads_per_frame):
+                    queued += stream.recv(1024 * 100)
+                terminal.feed(queued)
+
+            tosend = paste
+            while tosend:
+                done = stream.send(tosend.encode())
+                tosend = tosend[done:]
+            return terminal.fed, stream.sent
+
+        def _new(history=None):
+            stream = _FakeConsoleStream(chunk, total)
+            terminal = _FakeTerminal()
+            vm = mock.Mock()
+            vm.conn.get_backend.return_value.newStream.return_value = stream
+            console = console_cls(vm)
+            with mock.patch.object(console_cls, "_open_log"):
+                console.open(None, terminal)
+            if history is not None:
+                stream.update_cb = lambda events: history.append(
+                    (events, len(console.streamToTerminal)))
+
+            # Stand in for the main loop: deliver the stream events
+            # the console asked for, and run its pending display_data
+            # timeout once per frame
+            timeouts = []
+            def _timeout_add(interval, cb, *args):
+                ignore = interval
+                timeouts.append((cb, args))
+                return len(timeouts)
+
+            with mock.patch.object(serialcon.GLib, "timeout_add",
+                                   _timeout_add):
+                console.send_data(None, paste, len(paste), terminal)
+                while console.is_open() or timeouts:
+                    for ignore in range(reads_per_frame):
+                        events = stream.events & (readable | writable)
+                        if not console.is_open() or not events:
+                            break
+                        console._event_on_stream(stream, events, terminal)
+                    if timeouts:
+                        cb, args = timeouts[0]
+                        if not cb(*args):
+                            timeouts.pop(0)
+            return terminal, stream
+
+        def _new_totals():
+            terminal, stream = _new()
+            return terminal.fed, stream.sent
+
+        expected = (total, len(paste))
+        self.assertEqual(_old(), expected)
+
+        history = []
+        terminal, stream = _new(history)
+        self.assertEqual((terminal.fed, stream.sent), expected)
+        self.assertTrue(terminal.maxfeed <= console_cls._FEED_MAX)
+        self.assertTrue(terminal.feeds < total // len(chunk))
+
+        # READABLE is dropped above the high water mark, and only
+        # requested again once the backlog is below the low water mark
+        paused = []
+        resumed = []
+        reading = True
+        for events, queued in history:
+            if reading == bool(events & readable):
+                continue
+            reading = not reading
+            if reading:
+                resumed.append(queued)
+            else:
+                paused.append(queued)
+        self.assertTrue(paused)
+        self.assertTrue(resumed)
+        self.assertTrue(all(q > console_cls._HIGH_WATER for q in paused))
+        self.assertTrue(all(q < console_cls._LOW_WATER for q in resumed))
+
+        before = _timeit(_old, 1)
+        after = _timeit(_new_totals, 1)
+        _report("console %dMiB output + 1MiB paste" %
+                (expected[0] // 1024 // 1024), before, after)
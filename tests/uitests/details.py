@@ -74,6 +74,32 @@ class Details(uiutils.UITestCase):
         """
         self._testRename("test-clone-simple", "test-new-name")
 
+    def testDetailsRenameDelete(self):
+        """
+        Rename a VM, then delete it, and make sure the manager
+        row follows both
+        """
+        self._testRename("test-clone-simple", "test-new-name")
+
+        vmwindow = self.app.root.find("test-new-name on", "frame")
+        vmwindow.find("Virtual Machine", "menu").click()
+        vmwindow.find("Delete", "menu item").click()
+
+        delete = self.app.root.find_fuzzy("Delete", "frame")
+        delete.find_fuzzy("Delete", "button").click()
+        alert = self.app.root.find("vmm dialog", "alert")
+        alert.find_fuzzy("Yes", "push button").click()
+        uiutils.check_in_loop(lambda: vmwindow.showing is False)
+
+        # No ghost row is left behind
+        manager = self.app.topwin
+        def _has_row():
+            cells = manager.findChildren(
+                    lambda w: w.roleName == "table cell" and
+                    "test-new-name" in (w.name or ""))
+            return bool(cells)
+        uiutils.check_in_loop(lambda: not _has_row())
+
     def testDetailsRenameNVRAM(self):
         """
         Rename a VM that will trigger the nvram behavior
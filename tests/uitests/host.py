@@ -91,3 +91,21 @@ class Host(uiutils.UITestCase):
 
         # Do standard xmleditor tests
         self._test_xmleditor_interactions(win, finish)
+
+    def testHostStorageVolumeFilter(self):
+        """
+        Test the volume list name filter, and the background
+        'Used By' column
+        """
+        win = self._open_host_window("Storage").find("storage-grid")
+        win.find("default-pool", "table cell").click()
+        vollist = win.find("vol-list", "table")
+        testvol = vollist.find("testvol1.img", "table cell")
+        vollist.find_fuzzy("test-many-devices", "table cell")
+
+        win.find("vol-filter").text = "backing"
+        uiutils.check_in_loop(lambda: testvol.dead)
+        vollist.find("backingl3.img", "table cell")
+
+        win.find("vol-filter").text = ""
+        vollist.find("testvol1.img", "table cell")
@@ -0,0 +1,315 @@
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from virtinst import progress
+from virtinst.install import isoreader
+from virtinst.install import urldetect
+from virtinst.install import urlfetcher
+
+
+class _RangeHTTPHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Minimal HTTP server that serves server.files, with ETag and
+    Range support. http.server's SimpleHTTPRequestHandler does
+    neither
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self):
+        if self.path in self.server.redirects:
+            self.send_response(302)
+            self.send_header("Location", self.server.redirects[self.path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        content, etag = self.server.files.get(self.path, (None, None))
+        if content is None:
+            self.send_response(self.server.errors.get(self.path, 404))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        start, end = 0, len(content)
+        rangeval = self.headers.get("Range")
+        if rangeval and not self.server.ignore_range:
+            start, end = rangeval.split("=")[1].split("-")
+            start, end = int(start), int(end) + 1
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" %
+                             (start, end - 1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return content[start:end]
+
+    def do_HEAD(self):
+        if self.server.reject_head:
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_headers()
+
+    def do_GET(self):
+        self.server.gets.append((self.path, self.headers.get("Range")))
+        data = self._send_headers()
+        if data is None:
+            return
+
+        if self.server.drop_after is not None:
+            # Simulate a dropped connection partway through
+            data = data[:self.server.drop_after]
+            self.server.drop_after = None
+            self.close_connection = True
+        self.wfile.write(data)
+
+
+class _TestHTTPFetcher(urlfetcher._HTTPURLFetcher):
+    _segment_min_size = 64 * 1024
+
+    def _new_session(self):
+        return requests.Session()
+
+
+class TestHTTPURLFetcher(unittest.TestCase):
+    """
+    Test _HTTPURLFetcher against a local HTTP server
+    """
+    def setUp(self):
+        self.server = http.server.HTTPServer(("127.0.0.1", 0),
+                                             _RangeHTTPHandler)
+        self.server.daemon_threads = True
+        self.server.files = {}
+        self.server.gets = []
+        self.server.drop_after = None
+        self.server.reject_head = False
+        self.server.ignore_range = False
+        self.server.redirects = {}
+        self.server.errors = {}
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.content = os.urandom(256 * 1024)
+        self._set_file("/tree/vmlinuz", self.content, "v1")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmpdir.cleanup()
+
+    def _set_file(self, path, content, etag):
+        self.server.files[path] = (content, '"%s"' % etag)
+
+    def _fetcher(self, cachedir=None):
+        location = "http://127.0.0.1:%d/tree" % self.server.server_port
+        fetcher = _TestHTTPFetcher(location, self.tmpdir.name,
+                progress.make_meter(quiet=True), cachedir=cachedir)
+        self.addCleanup(fetcher._cleanup)
+        return fetcher
+
+    def _acquire(self, cachedir=None, filename="vmlinuz"):
+        fetcher = self._fetcher(cachedir)
+        path = fetcher.acquireFile(filename)
+        with open(path, "rb") as f:
+            content = f.read()
+        os.unlink(path)
+        return content
+
+    def testSegmentedDownload(self):
+        self.assertEqual(self._acquire(), self.content)
+        ranges = sorted(r for p, r in self.server.gets)
+        self.assertEqual(len(ranges), 4)
+        self.assertTrue(all(ranges))
+
+        # Small files are fetched with a single request
+        self.server.gets = []
+        self._set_file("/tree/vmlinuz", b"kernel", "v2")
+        self.assertEqual(self._acquire(), b"kernel")
+        self.assertEqual(self.server.gets,
+                         [("/tree/vmlinuz", "bytes=0-5")])
+
+    def testResume(self):
+        self._set_file("/tree/vmlinuz", self.content[:60000], "v1")
+        self.server.drop_after = 1000
+        self.assertEqual(self._acquire(), self.content[:60000])
+        self.assertEqual([r for p, r in self.server.gets],
+                         ["bytes=0-59999", "bytes=1000-59999"])
+
+    def testDownloadCache(self):
+        cachedir = os.path.join(self.tmpdir.name, "cache")
+        self.assertEqual(self._acquire(cachedir), self.content)
+        self.assertEqual(len(self.server.gets), 4)
+
+        # Served from the cache, without a single GET
+        self.server.gets = []
+        self.assertEqual(self._acquire(cachedir), self.content)
+        self.assertEqual(self.server.gets, [])
+
+        # A changed ETag invalidates it
+        newcontent = os.urandom(len(self.content))
+        self._set_file("/tree/vmlinuz", newcontent, "v2")
+        self.assertEqual(self._acquire(cachedir), newcontent)
+        self.assertEqual(len(self.server.gets), 4)
+
+    def testResumeAcrossRuns(self):
+        cachedir = os.path.join(self.tmpdir.name, "cache")
+        origfetch = _TestHTTPFetcher._fetch_segment
+
+        def _failing_fetch(fetcher, session, url, segment, *args):
+            if segment[0] != 0:
+                raise RuntimeError("simulated failure")
+            return origfetch(fetcher, session, url, segment, *args)
+
+        with mock.patch.object(_TestHTTPFetcher, "_fetch_segment",
+                               _failing_fetch):
+            self.assertRaises(RuntimeError, self._acquire, cachedir)
+
+        # Only the three missing segments are fetched again
+        self.server.gets = []
+        self.assertEqual(self._acquire(cachedir), self.content)
+        self.assertEqual(len(self.server.gets), 3)
+        self.assertTrue("bytes=0-" not in str(self.server.gets))
+
+    def testHeadRejected(self):
+        # Like presigned URLs that only allow GET
+        self.server.reject_head = True
+        self.assertEqual(self._acquire(), self.content)
+        self.assertEqual(self.server.gets, [("/tree/vmlinuz", None)])
+
+    def testRangeIgnored(self):
+        # The segments get whole file replies, fall back to a single GET
+        self.server.ignore_range = True
+        self.assertEqual(self._acquire(), self.content)
+        self.assertEqual(self.server.gets[-1], ("/tree/vmlinuz", None))
+
+        cachedir = os.path.join(self.tmpdir.name, "cache")
+        self.assertEqual(self._acquire(cachedir), self.content)
+        self.assertEqual(self._acquire(cachedir), self.content)
+
+    def testRedirect(self):
+        # Segments are fetched from where HEAD was redirected to
+        self.server.redirects["/tree/mirror"] = "/tree/vmlinuz"
+        self.assertEqual(self._acquire(filename="mirror"), self.content)
+        ranges = [p for p, r in self.server.gets if r]
+        self.assertEqual(ranges, ["/tree/vmlinuz"] * 4)
+
+    def testConcurrentCachedDownloads(self):
+        # The partial download is locked, so the second fetch waits
+        # and uses the first one's result
+        cachedir = os.path.join(self.tmpdir.name, "cache")
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self._acquire(cachedir)))
+            for ignore in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [self.content, self.content])
+        self.assertEqual(len(self.server.gets), 4)
+
+    def testProbeFiles(self):
+        self._set_file("/tree/.treeinfo", b"[general]\n", "t1")
+        self._set_file("/tree/VERSION", b"Mageia 7", "t2")
+        paths = [".treeinfo", "VERSION", "content"]
+
+        fetcher = self._fetcher()
+        self.assertEqual(fetcher.acquireFileContents(paths), {
+            ".treeinfo": "[general]\n", "VERSION": "Mageia 7",
+            "content": None})
+        self.assertEqual(sorted(fetcher.probe_timings), sorted(paths))
+
+        # urldetect memoizes probe results per tree URL
+        self.addCleanup(urldetect._PROBE_CACHE.clear)
+        urldetect._DistroCache(fetcher).prefetch(paths)
+        self.server.gets = []
+        cache = urldetect._DistroCache(self._fetcher())
+        cache.prefetch(paths)
+        self.assertEqual(self.server.gets, [])
+        self.assertEqual(cache.acquire_file_content("VERSION"), "Mageia 7")
+
+    def testProbeErrorsNotMemoized(self):
+        self._set_file("/tree/.treeinfo", b"[general]\n", "t1")
+        self.server.errors["/tree/VERSION"] = 503
+        paths = [".treeinfo", "VERSION", "content"]
+        self.addCleanup(urldetect._PROBE_CACHE.clear)
+
+        fetcher = self._fetcher()
+        urldetect._DistroCache(fetcher).prefetch(paths)
+        self.assertEqual(list(fetcher.probe_errors), ["VERSION"])
+
+        # The 503 is retried, the 404 isn't
+        self.server.gets = []
+        del self.server.errors["/tree/VERSION"]
+        self._set_file("/tree/VERSION", b"Mageia 7", "t2")
+        cache = urldetect._DistroCache(self._fetcher())
+        cache.prefetch(paths)
+        self.assertEqual([p for p, r in self.server.gets], ["/tree/VERSION"])
+        self.assertEqual(cache.acquire_file_content("VERSION"), "Mageia 7")
+
+
+class TestISOReader(unittest.TestCase):
+    """
+    Test the pure python ISO9660 reader against the test suite ISOs
+    """
+    def _reader(self, name):
+        reader = isoreader.ISOReader("tests/cli-test-xml/%s" % name)
+        self.addCleanup(reader.close)
+        return reader
+
+    def _read(self, reader, path):
+        return b"".join(bytes(data) for data in reader.iter_file(path, 4))
+
+    def testRockRidge(self):
+        reader = self._reader("fake-fedora17-tree.iso")
+        self.assertEqual(sorted(reader.get_paths()), [
+            "/", "/.treeinfo", "/images", "/images/boot.iso",
+            "/images/pxeboot", "/images/pxeboot/initrd.img",
+            "/images/pxeboot/vmlinuz", "/images/xen",
+            "/images/xen/initrd.img", "/images/xen/vmlinuz"])
+        self.assertEqual(self._read(reader, "/images/pxeboot/vmlinuz"),
+                         b"testvmlinuz\n")
+        treeinfo = self._read(reader, "/.treeinfo")
+        self.assertEqual(reader.get_size("/.treeinfo"), len(treeinfo))
+        self.assertTrue(treeinfo.startswith(b"[general]\n"))
+        self.assertRaises(RuntimeError, reader.get_size, "/images")
+
+    def testJoliet(self):
+        reader = self._reader("fake-win7.iso")
+        self.assertTrue(reader.has_file("/fake-virtinst-iso.txt"))
+        self.assertTrue(reader.has_file("/boot/etfsboot.com"))
+        self.assertFalse(reader.has_file("/FAKE-VIRTINST-ISO.TXT"))
+
+    def testNotISO(self):
+        reader = self._reader("fakerhel6tree/images/boot.iso")
+        self.assertRaises(RuntimeError, reader.has_file, "/")
+        reader = isoreader.ISOReader(__file__)
+        self.assertRaises(RuntimeError, reader.has_file, "/")
+
+    def testFetcher(self):
+        fetcher = urlfetcher.fetcherForURI(
+                "tests/cli-test-xml/fake-fedora17-tree.iso", "/tmp",
+                progress.make_meter(quiet=True))
+        self.addCleanup(fetcher._cleanup)
+        self.assertTrue(fetcher.is_iso())
+        self.assertTrue(fetcher.hasFile(".treeinfo"))
+        self.assertFalse(fetcher.hasFile("images/missing"))
+        self.assertTrue("family = Fedora" in
+                        fetcher.acquireFileContent(".treeinfo"))
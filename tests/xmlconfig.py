@@ -9,6 +9,7 @@ import unittest
 
 import virtinst
 from virtinst import DeviceDisk
+from virtinst import resourceindex
 
 from tests import utils
 
@@ -235,3 +236,36 @@ class TestXMLMisc(unittest.TestCase):
         except Exception as e:
             if not self.conn.support.is_libvirt_error_no_domain(e):
                 raise
+
+    def test_resource_index(self):
+        conn = utils.URIs.open_testdriver_cached()
+
+        # backingl3.img is at the bottom of overlay.img's backing chain
+        self.assertTrue("test-many-devices" in DeviceDisk.path_in_use_by(
+            conn, "/dev/default-pool/backingl3.img"))
+        paths = ["/dev/default-pool/backingl3.img", "/idontexist", ""]
+        users = DeviceDisk.paths_in_use_by(conn, paths)
+        self.assertEqual(sorted(users), sorted(paths))
+        for path in paths:
+            self.assertEqual(users[path],
+                             DeviceDisk.path_in_use_by(conn, path))
+        self.assertTrue(virtinst.diskbackend.path_is_network_vol(
+            conn, "/dev/default-pool/overlay.img") is False)
+
+        mac = "22:22:33:54:32:10"
+        with self.assertRaises(RuntimeError):
+            virtinst.DeviceInterface.is_conflict_net(conn, mac.upper())
+        virtinst.DeviceInterface.is_conflict_net(conn, "22:22:22:22:22:22")
+
+        # Only objects that come and go are reindexed
+        index = resourceindex.DomainIndex()
+        guests = conn.fetch_all_domains()
+        index.sync(guests)
+        users = index.get_mac_users(mac)
+        self.assertEqual(len(users), 1)
+        guests.remove(users[0])
+        index.sync(guests)
+        self.assertEqual(index.get_mac_users(mac), [])
+        guests.append(users[0])
+        index.sync(guests)
+        self.assertEqual(index.get_mac_users(mac), users)
@@ -1504,3 +1504,72 @@ class XMLParseTest(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             disk.validate()
+
+    def testXMLAPINodeCache(self):
+        """
+        Make sure cached xpath lookups are invalidated when the
+        document is altered
+        """
+        xml = ("<domain type='kvm'><name>foo</name>"
+            "<devices><disk type='file'/></devices></domain>")
+        guest = virtinst.Guest(self.conn, parsexml=xml)
+        api = guest._xmlstate.xmlapi  # pylint: disable=protected-access
+
+        self.assertEqual(api.get_xpath_content("./name", False), "foo")
+        api.set_xpath_content("./name", "bar")
+        self.assertEqual(api.get_xpath_content("./name", False), "bar")
+
+        self.assertEqual(api.get_xpath_content("./title", False), None)
+        api.set_xpath_content("./title", "mytitle")
+        self.assertEqual(api.get_xpath_content("./title", False), "mytitle")
+
+        self.assertEqual(api.count("./devices/disk"), 1)
+        self.assertEqual(
+            api.get_xpath_content("./devices/disk[2]/@type", False), None)
+        api.node_add_xml("<disk type='block'/>", "./devices")
+        self.assertEqual(
+            api.get_xpath_content("./devices/disk[2]/@type", False), "block")
+
+        api.node_replace_xml("./devices/disk[1]", "<disk type='network'/>")
+        self.assertEqual(
+            api.get_xpath_content("./devices/disk[1]/@type", False), "network")
+
+        api.node_force_remove("./devices/disk[1]")
+        self.assertEqual(
+            api.get_xpath_content("./devices/disk[1]/@type", False), "block")
+        self.assertEqual(
+            api.get_xpath_content("./devices/disk[2]", True), None)
+
+    def testLazyChildParse(self):
+        """
+        Child objects are only parsed on first access, and detaching
+        an object with unparsed children keeps them intact
+        """
+        xml = ("<domain type='kvm'><name>foo</name><devices>"
+            "<disk type='file' device='disk'><source file='/tmp/a.img'/>"
+            "<target dev='vda'/></disk>"
+            "<disk type='file' device='cdrom'><source file='/tmp/b.iso'>"
+            "<seclabel model='dac' relabel='no'/></source>"
+            "<target dev='hda'/></disk>"
+            "</devices></domain>")
+        guest = virtinst.Guest(self.conn, parsexml=xml)
+        def _is_parsed(propname):
+            # pylint: disable=protected-access
+            return propname in guest._propstore
+        self.assertEqual(guest.name, "foo")
+        self.assertFalse(_is_parsed("devices"))
+
+        # Unparsed children don't alter the generated XML
+        self.assertEqual(guest.get_xml(),
+            virtinst.Guest(self.conn, parsexml=xml).get_xml())
+        self.assertFalse(_is_parsed("devices"))
+
+        self.assertEqual(len(guest.devices.disk), 2)
+        self.assertTrue(_is_parsed("devices"))
+        cdrom = guest.devices.disk[1]
+        guest.devices.remove_child(cdrom)
+        self.assertEqual(cdrom.target, "hda")
+        self.assertEqual(cdrom.seclabels[0].model, "dac")
+        self.assertTrue("<seclabel" in cdrom.get_xml())
+        self.assertEqual(len(guest.devices.disk), 1)
+        self.assertTrue("seclabel" not in guest.get_xml())
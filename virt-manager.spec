@@ -82,7 +82,7 @@ Requires: python3-requests
 Requires: libosinfo >= 0.2.10
 # Required for gobject-introspection infrastructure
 Requires: python3-gobject-base
-# Required for pulling files from iso media with isoinfo
+# Required for generating unattended install iso media
 Requires: genisoimage
 
 %description common
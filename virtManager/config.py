@@ -4,7 +4,9 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import collections
 import os
+import time
 
 from gi.repository import Gio
 from gi.repository import GLib
@@ -31,6 +33,15 @@ class _SettingsWrapper(object):
         self._settingsmap = {"": self._settings}
         self._handler_map = {}
 
+        # Snapshot of the keys registered with cache_key, kept up to
+        # date by change notifications
+        self._cache = {}
+
+        # Read counters, for log_read_stats
+        self._read_counts = collections.Counter()
+        self._cached_reads = 0
+        self._read_stats_time = time.time()
+
         for child in self._settings.list_children():
             childschema = self._root + "." + child
             self._settingsmap[child] = Gio.Settings.new(childschema)
@@ -95,14 +106,61 @@ class _SettingsWrapper(object):
         settings = self._handler_map.pop(h)
         return settings.disconnect(h)
 
+    def cache_key(self, key):
+        """
+        Serve get(key) from an in-memory snapshot rather than querying
+        gsettings every time. For values read on hot paths, like the
+        stats polling toggles that are checked per VM per tick.
+
+        This must be called before any notify_add for the key: handlers
+        run in connection order, so the snapshot is already updated when
+        other change callbacks read the value.
+        """
+        if key in self._cache:
+            return
+        settings, name = self._find_settings(key)
+
+        def _changed_cb(*ignore):
+            self._cache[key] = settings.get_value(name).unpack()
+        settings.connect("changed::%s" % name, _changed_cb)
+        # Reading the key is also required for 'changed' to be emitted
+        _changed_cb()
+
     def get(self, key):
+        if key in self._cache:
+            self._cached_reads += 1
+            return self._cache[key]
+
+        self._read_counts[key] += 1
         settings, key = self._find_settings(key)
         return settings.get_value(key).unpack()
+
+    def log_read_stats(self):
+        """
+        Log gsettings and snapshot reads per second since the last call,
+        with the most read uncached keys, and reset the counters
+        """
+        now = time.time()
+        elapsed = max(now - self._read_stats_time, 0.001)
+        reads = sum(self._read_counts.values())
+        log.debug("Settings reads: gsettings=%.1f/s snapshot=%.1f/s "
+                  "top gsettings keys=%s",
+                  reads / elapsed, self._cached_reads / elapsed,
+                  self._read_counts.most_common(5))
+
+        self._read_counts = collections.Counter()
+        self._cached_reads = 0
+        self._read_stats_time = now
+
     def set(self, key, value, *args, **kwargs):
-        settings, key = self._find_settings(key)
-        fmt = settings.get_value(key).get_type_string()
-        return settings.set_value(key, GLib.Variant(fmt, value),
-                                  *args, **kwargs)
+        settings, name = self._find_settings(key)
+        fmt = settings.get_value(name).get_type_string()
+        ret = settings.set_value(name, GLib.Variant(fmt, value),
+                                 *args, **kwargs)
+        if key in self._cache:
+            # Don't depend on when the backend emits 'changed'
+            self._cache[key] = settings.get_value(name).unpack()
+        return ret
 
 
 class vmmConfig(object):
@@ -144,6 +202,26 @@ class vmmConfig(object):
         },
     }
 
+    # Keys read on hot paths, see _SettingsWrapper.cache_key
+    _CACHED_KEYS = [
+        "/stats/update-interval",
+        "/stats/enable-cpu-poll",
+        "/stats/enable-disk-poll",
+        "/stats/enable-net-poll",
+        "/stats/enable-memory-poll",
+        "/stats/thumbnail-interval",
+        "/vmlist-fields/cpu-usage",
+        "/vmlist-fields/host-cpu-usage",
+        "/vmlist-fields/memory-usage",
+        "/vmlist-fields/disk-usage",
+        "/vmlist-fields/network-traffic",
+        "/console/scaling",
+        "/console/resize-guest",
+    ]
+
+    # Seconds between log_settings_reads reports
+    _READ_STATS_INTERVAL = 60
+
     CONSOLE_SCALE_NEVER = 0
     CONSOLE_SCALE_FULLSCREEN = 1
     CONSOLE_SCALE_ALWAYS = 2
@@ -167,6 +245,9 @@ class vmmConfig(object):
         self.ui_dir = BuildConfig.ui_dir
 
         self.conf = _SettingsWrapper("org.virt-manager.virt-manager")
+        for key in self._CACHED_KEYS:
+            self.conf.cache_key(key)
+        self._last_read_stats = time.time()
 
         self.CLITestOptions = CLITestOptions
         if self.CLITestOptions.xmleditor_enabled:
@@ -208,6 +289,16 @@ class vmmConfig(object):
     def remove_notifier(self, h):
         self.conf.notify_remove(h)
 
+    def log_settings_reads(self):
+        """
+        Periodically log how often settings are read, called from the
+        engine tick. Reports at most every _READ_STATS_INTERVAL seconds
+        """
+        if time.time() - self._last_read_stats < self._READ_STATS_INTERVAL:
+            return
+        self._last_read_stats = time.time()
+        self.conf.log_read_stats()
+
     # Used for debugging reference leaks, we keep track of all objects
     # come and go so we can do a leak report at app shutdown
     def add_object(self, obj):
@@ -326,6 +417,10 @@ class vmmConfig(object):
     def on_keyboard_grab_default_changed(self, cb):
         return self.conf.notify_add("/console/grab-keyboard", cb)
 
+    # This key is not intended to be exposed in the UI yet
+    def get_console_serial_log(self):
+        return self.conf.get("/console/serial-log")
+
     # Confirmation preferences
     def get_confirm_forcepoweroff(self):
         return self.conf.get("/confirm/forcepoweroff")
@@ -429,6 +524,10 @@ class vmmConfig(object):
     def on_stats_enable_memory_poll_changed(self, cb, row=None):
         return self.conf.notify_add("/stats/enable-memory-poll", cb, row)
 
+    # Seconds between VM thumbnail captures, 0 is disabled
+    def get_stats_thumbnail_interval(self):
+        return max(0, self.conf.get("/stats/thumbnail-interval"))
+
     # VM Console preferences
     def on_console_accels_changed(self, cb):
         return self.conf.notify_add("/console/enable-accels", cb)
@@ -601,6 +700,10 @@ class vmmConfig(object):
         self.conf.set("/manager-window-width", w)
         self.conf.set("/manager-window-height", h)
 
+    # Number of threads fetching initial object XML per connection
+    def get_conn_init_workers(self):
+        return max(1, self.conf.get("/connections/init-workers"))
+
     # URI autoconnect
     def get_conn_autoconnect(self, uri):
         uris = self.conf.get("/connections/autoconnect")
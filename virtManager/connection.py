@@ -4,6 +4,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import heapq
+import itertools
 import os
 import threading
 import time
@@ -23,7 +25,8 @@ from .object.interface import vmmInterface
 from .object.network import vmmNetwork
 from .object.nodedev import vmmNodeDevice
 from .object.storagepool import vmmStoragePool
-from .lib.statsmanager import vmmStatsManager
+from .lib.statsmanager import StatsRing, vmmStatsManager
+from .lib.thumbnails import vmmThumbnailCache
 
 
 class _ObjectList(vmmGObject):
@@ -139,6 +142,63 @@ class _ObjectList(vmmGObject):
             return self._objects[:]
 
 
+class _ObjectInitPool(object):
+    """
+    Bounded pool of worker threads that run the initial XML fetch
+    (init_libvirt_state) for newly discovered objects. Pending work is
+    handed out lowest priority value first, so for example VMs can be
+    initialized, and show up in the UI, before any nodedevs.
+    """
+    def __init__(self, uri, width):
+        self._uri = uri
+        self._width = width
+        self._work = []
+        self._counter = itertools.count()
+        self._nthreads = 0
+        self._lock = threading.Lock()
+
+    def set_width(self, width):
+        with self._lock:
+            self._width = max(1, width)
+
+    def add(self, priority, obj, cb):
+        """
+        Queue cb(obj) to run on a worker thread
+        """
+        with self._lock:
+            heapq.heappush(self._work,
+                    (priority, next(self._counter), obj, cb))
+            if self._nthreads >= self._width:
+                return
+            self._nthreads += 1
+            name = "Init objects %s #%d" % (self._uri, self._nthreads)
+
+        t = threading.Thread(target=self._run, name=name)
+        t.daemon = True
+        t.start()
+
+    def clear(self):
+        with self._lock:
+            self._work = []
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._work:
+                    self._nthreads -= 1
+                    return
+                ignore, ignore, obj, cb = heapq.heappop(self._work)
+
+            try:
+                cb(obj)
+            except Exception:
+                log.exception("Error initializing %s", obj)
+
+            # Need to clear reference to make leak check happy
+            obj = None
+            cb = None
+
+
 class vmmConnection(vmmGObject):
     __gsignals__ = {
         "vm-added": (vmmGObject.RUN_FIRST, None, [str]),
@@ -161,6 +221,20 @@ class vmmConnection(vmmGObject):
      _STATE_CONNECTING,
      _STATE_ACTIVE) = range(1, 4)
 
+    _STATS_FIELDS = [
+        ("timestamp", "d"),
+        ("memory", "q"),
+        ("memoryPercent", "d"),
+        ("cpuTime", "q"),
+        ("cpuHostPercent", "d"),
+        ("diskRdRate", "d"),
+        ("diskWrRate", "d"),
+        ("netRxRate", "d"),
+        ("netTxRate", "d"),
+        ("diskMaxRate", "d"),
+        ("netMaxRate", "d"),
+    ]
+
     def __init__(self, uri):
         self._uri = uri
         if self._uri is None or self._uri.lower() == "xen":
@@ -195,9 +269,13 @@ class vmmConnection(vmmGObject):
         self._xml_flags = {}
 
         self._objects = _ObjectList()
+        self._init_pool = _ObjectInitPool(self._uri,
+                self.config.get_conn_init_workers())
+        self._pollcache = pollhelpers.PollCache()
         self.statsmanager = vmmStatsManager()
 
-        self._stats = []
+        self._stats = StatsRing(self._STATS_FIELDS,
+                self.config.get_stats_history_length() + 1)
         self._hostinfo = None
 
         self.add_gsettings_handle(
@@ -308,6 +386,8 @@ class vmmConnection(vmmGObject):
         return self._uri
     def get_backend(self):
         return self._backend
+    def get_poll_cache(self):
+        return self._pollcache
 
     def invalidate_caps(self):
         return self._backend.invalidate_caps()
@@ -903,10 +983,12 @@ class vmmConnection(vmmGObject):
             self._storage_pool_cb_ids = []
             self._node_device_cb_ids = []
 
-        self._stats = []
+        self._stats.clear()
 
         if self._init_object_event:
             self._init_object_event.clear()
+        self._init_pool.clear()
+        self._pollcache.clear()
 
         for obj in self._objects.all_objects():
             self._objects.remove(obj)
@@ -941,6 +1023,7 @@ class vmmConnection(vmmGObject):
             return
 
         self._change_state(self._STATE_CONNECTING)
+        self._init_pool.set_width(self.config.get_conn_init_workers())
 
         log.debug("Scheduling background open thread for %s",
                       self.get_uri())
@@ -981,7 +1064,12 @@ class vmmConnection(vmmGObject):
                 self, str(exc), tb, warnconsole)
         return False, ConnectError
 
+    def _log_open_phase(self, phase, starttime):
+        log.debug("conn=%s open phase '%s' took %.3fs",
+                self.get_uri(), phase, time.time() - starttime)
+
     def _populate_initial_state(self):
+        starttime = time.time()
         log.debug("libvirt version=%s",
                       self._backend.local_libvirt_version())
         log.debug("daemon version=%s",
@@ -989,15 +1077,20 @@ class vmmConnection(vmmGObject):
         log.debug("conn version=%s", self._backend.conn_version())
         log.debug("%s capabilities:\n%s",
                       self.get_uri(), self.caps.get_xml())
+        self._log_open_phase("versions and capabilities", starttime)
 
         # Try to create the default storage pool
         # We want this before events setup to save some needless polling
+        starttime = time.time()
         try:
             virtinst.StoragePool.build_default_pool(self.get_backend())
         except Exception as e:
             log.debug("Building default pool failed: %s", str(e))
+        self._log_open_phase("default pool", starttime)
 
+        starttime = time.time()
         self._add_conn_events()
+        self._log_open_phase("event registration", starttime)
 
         try:
             self._backend.setKeepAlive(20, 1)
@@ -1013,6 +1106,7 @@ class vmmConnection(vmmGObject):
         # That way we only report the connection is open when everything is
         # nicely setup for the rest of the app.
 
+        starttime = time.time()
         self._init_object_event = threading.Event()
         self._init_object_count = 0
 
@@ -1024,13 +1118,17 @@ class vmmConnection(vmmGObject):
         self._init_object_event.wait()
         self._init_object_event = None
         self._init_object_count = None
+        self._log_open_phase("initial object poll and init", starttime)
 
     def _open_thread(self):
         ConnectError = None
         try:
+            starttime = time.time()
             is_active, ConnectError = self._do_open()
+            self._log_open_phase("libvirt open", starttime)
             if is_active:
                 self._populate_initial_state()
+                self._log_open_phase("total", starttime)
 
             self.idle_add(self._change_state, is_active and
                 self._STATE_ACTIVE or self._STATE_DISCONNECTED)
@@ -1132,35 +1230,40 @@ class vmmConnection(vmmGObject):
         if not dopoll or not self.is_network_capable():
             return [], [], list(keymap.values())
         return pollhelpers.fetch_nets(self._backend, keymap,
-                    (lambda obj, key: vmmNetwork(self, obj, key)))
+                    (lambda obj, key: vmmNetwork(self, obj, key)),
+                    pollcache=self._pollcache)
 
     def _update_pools(self, dopoll):
         keymap = dict((o.get_connkey(), o) for o in self.list_pools())
         if not dopoll or not self.is_storage_capable():
             return [], [], list(keymap.values())
         return pollhelpers.fetch_pools(self._backend, keymap,
-                    (lambda obj, key: vmmStoragePool(self, obj, key)))
+                    (lambda obj, key: vmmStoragePool(self, obj, key)),
+                    pollcache=self._pollcache)
 
     def _update_interfaces(self, dopoll):
         keymap = dict((o.get_connkey(), o) for o in self.list_interfaces())
         if not dopoll or not self.is_interface_capable():
             return [], [], list(keymap.values())
         return pollhelpers.fetch_interfaces(self._backend, keymap,
-                    (lambda obj, key: vmmInterface(self, obj, key)))
+                    (lambda obj, key: vmmInterface(self, obj, key)),
+                    pollcache=self._pollcache)
 
     def _update_nodedevs(self, dopoll):
         keymap = dict((o.get_connkey(), o) for o in self.list_nodedevs())
         if not dopoll or not self.is_nodedev_capable():
             return [], [], list(keymap.values())
         return pollhelpers.fetch_nodedevs(self._backend, keymap,
-                    (lambda obj, key: vmmNodeDevice(self, obj, key)))
+                    (lambda obj, key: vmmNodeDevice(self, obj, key)),
+                    pollcache=self._pollcache)
 
     def _update_vms(self, dopoll):
         keymap = dict((o.get_connkey(), o) for o in self.list_vms())
         if not dopoll:
             return [], [], list(keymap.values())
         return pollhelpers.fetch_vms(self._backend, keymap,
-                    (lambda obj, key: vmmDomain(self, obj, key)))
+                    (lambda obj, key: vmmDomain(self, obj, key)),
+                    pollcache=self._pollcache)
 
     def _poll(self, initial_poll,
             pollvm, pollnet, pollpool, polliface, pollnodedev):
@@ -1182,15 +1285,23 @@ class vmmConnection(vmmGObject):
             new = [n for n in new if not self._objects.in_blacklist(n)]
             return new
 
+        starttime = time.time()
+        self._pollcache.start_poll()
         new_vms = _process_objects(self._update_vms(pollvm))
         new_nets = _process_objects(self._update_nets(pollnet))
         new_pools = _process_objects(self._update_pools(pollpool))
         new_ifaces = _process_objects(self._update_interfaces(polliface))
         new_nodedevs = _process_objects(self._update_nodedevs(pollnodedev))
-
-        # Kick off one thread per object type to handle the initial
-        # XML fetching. Going any more fine grained then this probably
-        # won't be that useful due to libvirt's locking structure.
+        rpcs = self._pollcache.finish_poll()
+        if initial_poll:
+            self._log_open_phase("initial object listing", starttime)
+            log.debug("conn=%s initial object listing used %d RPCs",
+                    self._uri, rpcs)
+
+        # Hand the initial XML fetching off to the bounded init pool.
+        # The list order is the priority: VMs are what users look at
+        # first, nodedevs are rarely needed right away. Objects are
+        # reported to the UI one by one as they finish initializing.
         #
         # Would prefer to start refreshing some objects before all polling
         # is complete, but we need init_object_count to be fully accurate
@@ -1201,19 +1312,14 @@ class vmmConnection(vmmGObject):
             # is never called and the event is never set, so let's do it here
             self._init_object_event.set()
 
-        for newlist in [new_vms, new_nets, new_pools,
-                new_ifaces, new_nodedevs]:
-            if not newlist:
-                continue
-
-            def cb(lst):
-                for obj in lst:
-                    obj.connect_once("initialized", self._new_object_cb)
-                    obj.init_libvirt_state()
+        def cb(obj):
+            obj.connect_once("initialized", self._new_object_cb)
+            obj.init_libvirt_state()
 
-            self._start_thread(cb,
-                "refreshing xml for new %s" % newlist[0].class_name(),
-                args=(newlist,))
+        for priority, newlist in enumerate([new_vms, new_pools, new_nets,
+                new_ifaces, new_nodedevs]):
+            for obj in newlist:
+                self._init_pool.add(priority, obj, cb)
 
         return gone_objects, preexisting_objects
 
@@ -1289,17 +1395,28 @@ class vmmConnection(vmmGObject):
         if stats_update:
             self._recalculate_stats(
                 [o for o in preexisting_objects if o.reports_stats()])
+            self._capture_thumbnails(
+                [o for o in preexisting_objects if o.is_domain()],
+                [o for o in gone_objects if o.is_domain()])
             self.idle_emit("resources-sampled")
 
+    def _capture_thumbnails(self, vms, gone_vms):
+        interval = self.config.get_stats_thumbnail_interval()
+        if not interval:
+            return
+
+        cache = vmmThumbnailCache.get_instance()
+        for vm in gone_vms:
+            cache.remove_vm_thumbnail(vm)
+        for vm in vms:
+            cache.capture_vm_thumbnail(vm, interval)
+
     def _recalculate_stats(self, vms):
         if not self._backend.is_open():
             return
 
         now = time.time()
-        expected = self.config.get_stats_history_length()
-        current = len(self._stats)
-        if current > expected:
-            del self._stats[expected:current]
+        self._stats.resize(self.config.get_stats_history_length() + 1)
 
         mem = 0
         cpuTime = 0
@@ -1328,7 +1445,7 @@ class vmmConnection(vmmGObject):
         pcentMem = mem * 100.0 / self.host_memory_size()
 
         if len(self._stats) > 0:
-            prevTimestamp = self._stats[0]["timestamp"]
+            prevTimestamp = self._stats.get("timestamp")
             host_cpus = self.host_active_processor_count()
 
             pcentHostCpu = ((cpuTime) * 100.0 /
@@ -1338,21 +1455,18 @@ class vmmConnection(vmmGObject):
         pcentHostCpu = max(0.0, min(100.0, pcentHostCpu))
         pcentMem = max(0.0, min(100.0, pcentMem))
 
-        newStats = {
-            "timestamp": now,
-            "memory": mem,
-            "memoryPercent": pcentMem,
-            "cpuTime": cpuTime,
-            "cpuHostPercent": pcentHostCpu,
-            "diskRdRate": rdRate,
-            "diskWrRate": wrRate,
-            "netRxRate": rxRate,
-            "netTxRate": txRate,
-            "diskMaxRate": diskMaxRate,
-            "netMaxRate": netMaxRate,
-        }
-
-        self._stats.insert(0, newStats)
+        self._stats.append(
+            timestamp=now,
+            memory=mem,
+            memoryPercent=pcentMem,
+            cpuTime=cpuTime,
+            cpuHostPercent=pcentHostCpu,
+            diskRdRate=rdRate,
+            diskWrRate=wrRate,
+            netRxRate=rxRate,
+            netTxRate=txRate,
+            diskMaxRate=diskMaxRate,
+            netMaxRate=netMaxRate)
 
 
     def schedule_priority_tick(self, **kwargs):
@@ -1400,23 +1514,13 @@ class vmmConnection(vmmGObject):
     ########################
 
     def _get_record_helper(self, record_name):
-        if len(self._stats) == 0:
-            return 0
-        return self._stats[0][record_name]
+        return self._stats.get(record_name)
 
     def _vector_helper(self, record_name, limit, ceil=100.0):
-        vector = []
         statslen = self.config.get_stats_history_length() + 1
         if limit is not None:
             statslen = min(statslen, limit)
-
-        for i in range(statslen):
-            if i < len(self._stats):
-                vector.append(self._stats[i][record_name] / ceil)
-            else:
-                vector.append(0)
-
-        return vector
+        return self._stats.vector(record_name, statslen, ceil)
 
     def stats_memory_vector(self, limit=None):
         return self._vector_helper("memoryPercent", limit)
@@ -1441,6 +1545,12 @@ class vmmConnection(vmmGObject):
     def disk_io_max_rate(self):
         return self._get_record_helper("diskMaxRate")
 
+    def poll_rpc_count(self):
+        """
+        Number of libvirt RPCs issued by the most recent object poll
+        """
+        return self._pollcache.last_poll_rpc_count
+
 
     ###########################
     # Per-conn config helpers #
@@ -5,8 +5,11 @@
 # See the COPYING file in the top-level directory.
 
 # pylint: disable=wrong-import-order,ungrouped-imports
+import os
+
 import gi
 from gi.repository import Gdk
+from gi.repository import GLib
 from gi.repository import Gtk
 
 from virtinst import log
@@ -23,9 +26,23 @@ from gi.repository import Vte
 import libvirt
 
 from ..baseclass import vmmGObject
+from ..lib.consolebuffer import ConsoleBuffer, ConsoleLogWriter
 
 
 class ConsoleConnection(vmmGObject):
+    # Milliseconds between terminal updates. A chatty console like a
+    # kernel booting is fed to the terminal once per frame, rather than
+    # once per stream read
+    _FEED_INTERVAL = 16
+    # Most bytes fed to the terminal per update, so a big backlog
+    # doesn't block the main loop
+    _FEED_MAX = 256 * 1024
+    # Stop reading from the stream while this many bytes are waiting
+    # for the terminal, and start again once they drop below _LOW_WATER
+    _HIGH_WATER = 4 * 1024 * 1024
+    _LOW_WATER = 1024 * 1024
+    _SEND_MAX = 64 * 1024
+
     def __init__(self, vm):
         vmmGObject.__init__(self)
 
@@ -33,16 +50,64 @@ class ConsoleConnection(vmmGObject):
         self.conn = vm.conn
 
         self.stream = None
+        self._stream_events = None
+        self._reading = True
+        self._feed_id = None
+        self._logwriter = None
 
-        self.streamToTerminal = b""
-        self.terminalToStream = ""
+        self.streamToTerminal = ConsoleBuffer()
+        self.terminalToStream = ConsoleBuffer()
 
     def _cleanup(self):
         self.close()
+        if self._feed_id:
+            GLib.source_remove(self._feed_id)
+            self._feed_id = None
 
         self.vm = None
         self.conn = None
 
+    def _update_stream_events(self):
+        """
+        Only ask for the events we can handle right now: READABLE
+        unless there's too much data queued for the terminal, WRITABLE
+        only if there's data queued for the stream
+        """
+        if not self.stream:
+            return
+
+        events = (libvirt.VIR_STREAM_EVENT_ERROR |
+                  libvirt.VIR_STREAM_EVENT_HANGUP)
+        if self._reading:
+            events |= libvirt.VIR_STREAM_EVENT_READABLE
+        if self.terminalToStream:
+            events |= libvirt.VIR_STREAM_EVENT_WRITABLE
+
+        if events != self._stream_events:
+            self.stream.eventUpdateCallback(events)
+            self._stream_events = events
+
+    def _queue_stream_data(self, data, terminal):
+        self.streamToTerminal.append(data)
+        if self._logwriter:
+            try:
+                self._logwriter.write(data)
+            except Exception:
+                log.exception("Error writing console log %s, disabling it",
+                              self._logwriter.path)
+                self._logwriter.close()
+                self._logwriter = None
+
+        if len(self.streamToTerminal) > self._HIGH_WATER:
+            log.debug("Console buffer above %d bytes, pausing reads",
+                      self._HIGH_WATER)
+            self._reading = False
+        if not self._feed_id:
+            # Not tracked with timeout_add, there's one of these for
+            # every burst of output. _cleanup removes a pending one
+            self._feed_id = GLib.timeout_add(self._FEED_INTERVAL,
+                                             self.display_data, terminal)
+
     def _event_on_stream(self, stream, events, opaque):
         ignore = stream
         terminal = opaque
@@ -69,16 +134,14 @@ class ConsoleConnection(vmmGObject):
                 self.close()
                 return
 
-            queued_text = bool(self.streamToTerminal)
-            self.streamToTerminal += got
-            if not queued_text:
-                self.idle_add(self.display_data, terminal)
+            self._queue_stream_data(got, terminal)
 
         if (events & libvirt.VIR_EVENT_HANDLE_WRITABLE and
             self.terminalToStream):
 
             try:
-                done = self.stream.send(self.terminalToStream.encode())
+                done = self.stream.send(
+                        self.terminalToStream.peek(self._SEND_MAX))
             except Exception:
                 log.exception("Error sending stream data")
                 self.close()
@@ -88,17 +151,23 @@ class ConsoleConnection(vmmGObject):
                 # This is basically EAGAIN
                 return
 
-            self.terminalToStream = self.terminalToStream[done:]
+            self.terminalToStream.consume(done)
 
-        if not self.terminalToStream:
-            self.stream.eventUpdateCallback(libvirt.VIR_STREAM_EVENT_READABLE |
-                                            libvirt.VIR_STREAM_EVENT_ERROR |
-                                            libvirt.VIR_STREAM_EVENT_HANGUP)
+        self._update_stream_events()
 
 
     def is_open(self):
         return self.stream is not None
 
+    def _open_log(self, name):
+        if not self.config.get_console_serial_log():
+            return
+
+        path = os.path.join(self.vm.get_cache_dir(),
+                            "console-%s.log" % (name or "default"))
+        log.debug("Logging console output to %s", path)
+        self._logwriter = ConsoleLogWriter(path)
+
     def open(self, dev, terminal):
         if self.stream:
             self.close()
@@ -113,12 +182,15 @@ class ConsoleConnection(vmmGObject):
         stream = self.conn.get_backend().newStream(libvirt.VIR_STREAM_NONBLOCK)
         self.vm.open_console(name, stream)
         self.stream = stream
+        self._reading = True
+        self._stream_events = (libvirt.VIR_STREAM_EVENT_READABLE |
+                               libvirt.VIR_STREAM_EVENT_ERROR |
+                               libvirt.VIR_STREAM_EVENT_HANGUP)
 
-        self.stream.eventAddCallback((libvirt.VIR_STREAM_EVENT_READABLE |
-                                      libvirt.VIR_STREAM_EVENT_ERROR |
-                                      libvirt.VIR_STREAM_EVENT_HANGUP),
+        self.stream.eventAddCallback(self._stream_events,
                                      self._event_on_stream,
                                      terminal)
+        self._open_log(name)
 
     def close(self):
         if self.stream:
@@ -132,6 +204,11 @@ class ConsoleConnection(vmmGObject):
                 log.exception("Error finishing stream")
 
         self.stream = None
+        self._stream_events = None
+        self.terminalToStream.clear()
+        if self._logwriter:
+            self._logwriter.close()
+            self._logwriter = None
 
     def send_data(self, src, text, length, terminal):
         """
@@ -144,19 +221,32 @@ class ConsoleConnection(vmmGObject):
         if self.stream is None:
             return
 
-        self.terminalToStream += text
-        if self.terminalToStream:
-            self.stream.eventUpdateCallback(libvirt.VIR_STREAM_EVENT_READABLE |
-                                            libvirt.VIR_STREAM_EVENT_WRITABLE |
-                                            libvirt.VIR_STREAM_EVENT_ERROR |
-                                            libvirt.VIR_STREAM_EVENT_HANGUP)
+        self.terminalToStream.append(text.encode())
+        self._update_stream_events()
 
     def display_data(self, terminal):
-        if not self.streamToTerminal:
-            return
-
-        terminal.feed(self.streamToTerminal)
-        self.streamToTerminal = b""
+        """
+        Feed queued stream data to the terminal. Data that's still
+        queued after close() is fed as well, so the last output before
+        an EOF is shown
+        """
+        data = self.streamToTerminal.take(self._FEED_MAX)
+        if data:
+            terminal.feed(data)
+        if self._logwriter:
+            self._logwriter.flush()
+
+        if (not self._reading and
+            len(self.streamToTerminal) < self._LOW_WATER):
+            log.debug("Console buffer below %d bytes, resuming reads",
+                      self._LOW_WATER)
+            self._reading = True
+            self._update_stream_events()
+
+        if self.streamToTerminal:
+            return True
+        self._feed_id = None
+        return False
 
 
 class vmmSerialConsole(vmmGObject):
@@ -5,12 +5,8 @@
 # See the COPYING file in the top-level directory.
 
 import datetime
-import glob
-import io
-import os
 
 from gi.repository import Gdk
-from gi.repository import GdkPixbuf
 from gi.repository import Gtk
 from gi.repository import Pango
 
@@ -19,52 +15,12 @@ from virtinst import generatename
 from virtinst import log
 from virtinst import xmlutil
 
+from ..lib import thumbnails
 from ..lib import uiutil
 from ..asyncjob import vmmAsyncJob
 from ..baseclass import vmmGObjectUI
 
 
-mimemap = {
-    "image/x-portable-pixmap": "ppm",
-    "image/png": "png",
-}
-
-
-def _make_screenshot_pixbuf(mime, sdata):
-    loader = GdkPixbuf.PixbufLoader.new_with_mime_type(mime)
-    loader.write(sdata)
-    pixbuf = loader.get_pixbuf()
-    loader.close()
-
-    maxsize = 450
-    def _scale(big, small, maxsize):
-        if big <= maxsize:
-            return big, small
-        factor = float(maxsize) / float(big)
-        return maxsize, int(factor * float(small))
-
-    width = pixbuf.get_width()
-    height = pixbuf.get_height()
-    if width > height:
-        width, height = _scale(width, height, maxsize)
-    else:
-        height, width = _scale(height, width, maxsize)
-
-    return pixbuf.scale_simple(width, height,
-                               GdkPixbuf.InterpType.BILINEAR)
-
-
-def _mime_to_ext(val, reverse=False):
-    for m, e in mimemap.items():
-        if val == m and not reverse:
-            return e
-        if val == e and reverse:
-            return m
-    log.debug("Don't know how to convert %s=%s to %s",
-                  reverse and "extension" or "mime", val,
-                  reverse and "mime" or "extension")
-
-
 class vmmSnapshotNew(vmmGObjectUI):
     __gsignals__ = {
         "snapshot-created": (vmmGObjectUI.RUN_FIRST, None, [str]),
@@ -145,29 +101,6 @@ class vmmSnapshotNew(vmmGObjectUI):
     # Create handling #
     ###################
 
-    def _take_screenshot(self):
-        stream = None
-        try:
-            stream = self.vm.conn.get_backend().newStream(0)
-            screen = 0
-            flags = 0
-            mime = self.vm.get_backend().screenshot(stream, screen, flags)
-
-            ret = io.BytesIO()
-            def _write_cb(_stream, data, userdata):
-                ignore = stream
-                ignore = userdata
-                ret.write(data)
-
-            stream.recvAll(_write_cb, None)
-            return mime, ret.getvalue()
-        finally:
-            try:
-                if stream:
-                    stream.finish()
-            except Exception:
-                pass
-
     def _get_screenshot(self):
         if not self.vm.is_active():
             log.debug("Skipping screenshot since VM is not active")
@@ -177,24 +110,16 @@ class vmmSnapshotNew(vmmGObjectUI):
             return
 
         try:
-            # Perform two screenshots, because qemu + qxl has a bug where
-            # screenshot generally only shows the data from the previous
-            # screenshot request:
+            # qemu + qxl has a bug where screenshot generally only shows
+            # the data from the previous screenshot request, so take
+            # two in that case:
             # https://bugs.launchpad.net/qemu/+bug/1314293
-            self._take_screenshot()
-            mime, sdata = self._take_screenshot()
+            if any(v.model == "qxl" for v in self.vm.xmlobj.devices.video):
+                thumbnails.take_screenshot(self.vm)
+            mime, sdata = thumbnails.take_screenshot(self.vm)
+            return thumbnails.make_thumbnail(mime, sdata)
         except Exception:
             log.exception("Error taking screenshot")
-            return
-
-        ext = _mime_to_ext(mime)
-        if not ext:
-            return
-
-        newpix = _make_screenshot_pixbuf(mime, sdata)
-        setattr(newpix, "vmm_mimetype", mime)
-        setattr(newpix, "vmm_sndata", sdata)
-        return newpix
 
     def _new_finish_cb(self, error, details, newname):
         self.reset_finish_cursor()
@@ -220,40 +145,23 @@ class vmmSnapshotNew(vmmGObjectUI):
         except Exception as e:
             return self.err.val_err(_("Error validating snapshot: %s") % e)
 
-    def _get_screenshot_data_for_save(self):
+    def _get_screenshot_for_save(self):
         snwidget = self.widget("snapshot-new-screenshot")
         if not snwidget.is_visible():
-            return None, None
+            return None
+        return snwidget.get_pixbuf()
 
-        sn = snwidget.get_pixbuf()
-        if not sn:
-            return None, None
-
-        mime = getattr(sn, "vmm_mimetype", None)
-        sndata = getattr(sn, "vmm_sndata", None)
-        return mime, sndata
-
-    def _do_create_snapshot(self, asyncjob, xml, name, mime, sndata):
+    def _do_create_snapshot(self, asyncjob, xml, name, pixbuf):
         ignore = asyncjob
 
         self.vm.create_snapshot(xml)
 
         try:
-            cachedir = self.vm.get_cache_dir()
-            basesn = os.path.join(cachedir, "snap-screenshot-%s" % name)
-
-            # Remove any pre-existing screenshots so we don't show stale data
-            for ext in list(mimemap.values()):
-                p = basesn + "." + ext
-                if os.path.exists(basesn + "." + ext):
-                    os.unlink(p)
-
-            if not mime or not sndata:
-                return
-
-            filename = basesn + "." + _mime_to_ext(mime)
-            log.debug("Writing screenshot to %s", filename)
-            open(filename, "wb").write(sndata)
+            cache = thumbnails.vmmThumbnailCache.get_instance()
+            # Remove any pre-existing thumbnail so we don't show stale data
+            cache.remove_snapshot_thumbnail(self.vm, name)
+            if pixbuf:
+                cache.save_snapshot_thumbnail(self.vm, name, pixbuf)
         except Exception:
             log.exception("Error saving screenshot")
 
@@ -264,12 +172,12 @@ class vmmSnapshotNew(vmmGObjectUI):
 
         xml = snap.get_xml()
         name = snap.name
-        mime, sndata = self._get_screenshot_data_for_save()
+        pixbuf = self._get_screenshot_for_save()
         self.close()
 
         self.set_finish_cursor()
         progWin = vmmAsyncJob(
-                    self._do_create_snapshot, [xml, name, mime, sndata],
+                    self._do_create_snapshot, [xml, name, pixbuf],
                     self._new_finish_cb, [name],
                     _("Creating snapshot"),
                     _("Creating virtual machine snapshot"),
@@ -299,6 +207,10 @@ class vmmSnapshotPage(vmmGObjectUI):
         self._unapplied_changes = False
         self._snapshot_new = None
 
+        # Snapshot XML is fetched by a background thread after the list
+        # is shown. Bumping this makes running fetches stop
+        self._xml_fetch_id = 0
+
         self._snapmenu = None
         self._init_ui()
 
@@ -326,6 +238,7 @@ class vmmSnapshotPage(vmmGObjectUI):
     ##############
 
     def _cleanup(self):
+        self._xml_fetch_id += 1
         self.vm = None
         self._snapmenu = None
 
@@ -432,6 +345,49 @@ class vmmSnapshotPage(vmmGObjectUI):
         self.widget("snapshot-notebook").set_current_page(1)
         self.widget("snapshot-error-label").set_text(msg)
 
+    def _make_snapshot_row(self, snap):
+        """
+        Build the list row for snap. Until its XML is fetched, state is
+        shown as unknown, and it's sorted as internal unless the snapshot
+        list already told us otherwise
+        """
+        name = snap.get_name()
+        if snap.is_xml_loaded():
+            desc = snap.get_xmlobj().description
+            state = snap.run_status()
+            icon = snap.run_status_icon_name()
+        else:
+            desc = None
+            state = _("Unknown")
+            icon = None
+
+        if snap.is_external(fetch=False):
+            sortname = "3%s" % name
+            external = " (%s)" % _("External")
+        else:
+            external = ""
+            sortname = "1%s" % name
+
+        label = "%s\n<span size='small'>%s: %s%s</span>" % (
+            (xmlutil.xml_escape(name), _("VM State"),
+             xmlutil.xml_escape(state), external))
+        return [name, label, desc, icon, sortname, snap.is_current()]
+
+    def _update_separator_row(self, model):
+        sortprefixes = set()
+        separator = None
+        for row in model:
+            if row[0]:
+                sortprefixes.add(row[4][0])
+            else:
+                separator = row.iter
+
+        want_separator = "1" in sortprefixes and "3" in sortprefixes
+        if want_separator and separator is None:
+            model.append([None, None, None, None, "2", False])
+        elif not want_separator and separator is not None:
+            model.remove(separator)
+
     def _populate_snapshot_list(self, select_name=None):
         cursnaps = []
         for i in self._get_selected_snapshots():
@@ -448,29 +404,16 @@ class vmmSnapshotPage(vmmGObjectUI):
                                 str(e))
             return
 
-        has_external = False
-        has_internal = False
         for snap in snapshots:
-            desc = snap.get_xmlobj().description
-            name = snap.get_name()
-            state = snap.run_status()
-            if snap.is_external():
-                has_external = True
-                sortname = "3%s" % name
-                external = " (%s)" % _("External")
-            else:
-                has_internal = True
-                external = ""
-                sortname = "1%s" % name
-
-            label = "%s\n<span size='small'>%s: %s%s</span>" % (
-                (xmlutil.xml_escape(name), _("VM State"),
-                 xmlutil.xml_escape(state), external))
-            model.append([name, label, desc, snap.run_status_icon_name(),
-                          sortname, snap.is_current()])
+            model.append(self._make_snapshot_row(snap))
+        self._update_separator_row(model)
 
-        if has_internal and has_external:
-            model.append([None, None, None, None, "2", False])
+        try:
+            thumbnails.vmmThumbnailCache.get_instance(
+                    ).prune_snapshot_thumbnails(
+                    self.vm, [s.get_name() for s in snapshots])
+        except Exception:
+            log.exception("Error pruning snapshot thumbnails")
 
 
         def check_selection(treemodel, path, it, snaps):
@@ -486,22 +429,62 @@ class vmmSnapshotPage(vmmGObjectUI):
         model.foreach(check_selection, cursnaps)
 
         self._initial_populate = True
+        self._start_xml_fetch(snapshots)
 
-    def _read_screenshot_file(self, name):
-        if not name:
-            return
 
-        cache_dir = self.vm.get_cache_dir()
-        basename = os.path.join(cache_dir, "snap-screenshot-%s" % name)
-        files = glob.glob(basename + ".*")
-        if not files:
+    ####################################
+    # Background snapshot XML fetching #
+    ####################################
+
+    # Number of snapshots whose rows are updated per idle callback
+    _XML_FETCH_BATCH = 25
+
+    def _start_xml_fetch(self, snapshots):
+        self._xml_fetch_id += 1
+        pending = [s for s in snapshots if not s.is_xml_loaded()]
+        if not pending:
             return
 
-        filename = files[0]
-        mime = _mime_to_ext(os.path.splitext(filename)[1][1:], reverse=True)
-        if not mime:
+        log.debug("Fetching XML for %d of %d snapshots in the background",
+                  len(pending), len(snapshots))
+        self._start_thread(self._xml_fetch_thread,
+                "Snapshot XML fetch %s" % self.vm.get_name(),
+                args=(self._xml_fetch_id, pending))
+
+    def _xml_fetch_thread(self, fetch_id, snapshots):
+        done = []
+        for snap in snapshots:
+            if fetch_id != self._xml_fetch_id:
+                return
+            try:
+                snap.get_xmlobj()
+                done.append(snap)
+            except Exception as e:
+                log.debug("Error fetching XML for snapshot %s: %s",
+                          snap.get_name(), e)
+
+            if len(done) >= self._XML_FETCH_BATCH:
+                self.idle_add(self._xml_fetched_cb, fetch_id, done)
+                done = []
+        if done:
+            self.idle_add(self._xml_fetched_cb, fetch_id, done)
+
+    def _xml_fetched_cb(self, fetch_id, snapshots):
+        if fetch_id != self._xml_fetch_id:
             return
-        return _make_screenshot_pixbuf(mime, open(filename, "rb").read())
+
+        model = self.widget("snapshot-list").get_model()
+        snapmap = dict((snap.get_name(), snap) for snap in snapshots)
+        # Collect the rows first, changing the sort column while
+        # iterating over the model reorders it under us
+        rows = [(row.iter, snapmap[row[0]]) for row in model
+                if row[0] in snapmap]
+        for treeiter, snap in rows:
+            newrow = self._make_snapshot_row(snap)
+            for idx, value in enumerate(newrow):
+                if model[treeiter][idx] != value:
+                    model[treeiter][idx] = value
+        self._update_separator_row(model)
 
     def _set_snapshot_state(self, snap=None):
         self.widget("snapshot-notebook").set_current_page(0)
@@ -547,7 +530,10 @@ class vmmSnapshotPage(vmmGObjectUI):
                 mode = _("External disk only")
             self.widget("snapshot-mode").set_text(mode)
 
-        sn = self._read_screenshot_file(name)
+        sn = None
+        if name:
+            sn = thumbnails.vmmThumbnailCache.get_instance(
+                    ).get_snapshot_thumbnail(self.vm, name)
         self.widget("snapshot-screenshot").set_visible(bool(sn))
         self.widget("snapshot-screenshot-label").set_visible(not bool(sn))
         if sn:
@@ -665,6 +651,14 @@ class vmmSnapshotPage(vmmGObjectUI):
                             snap.get_name(),
                             finish_cb=self._refresh_snapshots)
 
+    def _do_delete_snapshot(self, snap):
+        snap.delete()
+        try:
+            thumbnails.vmmThumbnailCache.get_instance(
+                    ).remove_snapshot_thumbnail(self.vm, snap.get_name())
+        except Exception:
+            log.exception("Error removing snapshot thumbnail")
+
     def _on_delete_clicked(self, ignore):
         snaps = self._get_selected_snapshots()
         if not snaps:
@@ -677,7 +671,7 @@ class vmmSnapshotPage(vmmGObjectUI):
 
         for snap in snaps:
             log.debug("Deleting snapshot '%s'", snap.get_name())
-            vmmAsyncJob.simple_async(snap.delete, [], self,
+            vmmAsyncJob.simple_async(self._do_delete_snapshot, [snap], self,
                             _("Deleting snapshot"),
                             _("Deleting snapshot '%s'") % snap.get_name(),
                             _("Error deleting snapshot '%s'") % snap.get_name(),
@@ -25,6 +25,136 @@ from .systray import vmmSystray
  PRIO_LOW) = range(1, 3)
 
 
+class _TickRequest(object):
+    """
+    A pending tick for a connection. Duplicate requests of the same
+    priority are merged into one by OR'ing their tick() arguments.
+    """
+    def __init__(self, conn, kwargs):
+        self.conn = conn
+        self.kwargs = kwargs.copy()
+        self.queued_time = time.time()
+
+    def merge(self, kwargs):
+        for key, val in kwargs.items():
+            self.kwargs[key] = self.kwargs.get(key) or val
+
+
+class _TickWorker(object):
+    """
+    Runs conn.tick_from_engine on a dedicated thread for a single
+    connection, so a slow (say remote qemu+ssh) connection doesn't
+    stall polling of every other connection.
+    """
+    def __init__(self, uri):
+        self._uri = uri
+        self._cond = threading.Condition()
+        self._pending = {PRIO_HIGH: None, PRIO_LOW: None}
+        self._stopping = False
+        self._slow = False
+
+        # Ticks that take longer than this many seconds are reported
+        # as slow. Updated by the engine from the stats interval
+        self.deadline = None
+
+        self._tick_count = 0
+        self._coalesced_count = 0
+        self._slow_count = 0
+        self._last_duration = 0.0
+        self._max_duration = 0.0
+        self._avg_duration = 0.0
+        self._last_wait = 0.0
+
+        self._thread = threading.Thread(name="Tick thread %s" % uri,
+                                        target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def queue_tick(self, conn, isprio, kwargs):
+        prio = isprio and PRIO_HIGH or PRIO_LOW
+        with self._cond:
+            if self._stopping:
+                return
+            if self._pending[prio]:
+                self._pending[prio].merge(kwargs)
+                self._coalesced_count += 1
+            else:
+                self._pending[prio] = _TickRequest(conn, kwargs)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._pending = {PRIO_HIGH: None, PRIO_LOW: None}
+            self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "ticks": self._tick_count,
+                "coalesced": self._coalesced_count,
+                "slow": self._slow_count,
+                "last_duration": self._last_duration,
+                "max_duration": self._max_duration,
+                "avg_duration": self._avg_duration,
+                "last_wait": self._last_wait,
+            }
+
+    def _next_request(self):
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                for prio in [PRIO_HIGH, PRIO_LOW]:
+                    req = self._pending[prio]
+                    if req:
+                        self._pending[prio] = None
+                        return req
+                self._cond.wait()
+
+    def _record_tick(self, start, end, req):
+        duration = end - start
+        with self._cond:
+            self._tick_count += 1
+            self._last_wait = start - req.queued_time
+            self._last_duration = duration
+            self._max_duration = max(self._max_duration, duration)
+            # Exponential moving average, so old samples fade out
+            self._avg_duration = (self._avg_duration * 0.8 +
+                                  duration * 0.2)
+
+            if self.deadline and duration > self.deadline:
+                self._slow_count += 1
+                if not self._slow:
+                    log.debug("Tick for %s took %.2fs, over the %ss "
+                        "deadline. Not running at requested rate.",
+                        self._uri, duration, self.deadline)
+                self._slow = True
+            elif self._slow:
+                log.debug("Tick for %s is back under deadline", self._uri)
+                self._slow = False
+
+    def _run(self):
+        while True:
+            req = self._next_request()
+            if req is None:
+                return
+
+            start = time.time()
+            try:
+                req.conn.tick_from_engine(**req.kwargs)
+            except Exception:
+                # Don't attempt to show any UI error here, since it
+                # can cause dialogs to appear from nowhere if say
+                # libvirtd is shut down
+                log.debug("Error polling connection %s",
+                        self._uri, exc_info=True)
+            self._record_tick(start, time.time(), req)
+
+            # Need to clear reference to make leak check happy
+            req = None
+
+
 def _show_startup_error(fn):
     """
     Decorator to show a modal error dialog if an exception is raised
@@ -70,13 +200,8 @@ class vmmEngine(vmmGObject):
         self._init_gtk_application()
 
         self._timer = None
-        self._tick_counter = 0
-        self._tick_thread_slow = False
-        self._tick_thread = threading.Thread(name="Tick thread",
-                                            target=self._handle_tick_queue,
-                                            args=())
-        self._tick_thread.daemon = True
-        self._tick_queue = queue.PriorityQueue(100)
+        self._tick_workers = {}
+        self._tick_workers_lock = threading.Lock()
 
 
     @property
@@ -87,6 +212,10 @@ class vmmEngine(vmmGObject):
     def _cleanup(self):
         if self._timer is not None:
             GLib.source_remove(self._timer)
+        with self._tick_workers_lock:
+            for worker in self._tick_workers.values():
+                worker.stop()
+            self._tick_workers = {}
 
 
     #################
@@ -104,8 +233,10 @@ class vmmEngine(vmmGObject):
             self.config.on_stats_update_interval_changed(
                 self._timer_changed_cb))
 
+        vmmConnectionManager.get_instance().connect(
+                "conn-removed", self._conn_removed_cb)
+
         self._schedule_timer()
-        self._tick_thread.start()
         self._tick()
 
         uris = list(self._connobjs.keys())
@@ -339,17 +470,18 @@ class vmmEngine(vmmGObject):
 
         self._timer = self.timeout_add(interval, self._tick)
 
+    def _get_tick_worker(self, uri):
+        with self._tick_workers_lock:
+            if uri not in self._tick_workers:
+                self._tick_workers[uri] = _TickWorker(uri)
+            worker = self._tick_workers[uri]
+        worker.deadline = self.config.get_stats_update_interval()
+        return worker
+
     def _add_obj_to_tick_queue(self, obj, isprio, **kwargs):
-        if self._tick_queue.full():
-            if not self._tick_thread_slow:
-                log.debug("Tick is slow, not running at requested rate.")
-                self._tick_thread_slow = True
+        if self._exiting:
             return
-
-        self._tick_counter += 1
-        self._tick_queue.put((isprio and PRIO_HIGH or PRIO_LOW,
-                              self._tick_counter,
-                              obj, kwargs))
+        self._get_tick_worker(obj.get_uri()).queue_tick(obj, isprio, kwargs)
 
     def schedule_priority_tick(self, conn, kwargs):
         # Called directly from connection
@@ -359,24 +491,27 @@ class vmmEngine(vmmGObject):
         for conn in self._connobjs.values():
             self._add_obj_to_tick_queue(conn, False,
                                         stats_update=True, pollvm=True)
+        self.config.log_settings_reads()
         return 1
 
-    def _handle_tick_queue(self):
-        while True:
-            ignore1, ignore2, conn, kwargs = self._tick_queue.get()
-            try:
-                conn.tick_from_engine(**kwargs)
-            except Exception:
-                # Don't attempt to show any UI error here, since it
-                # can cause dialogs to appear from nowhere if say
-                # libvirtd is shut down
-                log.debug("Error polling connection %s",
-                        conn.get_uri(), exc_info=True)
+    def _conn_removed_cb(self, _src, uri):
+        with self._tick_workers_lock:
+            worker = self._tick_workers.pop(uri, None)
+        if worker:
+            log.debug("Stopping tick worker for %s: %s",
+                    uri, worker.get_stats())
+            worker.stop()
 
-            # Need to clear reference to make leak check happy
-            conn = None
-            self._tick_queue.task_done()
-        return 1
+    def get_tick_stats(self, uri):
+        """
+        Return a dict of tick latency metrics for the connection with
+        the passed URI, or None if it was never ticked
+        """
+        with self._tick_workers_lock:
+            worker = self._tick_workers.get(uri)
+        if not worker:
+            return None
+        return worker.get_stats()
 
 
     #####################################
@@ -3,6 +3,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import queue
+
 from gi.repository import Gdk
 from gi.repository import Gtk
 from gi.repository import Pango
@@ -31,9 +33,12 @@ VOL_NUM_COLUMNS = 7
  VOL_COLUMN_CAPACITY,
  VOL_COLUMN_SIZESTR,
  VOL_COLUMN_FORMAT,
- VOL_COLUMN_INUSEBY,
+ VOL_COLUMN_PATH,
  VOL_COLUMN_SENSITIVE) = range(VOL_NUM_COLUMNS)
 
+# Number of volume rows added to the list per main loop iteration
+VOL_POPULATE_CHUNK = 250
+
 POOL_NUM_COLUMNS = 4
 (POOL_COLUMN_CONNKEY,
  POOL_COLUMN_LABEL,
@@ -74,6 +79,19 @@ class vmmHostStorage(vmmGObjectUI):
         self._name_hint = None
 
         self._active_edits = set()
+        # The pool shown in the volume list, and a map of
+        # volume key -> (vmmStorageVolume, xmlobj) for its rows
+        self._vol_list_pool = None
+        self._vol_list_rows = {}
+        self._vol_populate_id = 0
+
+        # 'Used By' strings are computed on demand, for rows that are
+        # actually drawn, by a background thread
+        self._inuseby_cache = {}
+        self._inuseby_old = {}
+        self._inuseby_batch = []
+        self._inuseby_queue = None
+        self._inuseby_generation = 0
         self._addpool = None
         self._addvol = None
         self._volmenu = None
@@ -92,6 +110,7 @@ class vmmHostStorage(vmmGObjectUI):
             "on_vol_list_button_press_event": self._vol_popup_menu_cb,
             "on_vol_list_changed": self._vol_selected_cb,
             "on_vol_add_clicked": self._vol_add_cb,
+            "on_vol_filter_changed": self._vol_filter_changed_cb,
 
             "on_browse_cancel_clicked": self._cancel_clicked_cb,
             "on_browse_local_clicked": self._browse_local_clicked_cb,
@@ -134,6 +153,12 @@ class vmmHostStorage(vmmGObjectUI):
 
         self._xmleditor.cleanup()
         self._xmleditor = None
+        self._vol_list_pool = None
+        self._vol_list_rows = {}
+        self._vol_populate_id += 1
+        if self._inuseby_queue:
+            self._inuseby_queue.put(None)
+            self._inuseby_queue = None
 
     def close(self, ignore1=None, ignore2=None):
         if self._addvol:
@@ -155,6 +180,13 @@ class vmmHostStorage(vmmGObjectUI):
         return _cmp(int(model[iter1][VOL_COLUMN_CAPACITY]),
                     int(model[iter2][VOL_COLUMN_CAPACITY]))
 
+    def _inuseby_sort_func_cb(self, model, iter1, iter2):
+        def _cmp(a, b):
+            return ((a > b) - (a < b))
+
+        return _cmp(self._get_inuseby(model[iter1][VOL_COLUMN_PATH]) or "",
+                    self._get_inuseby(model[iter2][VOL_COLUMN_PATH]) or "")
+
     def _init_ui(self):
         self.widget("storage-pages").set_show_tabs(False)
 
@@ -174,7 +206,7 @@ class vmmHostStorage(vmmGObjectUI):
         self._volmenu.add(volCopyPath)
 
         # Volume list
-        # [key, name, sizestr, capacity, format, in use by string, sensitive]
+        # [key, name, sizestr, capacity, format, target path, sensitive]
         volListModel = Gtk.ListStore(str, str, str, str, str, str, bool)
         self.widget("vol-list").set_model(volListModel)
 
@@ -206,10 +238,12 @@ class vmmHostStorage(vmmGObjectUI):
         volUseCol = Gtk.TreeViewColumn(_("Used By"))
         vol_txt4 = Gtk.CellRendererText()
         volUseCol.pack_start(vol_txt4, False)
-        volUseCol.add_attribute(vol_txt4, 'text', VOL_COLUMN_INUSEBY)
+        volUseCol.set_cell_data_func(vol_txt4, self._vol_inuseby_data_cb)
         volUseCol.add_attribute(vol_txt4, 'sensitive', VOL_COLUMN_SENSITIVE)
-        volUseCol.set_sort_column_id(VOL_COLUMN_INUSEBY)
+        volUseCol.set_sort_column_id(VOL_COLUMN_PATH)
         self.widget("vol-list").append_column(volUseCol)
+        volListModel.set_sort_func(VOL_COLUMN_PATH,
+                                   self._inuseby_sort_func_cb)
 
         volListModel.set_sort_column_id(VOL_COLUMN_NAME,
             Gtk.SortType.ASCENDING)
@@ -401,60 +435,213 @@ class vmmHostStorage(vmmGObjectUI):
         uiutil.set_list_selection(pool_list,
             curpool and curpool.get_connkey() or None)
 
+    def _build_vol_row(self, pool, vol):
+        key = vol.get_connkey()
+
+        try:
+            path = vol.get_target_path()
+            name = vol.get_pretty_name(pool.get_type())
+            cap = str(vol.get_capacity())
+            sizestr = vol.get_pretty_capacity()
+            fmt = vol.get_format() or ""
+        except Exception:
+            log.debug("Error getting volume info for '%s', "
+                          "hiding it", key, exc_info=True)
+            return None
+
+        sensitive = True
+        if self._vol_sensitive_cb:
+            sensitive = self._vol_sensitive_cb(fmt)
+
+        row = [None] * VOL_NUM_COLUMNS
+        row[VOL_COLUMN_KEY] = key
+        row[VOL_COLUMN_NAME] = name
+        row[VOL_COLUMN_SIZESTR] = sizestr
+        row[VOL_COLUMN_CAPACITY] = cap
+        row[VOL_COLUMN_FORMAT] = fmt
+        row[VOL_COLUMN_PATH] = path
+        row[VOL_COLUMN_SENSITIVE] = sensitive
+        return row
+
+    def _sync_vol_rows(self, pool, vols, model, rowmap, oldstate):
+        """
+        Generator that brings model in line with vols, yielding every
+        VOL_POPULATE_CHUNK volumes so the rest can be done from idle
+        callbacks. Rows are only rebuilt for volumes whose object or
+        parsed XML changed since the last sync.
+        """
+        added = updated = 0
+        for idx, vol in enumerate(vols):
+            if idx and not idx % VOL_POPULATE_CHUNK:
+                yield
+
+            key = vol.get_connkey()
+            treeiter = rowmap.pop(key, None)
+            try:
+                xmlobj = vol.get_xmlobj()
+            except Exception:
+                log.debug("Error getting volume XML for '%s', "
+                              "hiding it", key, exc_info=True)
+                xmlobj = None
+
+            if (treeiter is not None and
+                xmlobj is not None and
+                oldstate.get(key) == (vol, xmlobj)):
+                self._vol_list_rows[key] = (vol, xmlobj)
+                continue
+
+            row = None
+            if xmlobj is not None:
+                row = self._build_vol_row(pool, vol)
+            if not row:
+                if treeiter is not None:
+                    model.remove(treeiter)
+                continue
+
+            self._vol_list_rows[key] = (vol, xmlobj)
+            if treeiter is not None:
+                for col, value in enumerate(row):
+                    if model[treeiter][col] != value:
+                        model[treeiter][col] = value
+                updated += 1
+            else:
+                model.append(row)
+                added += 1
+
+        for treeiter in rowmap.values():
+            model.remove(treeiter)
+
+        log.debug("Updated volume list: added=%d updated=%d removed=%d",
+                  added, updated, len(rowmap))
+
     def _populate_vols(self):
+        """
+        Sync the volume list with the current pool. The first chunk of
+        rows is added right away, in list order so the visible part of
+        the list fills first, the rest from idle callbacks. Only volumes
+        whose name starts with the filter text are listed at all.
+        """
         list_widget = self.widget("vol-list")
         pool = self._current_pool()
         vols = pool and pool.get_volumes() or []
         model = list_widget.get_model()
-        list_widget.get_selection().unselect_all()
-        model.clear()
 
-        vadj = self.widget("vol-scroll").get_vadjustment()
-        vscroll_percent = vadj.get_value() // max(vadj.get_upper(), 1)
+        if pool is not self._vol_list_pool:
+            list_widget.get_selection().unselect_all()
+            model.clear()
+            self._vol_list_rows = {}
+            self._vol_list_pool = pool
+            self._inuseby_cache = {}
+            self._inuseby_old = {}
+
+        prefix = self.widget("vol-filter").get_text()
+        if prefix:
+            vols = [v for v in vols if v.get_name().startswith(prefix)]
+        vols.sort(key=lambda v: v.get_name())
+
+        # Domains may have changed since the 'Used By' strings were
+        # computed. Show the old strings until fresh ones arrive
+        self._inuseby_old.update(self._inuseby_cache)
+        self._inuseby_cache = {}
+        self._inuseby_batch = []
+        self._inuseby_generation += 1
+
+        rowmap = dict((row[VOL_COLUMN_KEY], row.iter) for row in model)
+        oldstate = self._vol_list_rows
+        self._vol_list_rows = {}
+
+        self._vol_populate_id += 1
+        populate_id = self._vol_populate_id
+        work = self._sync_vol_rows(pool, vols, model, rowmap, oldstate)
+
+        def _populate_chunk():
+            if populate_id != self._vol_populate_id:
+                # A newer populate call replaced us
+                return False
+            try:
+                next(work)
+                return True
+            except StopIteration:
+                return False
 
-        for vol in vols:
-            key = vol.get_connkey()
+        if _populate_chunk():
+            self.idle_add(_populate_chunk)
+        list_widget.queue_draw()
 
-            try:
-                path = vol.get_target_path()
-                name = vol.get_pretty_name(pool.get_type())
-                cap = str(vol.get_capacity())
-                sizestr = vol.get_pretty_capacity()
-                fmt = vol.get_format() or ""
-            except Exception:
-                log.debug("Error getting volume info for '%s', "
-                              "hiding it", key, exc_info=True)
-                continue
 
-            namestr = None
+    ################################
+    # Background 'Used By' lookups #
+    ################################
+
+    def _get_inuseby(self, path):
+        if path in self._inuseby_cache:
+            return self._inuseby_cache[path]
+        return self._inuseby_old.get(path)
+
+    def _vol_inuseby_data_cb(self, column, cell, model, treeiter, ignore):
+        path = model[treeiter][VOL_COLUMN_PATH]
+        if path and path not in self._inuseby_cache:
+            self._queue_inuseby(path)
+        cell.set_property("text", self._get_inuseby(path) or "")
+
+    def _queue_inuseby(self, path):
+        if path in self._inuseby_batch:
+            return
+        if not self._inuseby_batch:
+            # Collect all the rows drawn in this pass into one request
+            self.idle_add(self._submit_inuseby_batch)
+        self._inuseby_batch.append(path)
+
+    def _submit_inuseby_batch(self):
+        paths = self._inuseby_batch
+        self._inuseby_batch = []
+        if not paths or not self.conn:
+            return
+
+        # Mark them as in flight, so redraws don't request them again
+        for path in paths:
+            self._inuseby_cache[path] = self._inuseby_old.get(path)
+
+        if not self._inuseby_queue:
+            self._inuseby_queue = queue.Queue()
+            self._start_thread(self._inuseby_thread,
+                    "hoststorage inuseby %s" % self.conn.get_uri(),
+                    args=(self.conn, self._inuseby_queue))
+        self._inuseby_queue.put((self._inuseby_generation, paths))
+
+    def _inuseby_thread(self, conn, workqueue):
+        while True:
+            item = workqueue.get()
+            if item is None:
+                return
+
+            generation, paths = item
             try:
-                if path:
-                    names = DeviceDisk.path_in_use_by(vol.conn.get_backend(),
-                                                       path)
-                    namestr = ", ".join(names)
-                    if not namestr:
-                        namestr = None
+                users = DeviceDisk.paths_in_use_by(conn.get_backend(), paths)
             except Exception:
                 log.exception("Failed to determine if storage volume in "
                                   "use.")
+                users = dict((path, []) for path in paths)
+            self.idle_add(self._inuseby_finished, generation, users)
 
-            sensitive = True
-            if self._vol_sensitive_cb:
-                sensitive = self._vol_sensitive_cb(fmt)
+    def _inuseby_finished(self, generation, users):
+        if not self.conn or generation != self._inuseby_generation:
+            return
 
-            row = [None] * VOL_NUM_COLUMNS
-            row[VOL_COLUMN_KEY] = key
-            row[VOL_COLUMN_NAME] = name
-            row[VOL_COLUMN_SIZESTR] = sizestr
-            row[VOL_COLUMN_CAPACITY] = cap
-            row[VOL_COLUMN_FORMAT] = fmt
-            row[VOL_COLUMN_INUSEBY] = namestr
-            row[VOL_COLUMN_SENSITIVE] = sensitive
-            model.append(row)
+        for path, names in users.items():
+            self._inuseby_cache[path] = ", ".join(names) or None
+            self._inuseby_old.pop(path, None)
 
-        def _reset_vscroll_position():
-            vadj.set_value(vadj.get_upper() * vscroll_percent)
-        self.idle_add(_reset_vscroll_position)
+        # The model doesn't know the sort keys changed, so if the list
+        # is sorted by 'Used By', force it to sort again. Setting the
+        # same sort column is a no-op, so unset it first
+        model = self.widget("vol-list").get_model()
+        ignore, sortcol, order = model.get_sort_column_id()
+        if sortcol == VOL_COLUMN_PATH:
+            model.set_sort_column_id(
+                Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID, order)
+            model.set_sort_column_id(sortcol, order)
+        self.widget("vol-list").queue_draw()
 
 
     ##########################
@@ -658,6 +845,9 @@ class vmmHostStorage(vmmGObjectUI):
         can_choose = bool(treeiter and model[treeiter][VOL_COLUMN_SENSITIVE])
         self.widget("choose-volume").set_sensitive(can_choose)
 
+    def _vol_filter_changed_cb(self, src):
+        self._populate_vols()
+
     def _vol_popup_menu_cb(self, src, event):
         if event.button != 3:
             return
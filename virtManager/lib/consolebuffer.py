@@ -0,0 +1,93 @@
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import os
+
+
+class ConsoleBuffer(object):
+    """
+    FIFO byte buffer for console stream data.
+
+    Data is appended in place to a bytearray, and read from an offset
+    into it. The consumed head is only trimmed once it's larger than
+    the unread data, so appending and consuming n bytes costs O(n)
+    overall, unlike repeated bytes concatenation and slicing which
+    copies everything that's still queued every time.
+    """
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._buf) - self._pos
+
+    def append(self, data):
+        self._buf += data
+
+    def peek(self, maxlen=None):
+        """
+        Return up to maxlen bytes from the start of the buffer, without
+        consuming them
+        """
+        end = len(self._buf)
+        if maxlen is not None:
+            end = min(end, self._pos + maxlen)
+        with memoryview(self._buf) as view:
+            return view[self._pos:end].tobytes()
+
+    def consume(self, length):
+        self._pos = min(len(self._buf), self._pos + length)
+        if self._pos * 2 >= len(self._buf):
+            del self._buf[:self._pos]
+            self._pos = 0
+
+    def take(self, maxlen=None):
+        """
+        Remove and return up to maxlen bytes from the start of the buffer
+        """
+        ret = self.peek(maxlen)
+        self.consume(len(ret))
+        return ret
+
+    def clear(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+
+class ConsoleLogWriter(object):
+    """
+    Append console output to a log file. Once the file grows past
+    MAX_SIZE it's moved to <path>.old and a new one is started
+    """
+    MAX_SIZE = 10 * 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._size = 0
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def write(self, data):
+        if self._file is None:
+            self._open()
+        if self._size and self._size + len(data) > self.MAX_SIZE:
+            self._file.close()
+            os.replace(self.path, self.path + ".old")
+            self._open()
+
+        self._file.write(data)
+        self._size += len(data)
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        self._file = None
@@ -3,7 +3,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
-import re
+import array
 import time
 
 import libvirt
@@ -13,6 +13,58 @@ from virtinst import log
 from ..baseclass import vmmGObject
 
 
+def _bytes_to_kib(devbytes):
+    return dict((dev, (val1 // 1024, val2 // 1024)) for
+                dev, (val1, val2) in (devbytes or {}).items())
+
+
+class _DomainAllStats(object):
+    """
+    Compact view of a single domain's getAllDomainStats() output. Parsed
+    once per tick, using the block.count and net.count indexes rather
+    than matching every key of the raw dict
+    """
+    def __init__(self, timestamp, rawstats, domid=-1):
+        self.timestamp = timestamp
+        self.domid = domid
+        self.state = rawstats.get("state.state", 0)
+        self.reason = rawstats.get("state.reason", 0)
+        self.guestcpus = rawstats.get("vcpu.current", 0)
+        self.cpu_time = rawstats.get("cpu.time", 0)
+        self.balloon_current = rawstats.get("balloon.current", 1)
+        self.balloon_unused = rawstats.get("balloon.unused",
+                                           self.balloon_current)
+
+        # {devname: (rd_bytes, wr_bytes)}
+        self.disks = self._parse_devices(rawstats,
+                "block", "rd.bytes", "wr.bytes")
+        # {devname: (rx_bytes, tx_bytes)}
+        self.nets = self._parse_devices(rawstats,
+                "net", "rx.bytes", "tx.bytes")
+
+    @staticmethod
+    def _parse_devices(rawstats, prefix, name1, name2):
+        ret = {}
+        for idx in range(rawstats.get(prefix + ".count", 0)):
+            base = "%s.%d." % (prefix, idx)
+            dev = rawstats.get(base + "name", str(idx))
+            val1 = rawstats.get(base + name1, 0)
+            val2 = rawstats.get(base + name2, 0)
+            if dev in ret:
+                val1 += ret[dev][0]
+                val2 += ret[dev][1]
+            ret[dev] = (val1, val2)
+        return ret
+
+    def disk_totals(self):
+        return (sum(d[0] for d in self.disks.values()),
+                sum(d[1] for d in self.disks.values()))
+
+    def net_totals(self):
+        return (sum(n[0] for n in self.nets.values()),
+                sum(n[1] for n in self.nets.values()))
+
+
 class _VMStatsRecord(object):
     """
     Tracks a set of VM stats for a single timestamp
@@ -22,7 +74,8 @@ class _VMStatsRecord(object):
                  cpuHostPercent, cpuGuestPercent,
                  curmem, currMemPercent,
                  diskRdBytes, diskWrBytes,
-                 netRxBytes, netTxBytes):
+                 netRxBytes, netTxBytes,
+                 diskDevBytes=None, netDevBytes=None):
         self.timestamp = timestamp
         self.cpuTime = cpuTime
         self.cpuTimeAbs = cpuTimeAbs
@@ -35,20 +88,154 @@ class _VMStatsRecord(object):
         self.netRxKiB = netRxBytes // 1024
         self.netTxKiB = netTxBytes // 1024
 
+        # Per device {devname: (rdKiB, wrKiB)} and {devname: (rxKiB, txKiB)}
+        self.diskDevKiB = _bytes_to_kib(diskDevBytes)
+        self.netDevKiB = _bytes_to_kib(netDevBytes)
+
         # These are set in _VMStatsList.append_stats
         self.diskRdRate = None
         self.diskWrRate = None
         self.netRxRate = None
         self.netTxRate = None
+        self.diskDevRates = {}
+        self.netDevRates = {}
+
+
+class StatsRing(object):
+    """
+    Fixed capacity ring buffer of stats samples, with one typed
+    array.array per metric and O(1) append.
+
+    Each array is allocated at twice the capacity and every sample is
+    written to both halves, so the latest N samples of a metric are
+    always contiguous and can be returned as a zero-copy memoryview.
+
+    :param fields: list of (fieldname, array typecode) pairs
+    :param capacity: maximum number of samples to keep
+    """
+    def __init__(self, fields, capacity):
+        self._fields = fields
+        self._capacity = 0
+        self._arrays = {}
+        self._head = 0
+        self._count = 0
+        self.resize(capacity)
+
+    def __len__(self):
+        return self._count
+
+    def _new_array(self, typecode, capacity):
+        return array.array(typecode, [0]) * (capacity * 2)
+
+    def resize(self, capacity):
+        """
+        Change the capacity, keeping the most recent samples
+        """
+        capacity = max(int(capacity), 1)
+        if capacity == self._capacity:
+            return
+
+        keep = min(self._count, capacity)
+        arrays = {}
+        for fieldname, typecode in self._fields:
+            newarray = self._new_array(typecode, capacity)
+            if keep:
+                olddata = array.array(typecode, self.view(fieldname, keep))
+                newarray[0:keep] = olddata
+                newarray[capacity:capacity + keep] = olddata
+            arrays[fieldname] = newarray
+
+        self._arrays = arrays
+        self._capacity = capacity
+        self._count = keep
+        self._head = keep % capacity
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    def append(self, **values):
+        """
+        Add a new sample. Fields not passed are set to 0
+        """
+        pos = self._head
+        mirror = pos + self._capacity
+        for fieldname, typecode in self._fields:
+            val = values.get(fieldname, 0)
+            if typecode != "d":
+                val = int(val)
+            arr = self._arrays[fieldname]
+            arr[pos] = val
+            arr[mirror] = val
+
+        self._head = (pos + 1) % self._capacity
+        self._count = min(self._count + 1, self._capacity)
+
+    def get(self, fieldname, idx=0):
+        """
+        Return the value of fieldname from idx samples ago, or 0 if
+        we don't have that many samples
+        """
+        if idx >= self._count:
+            return 0
+        return self._arrays[fieldname][(self._head - 1 - idx) %
+                                       self._capacity]
+
+    def view(self, fieldname, limit=None):
+        """
+        Return a memoryview of the latest 'limit' samples of fieldname,
+        oldest first. The view is only valid until the next resize()
+        """
+        count = self._count
+        if limit is not None:
+            count = min(count, limit)
+        start = self._head + self._capacity - count
+        return memoryview(self._arrays[fieldname])[start:start + count]
+
+    def vector(self, fieldname, limit, ceil=100.0):
+        """
+        Return a list of 'limit' samples of fieldname divided by ceil,
+        newest first and padded with 0, as the graph widgets expect
+        """
+        ret = [val / ceil for val in reversed(self.view(fieldname, limit))]
+        if len(ret) < limit:
+            ret.extend([0] * (limit - len(ret)))
+        return ret
 
 
 class _VMStatsList(vmmGObject):
     """
-    Tracks a list of VMStatsRecords for a single VM
+    Tracks the stats history for a single VM
     """
+    _FIELDS = [
+        ("timestamp", "d"),
+        ("cpuTime", "q"),
+        ("cpuTimeAbs", "q"),
+        ("cpuHostPercent", "d"),
+        ("cpuGuestPercent", "d"),
+        ("curmem", "q"),
+        ("currMemPercent", "d"),
+        ("diskRdKiB", "q"),
+        ("diskWrKiB", "q"),
+        ("netRxKiB", "q"),
+        ("netTxKiB", "q"),
+        ("diskRdRate", "d"),
+        ("diskWrRate", "d"),
+        ("netRxRate", "d"),
+        ("netTxRate", "d"),
+    ]
+
     def __init__(self):
         vmmGObject.__init__(self)
-        self._stats = []
+        self._stats = StatsRing(self._FIELDS, self._get_capacity())
+
+        # Per device counters and rates from the latest sample
+        self._devstats = {
+            "diskDevKiB": {},
+            "netDevKiB": {},
+            "diskDevRates": {},
+            "netDevRates": {},
+        }
 
         self.diskRdMaxRate = 10.0
         self.diskWrMaxRate = 10.0
@@ -62,51 +249,73 @@ class _VMStatsList(vmmGObject):
     def _cleanup(self):
         pass
 
+    def _get_capacity(self):
+        # get_vector can request history length + 1 entries
+        return self.config.get_stats_history_length() + 1
+
     def append_stats(self, newstats):
-        expected = self.config.get_stats_history_length()
-        current = len(self._stats)
-        if current > expected:
-            del(self._stats[expected:current])
+        self._stats.resize(self._get_capacity())
+        have_old = bool(len(self._stats))
+        timediff = float(newstats.timestamp - self._stats.get("timestamp"))
 
         def _calculate_rate(record_name):
             ret = 0.0
-            if self._stats:
-                oldstats = self._stats[0]
+            if have_old:
                 ratediff = (getattr(newstats, record_name) -
-                            getattr(oldstats, record_name))
-                timediff = newstats.timestamp - oldstats.timestamp
-                ret = float(ratediff) / float(timediff)
+                            self._stats.get(record_name))
+                ret = float(ratediff) / timediff
             return max(ret, 0.0)
 
+        def _calculate_dev_rates(record_name):
+            ret = {}
+            olddevs = self._devstats[record_name]
+            for dev, (newval1, newval2) in getattr(
+                    newstats, record_name).items():
+                if not have_old or dev not in olddevs:
+                    ret[dev] = (0.0, 0.0)
+                    continue
+                oldval1, oldval2 = olddevs[dev]
+                ret[dev] = (max((newval1 - oldval1) / timediff, 0.0),
+                            max((newval2 - oldval2) / timediff, 0.0))
+            return ret
+
         newstats.diskRdRate = _calculate_rate("diskRdKiB")
         newstats.diskWrRate = _calculate_rate("diskWrKiB")
         newstats.netRxRate = _calculate_rate("netRxKiB")
         newstats.netTxRate = _calculate_rate("netTxKiB")
+        newstats.diskDevRates = _calculate_dev_rates("diskDevKiB")
+        newstats.netDevRates = _calculate_dev_rates("netDevKiB")
 
         self.diskRdMaxRate = max(newstats.diskRdRate, self.diskRdMaxRate)
         self.diskWrMaxRate = max(newstats.diskWrRate, self.diskWrMaxRate)
         self.netRxMaxRate = max(newstats.netRxRate, self.netRxMaxRate)
         self.netTxMaxRate = max(newstats.netTxRate, self.netTxMaxRate)
 
-        self._stats.insert(0, newstats)
+        self._stats.append(**dict((fieldname, getattr(newstats, fieldname))
+                                  for fieldname, ignore in self._FIELDS))
+        for record_name in self._devstats:
+            self._devstats[record_name] = getattr(newstats, record_name)
 
     def get_record(self, record_name):
-        if not self._stats:
-            return 0
-        return getattr(self._stats[0], record_name)
+        return self._stats.get(record_name)
+
+    def get_dev_rates(self, record_name):
+        """
+        Return the latest {devname: (rate1, rate2)} dict for record_name
+        """
+        return self._devstats[record_name]
+
+    def get_view(self, record_name, limit=None):
+        """
+        Zero-copy memoryview of the raw record history, oldest first
+        """
+        return self._stats.view(record_name, limit)
 
     def get_vector(self, record_name, limit, ceil=100.0):
-        vector = []
         statslen = self.config.get_stats_history_length() + 1
         if limit is not None:
             statslen = min(statslen, limit)
-
-        for i in range(statslen):
-            if i < len(self._stats):
-                vector.append(getattr(self._stats[i], record_name) / ceil)
-            else:
-                vector.append(0)
-        return vector
+        return self._stats.vector(record_name, statslen, ceil)
 
     def get_in_out_vector(self, name1, name2, limit, ceil):
         if ceil is None:
@@ -159,10 +368,10 @@ class vmmStatsManager(vmmGObject):
         prevCpuTime = self.get_vm_statslist(vm).get_record("cpuTimeAbs")
 
         if allstats:
-            state = allstats.get("state.state", 0)
-            guestcpus = allstats.get("vcpu.current", 0)
-            cpuTimeAbs = allstats.get("cpu.time", 0)
-            timestamp = allstats.get("virt-manager.timestamp")
+            state = allstats.state
+            guestcpus = allstats.guestcpus
+            cpuTimeAbs = allstats.cpu_time
+            timestamp = allstats.timestamp
         else:
             state, guestcpus, cpuTimeAbs = self._old_cpu_stats_helper(vm)
 
@@ -221,20 +430,17 @@ class vmmStatsManager(vmmGObject):
     def _sample_net_stats(self, vm, allstats):
         rx = 0
         tx = 0
+        devstats = {}
         statslist = self.get_vm_statslist(vm)
         if (not self._net_stats_supported or
             not vm.is_active() or
             not self.config.get_stats_enable_net_poll()):
             statslist.stats_net_skip = []
-            return rx, tx
+            return rx, tx, devstats
 
         if allstats:
-            for key in allstats.keys():
-                if re.match(r"net.[0-9]+.rx.bytes", key):
-                    rx += allstats[key]
-                if re.match(r"net.[0-9]+.tx.bytes", key):
-                    tx += allstats[key]
-            return rx, tx
+            rx, tx = allstats.net_totals()
+            return rx, tx, allstats.nets
 
         for iface in vm.get_interface_devices_norefresh():
             dev = iface.target_dev
@@ -244,10 +450,11 @@ class vmmStatsManager(vmmGObject):
                 continue
 
             devrx, devtx = self._old_net_stats_helper(vm, dev)
+            devstats[dev] = (devrx, devtx)
             rx += devrx
             tx += devtx
 
-        return rx, tx
+        return rx, tx, devstats
 
 
     #######################
@@ -281,20 +488,17 @@ class vmmStatsManager(vmmGObject):
     def _sample_disk_stats(self, vm, allstats):
         rd = 0
         wr = 0
+        devstats = {}
         statslist = self.get_vm_statslist(vm)
         if (not self._disk_stats_supported or
             not vm.is_active() or
             not self.config.get_stats_enable_disk_poll()):
             statslist.stats_disk_skip = []
-            return rd, wr
+            return rd, wr, devstats
 
         if allstats:
-            for key in allstats.keys():
-                if re.match(r"block.[0-9]+.rd.bytes", key):
-                    rd += allstats[key]
-                if re.match(r"block.[0-9]+.wr.bytes", key):
-                    wr += allstats[key]
-            return rd, wr
+            rd, wr = allstats.disk_totals()
+            return rd, wr, allstats.disks
 
         # LXC has a special blockStats method
         if vm.conn.is_lxc() and self._disk_stats_lxc_supported:
@@ -303,7 +507,7 @@ class vmmStatsManager(vmmGObject):
                 if io:
                     rd = io[1]
                     wr = io[3]
-                    return rd, wr
+                    return rd, wr, devstats
             except libvirt.libvirtError as e:
                 log.debug("LXC style disk stats not supported: %s", e)
                 self._disk_stats_lxc_supported = False
@@ -316,10 +520,11 @@ class vmmStatsManager(vmmGObject):
                 continue
 
             diskrd, diskwr = self._old_disk_stats_helper(vm, dev)
+            devstats[dev] = (diskrd, diskwr)
             rd += diskrd
             wr += diskwr
 
-        return rd, wr
+        return rd, wr, devstats
 
 
     #########################
@@ -373,9 +578,8 @@ class vmmStatsManager(vmmGObject):
             statslist.mem_stats_period_is_set = True
 
         if allstats:
-            totalmem = allstats.get("balloon.current", 1)
-            curmem = max(0,
-                    totalmem - allstats.get("balloon.unused", totalmem))
+            totalmem = allstats.balloon_current
+            curmem = max(0, totalmem - allstats.balloon_unused)
         else:
             totalmem, curmem = self._old_mem_stats_helper(vm)
 
@@ -394,6 +598,9 @@ class vmmStatsManager(vmmGObject):
             return {}
 
         statflags = 0
+        if not conn.using_domain_events:
+            # vmmDomain.tick takes the domain state from here
+            statflags |= libvirt.VIR_DOMAIN_STATS_STATE
         if self.config.get_stats_enable_cpu_poll():
             statflags |= libvirt.VIR_DOMAIN_STATS_STATE
             statflags |= libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
@@ -412,10 +619,11 @@ class vmmStatsManager(vmmGObject):
             timestamp = time.time()
             rawallstats = conn.get_backend().getAllDomainStats(statflags, 0)
 
-            # Reformat the output to be a bit more friendly
+            # Parse the output once here, rather than once per sample.
+            # ID() doesn't trigger an RPC, it's part of the reply
             for dom, domallstats in rawallstats:
-                domallstats["virt-manager.timestamp"] = timestamp
-                ret[dom.UUIDString()] = domallstats
+                ret[dom.UUIDString()] = _DomainAllStats(
+                        timestamp, domallstats, dom.ID())
         except libvirt.libvirtError as err:
             if conn.support.is_error_nosupport(err):
                 log.debug("conn does not support getAllDomainStats()")
@@ -430,25 +638,35 @@ class vmmStatsManager(vmmGObject):
     ##############
 
     def refresh_vm_stats(self, vm):
-        domallstats = self._latest_all_stats.get(vm.get_uuid(), None)
+        domallstats = self.get_vm_all_stats(vm)
 
         (cpuTime, cpuTimeAbs, cpuHostPercent, cpuGuestPercent, timestamp) = \
                 self._sample_cpu_stats(vm, domallstats)
         currMemPercent, curmem = self._sample_mem_stats(vm, domallstats)
-        diskRdBytes, diskWrBytes = self._sample_disk_stats(vm, domallstats)
-        netRxBytes, netTxBytes = self._sample_net_stats(vm, domallstats)
+        diskRdBytes, diskWrBytes, diskDevBytes = self._sample_disk_stats(
+                vm, domallstats)
+        netRxBytes, netTxBytes, netDevBytes = self._sample_net_stats(
+                vm, domallstats)
 
         newstats = _VMStatsRecord(
                 timestamp, cpuTime, cpuTimeAbs,
                 cpuHostPercent, cpuGuestPercent,
                 curmem, currMemPercent,
                 diskRdBytes, diskWrBytes,
-                netRxBytes, netTxBytes)
+                netRxBytes, netTxBytes,
+                diskDevBytes, netDevBytes)
         self.get_vm_statslist(vm).append_stats(newstats)
 
     def cache_all_stats(self, conn):
         self._latest_all_stats = self._get_all_stats(conn)
 
+    def get_vm_all_stats(self, vm):
+        """
+        Return the getAllDomainStats() data for vm from the last
+        cache_all_stats call, or None
+        """
+        return (self._latest_all_stats or {}).get(vm.get_uuid(), None)
+
     def get_vm_statslist(self, vm):
         if vm.get_connkey() not in self._vm_stats:
             self._vm_stats[vm.get_connkey()] = _VMStatsList()
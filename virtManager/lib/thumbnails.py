@@ -0,0 +1,270 @@
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import collections
+import io
+import os
+import threading
+import time
+
+from gi.repository import GdkPixbuf
+
+from virtinst import log
+
+
+# Largest width or height of a thumbnail
+THUMBNAIL_SIZE = 450
+
+_SNAP_THUMB_PREFIX = "snap-thumb-"
+# Full size screenshots written by older versions
+_SNAP_SCREENSHOT_PREFIX = "snap-screenshot-"
+_SCREENSHOT_EXTS = ["ppm", "png"]
+
+
+def take_screenshot(vm):
+    """
+    Return (mimetype, data) of a screenshot of the VM's first screen
+    """
+    stream = None
+    try:
+        stream = vm.conn.get_backend().newStream(0)
+        screen = 0
+        flags = 0
+        mime = vm.get_backend().screenshot(stream, screen, flags)
+
+        ret = io.BytesIO()
+        def _write_cb(_stream, data, userdata):
+            ignore = stream
+            ignore = userdata
+            ret.write(data)
+
+        stream.recvAll(_write_cb, None)
+        return mime, ret.getvalue()
+    finally:
+        try:
+            if stream:
+                stream.finish()
+        except Exception:
+            pass
+
+
+def scale_pixbuf(pixbuf, maxsize=THUMBNAIL_SIZE):
+    def _scale(big, small, maxsize):
+        if big <= maxsize:
+            return big, small
+        factor = float(maxsize) / float(big)
+        return maxsize, int(factor * float(small))
+
+    width = pixbuf.get_width()
+    height = pixbuf.get_height()
+    if width > height:
+        width, height = _scale(width, height, maxsize)
+    else:
+        height, width = _scale(height, width, maxsize)
+
+    return pixbuf.scale_simple(width, height,
+                               GdkPixbuf.InterpType.BILINEAR)
+
+
+def make_thumbnail(mime, data):
+    """
+    Decode the passed screenshot data and scale it to thumbnail size
+    """
+    loader = GdkPixbuf.PixbufLoader.new_with_mime_type(mime)
+    loader.write(data)
+    pixbuf = loader.get_pixbuf()
+    loader.close()
+    return scale_pixbuf(pixbuf)
+
+
+class vmmThumbnailCache(object):
+    """
+    Cache of screenshot thumbnails, for snapshots and running VMs.
+
+    Snapshot thumbnails are stored pre-scaled as PNGs in the VM cache
+    dir. Decoded pixbufs are kept in an LRU which is bounded by their
+    pixel data size, so selecting a snapshot again doesn't touch the
+    disk or decode anything.
+
+    VM thumbnails are only kept in memory. They are captured from the
+    connection tick, at most once every get_stats_thumbnail_interval
+    seconds per VM, and only if that setting is enabled.
+    """
+    MAX_MEMORY = 32 * 1024 * 1024
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not cls._instance:
+            cls._instance = vmmThumbnailCache()
+        return cls._instance
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (pixbuf, nbytes), least recently used first
+        self._lru = collections.OrderedDict()
+        self._size = 0
+        self._capture_times = {}
+
+
+    ###############
+    # LRU helpers #
+    ###############
+
+    def _lru_get(self, key):
+        with self._lock:
+            if key not in self._lru:
+                return None
+            self._lru.move_to_end(key)
+            return self._lru[key][0]
+
+    def _lru_remove(self, key):
+        with self._lock:
+            if key in self._lru:
+                self._size -= self._lru.pop(key)[1]
+
+    def _lru_put(self, key, pixbuf):
+        nbytes = pixbuf.get_rowstride() * pixbuf.get_height()
+        self._lru_remove(key)
+        with self._lock:
+            self._lru[key] = (pixbuf, nbytes)
+            self._size += nbytes
+            while self._size > self.MAX_MEMORY and len(self._lru) > 1:
+                ignore, (ignore, oldbytes) = self._lru.popitem(last=False)
+                self._size -= oldbytes
+
+    def get_memory_usage(self):
+        return self._size
+
+
+    #######################
+    # Snapshot thumbnails #
+    #######################
+
+    def _snapshot_key(self, vm, name):
+        return ("snapshot", vm.conn.get_uri(), vm.get_uuid(), name)
+
+    def _snapshot_thumb_path(self, vm, name):
+        return os.path.join(vm.get_cache_dir(),
+                            "%s%s.png" % (_SNAP_THUMB_PREFIX, name))
+
+    def _snapshot_screenshot_paths(self, vm, name):
+        basename = os.path.join(vm.get_cache_dir(),
+                                _SNAP_SCREENSHOT_PREFIX + name)
+        return [basename + "." + ext for ext in _SCREENSHOT_EXTS]
+
+    def _convert_snapshot_screenshot(self, vm, name):
+        """
+        Turn a full size screenshot written by an older version into
+        a thumbnail, and remove the original
+        """
+        mimes = {"ppm": "image/x-portable-pixmap", "png": "image/png"}
+        for path in self._snapshot_screenshot_paths(vm, name):
+            if not os.path.exists(path):
+                continue
+
+            mime = mimes[path.rsplit(".", 1)[1]]
+            with open(path, "rb") as f:
+                pixbuf = make_thumbnail(mime, f.read())
+            self.save_snapshot_thumbnail(vm, name, pixbuf)
+            return pixbuf
+
+    def get_snapshot_thumbnail(self, vm, name):
+        """
+        Return the thumbnail pixbuf for the named snapshot, or None
+        """
+        key = self._snapshot_key(vm, name)
+        pixbuf = self._lru_get(key)
+        if pixbuf:
+            return pixbuf
+
+        try:
+            path = self._snapshot_thumb_path(vm, name)
+            if os.path.exists(path):
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+            else:
+                pixbuf = self._convert_snapshot_screenshot(vm, name)
+        except Exception:
+            log.exception("Error reading thumbnail for snapshot %s", name)
+            return None
+
+        if pixbuf:
+            self._lru_put(key, pixbuf)
+        return pixbuf
+
+    def save_snapshot_thumbnail(self, vm, name, pixbuf):
+        self.remove_snapshot_thumbnail(vm, name)
+        path = self._snapshot_thumb_path(vm, name)
+        log.debug("Writing snapshot thumbnail to %s", path)
+        pixbuf.savev(path, "png", [], [])
+        self._lru_put(self._snapshot_key(vm, name), pixbuf)
+
+    def remove_snapshot_thumbnail(self, vm, name):
+        self._lru_remove(self._snapshot_key(vm, name))
+        for path in ([self._snapshot_thumb_path(vm, name)] +
+                     self._snapshot_screenshot_paths(vm, name)):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def prune_snapshot_thumbnails(self, vm, names):
+        """
+        Remove the thumbnails of all snapshots not in names, like those
+        deleted outside of virt-manager
+        """
+        names = set(names)
+        stale = set()
+        for filename in os.listdir(vm.get_cache_dir()):
+            for prefix in [_SNAP_THUMB_PREFIX, _SNAP_SCREENSHOT_PREFIX]:
+                if not filename.startswith(prefix):
+                    continue
+                name = os.path.splitext(filename[len(prefix):])[0]
+                if name not in names:
+                    stale.add(name)
+
+        for name in stale:
+            log.debug("Removing stale thumbnail for snapshot %s", name)
+            self.remove_snapshot_thumbnail(vm, name)
+
+
+    #################
+    # VM thumbnails #
+    #################
+
+    def _vm_key(self, vm):
+        return ("vm", vm.conn.get_uri(), vm.get_uuid())
+
+    def capture_vm_thumbnail(self, vm, interval):
+        """
+        Capture a thumbnail of the running vm, if the last one is more
+        than interval seconds old. Called from the connection tick
+        """
+        key = self._vm_key(vm)
+        if not vm.is_active():
+            self._capture_times.pop(key, None)
+            self._lru_remove(key)
+            return
+        if time.time() - self._capture_times.get(key, 0) < interval:
+            return
+        self._capture_times[key] = time.time()
+
+        if not vm.get_xmlobj(refresh_if_nec=False).devices.graphics:
+            return
+        try:
+            mime, data = take_screenshot(vm)
+            self._lru_put(key, make_thumbnail(mime, data))
+        except Exception as e:
+            log.debug("Error capturing thumbnail of %s: %s", vm, e)
+
+    def get_vm_thumbnail(self, vm):
+        """
+        Return the last captured thumbnail of vm, or None
+        """
+        return self._lru_get(self._vm_key(vm))
+
+    def remove_vm_thumbnail(self, vm):
+        key = self._vm_key(vm)
+        self._capture_times.pop(key, None)
+        self._lru_remove(key)
@@ -15,6 +15,7 @@ from virtinst import xmlutil
 from . import vmmenu
 from .lib import uiutil
 from .baseclass import vmmGObjectUI
+from .connection import vmmConnection
 from .connmanager import vmmConnectionManager
 from .engine import vmmEngine
 from .lib.graphwidgets import CellRendererSparkline
@@ -157,6 +158,13 @@ class vmmManager(vmmGObjectUI):
         self.max_disk_rate = 10.0
         self.max_net_rate = 10.0
 
+        # Maps _row_key(conn_or_vm) -> Gtk.TreeRowReference, so get_row
+        # doesn't need to walk the whole model
+        self._rowrefs = {}
+        # Row keys waiting for a batched row_changed emission
+        self._pending_row_updates = set()
+        self._row_update_scheduled = False
+
         # Initialize stat polling columns based on global polling
         # preferences (we want signal handlers for this)
         self.enable_polling(COL_GUEST_CPU)
@@ -201,6 +209,9 @@ class vmmManager(vmmGObjectUI):
 
 
     def _cleanup(self):
+        self._rowrefs = None
+        self._pending_row_updates = None
+
         self.diskcol = None
         self.guestcpucol = None
         self.memcol = None
@@ -419,22 +430,40 @@ class vmmManager(vmmGObjectUI):
             return handle
         return handle.conn
 
-    def get_row(self, conn_or_vm):
-        def _walk(model, rowiter, obj):
-            while rowiter:
-                row = model[rowiter]
-                if row[ROW_HANDLE] == obj:
-                    return row
-                if model.iter_has_child(rowiter):
-                    ret = _walk(model, model.iter_nth_child(rowiter, 0), obj)
-                    if ret:
-                        return ret
-                rowiter = model.iter_next(rowiter)
-
-        if not len(self.model):
+    @staticmethod
+    def _row_key(conn_or_vm):
+        """
+        Build a hashable row index key that doesn't hold a reference
+        to the object itself
+        """
+        if isinstance(conn_or_vm, vmmConnection):
+            return (conn_or_vm.get_uri(), None)
+        return (conn_or_vm.conn.get_uri(), conn_or_vm.get_connkey())
+
+    def _add_rowref(self, conn_or_vm, rowiter):
+        path = self.model.get_path(rowiter)
+        self._rowrefs[self._row_key(conn_or_vm)] = Gtk.TreeRowReference.new(
+                self.model, path)
+
+    def _remove_row(self, rowiter):
+        handle = self.model[rowiter][ROW_HANDLE]
+        self._rowrefs.pop(self._row_key(handle), None)
+        self.model.remove(rowiter)
+
+    def _remove_conn_children(self, conn_row):
+        child = self.model.iter_children(conn_row.iter)
+        while child is not None:
+            self._remove_row(child)
+            child = self.model.iter_children(conn_row.iter)
+
+    def _get_row_by_key(self, key):
+        rowref = self._rowrefs.get(key)
+        if not rowref or not rowref.valid():
             return None
-        return _walk(self.model, self.model.get_iter_first(), conn_or_vm)
+        return self.model[rowref.get_path()]
 
+    def get_row(self, conn_or_vm):
+        return self._get_row_by_key(self._row_key(conn_or_vm))
 
     ####################
     # Action listeners #
@@ -557,7 +586,8 @@ class vmmManager(vmmGObjectUI):
 
         vm_row = self._build_row(None, vm)
         conn_row = self.get_row(conn)
-        self.model.append(conn_row.iter, vm_row)
+        rowiter = self.model.append(conn_row.iter, vm_row)
+        self._add_rowref(vm, rowiter)
 
         vm.connect("state-changed", self.vm_changed)
         vm.connect("resources-sampled", self.vm_row_updated)
@@ -566,14 +596,29 @@ class vmmManager(vmmGObjectUI):
         # Expand a connection when adding a vm to it
         self.widget("vm-list").expand_row(conn_row.path, False)
 
+    def vm_renamed(self, conn, oldconnkey, newconnkey):
+        """
+        Renaming changes the VM's connkey, so move its row index entry
+        and any pending row update over to the new key
+        """
+        oldkey = (conn.get_uri(), oldconnkey)
+        newkey = (conn.get_uri(), newconnkey)
+        rowref = self._rowrefs.pop(oldkey, None)
+        if rowref:
+            self._rowrefs[newkey] = rowref
+        if oldkey in self._pending_row_updates:
+            self._pending_row_updates.discard(oldkey)
+            self._pending_row_updates.add(newkey)
+
+        vm = conn.get_vm(newconnkey)
+        if vm:
+            self.vm_changed(vm)
+
     def vm_removed(self, conn, connkey):
-        parent = self.get_row(conn).iter
-        for rowidx in range(self.model.iter_n_children(parent)):
-            rowiter = self.model.iter_nth_child(parent, rowidx)
-            vm = self.model[rowiter][ROW_HANDLE]
-            if vm.get_connkey() == connkey:
-                self.model.remove(rowiter)
-                break
+        row = self._get_row_by_key((conn.get_uri(), connkey))
+        if row is None:
+            return
+        self._remove_row(row.iter)
 
     def _build_conn_hint(self, conn):
         hint = conn.get_uri()
@@ -646,10 +691,12 @@ class vmmManager(vmmGObjectUI):
             return
 
         conn_row = self._build_row(conn, None)
-        self.model.append(None, conn_row)
+        rowiter = self.model.append(None, conn_row)
+        self._add_rowref(conn, rowiter)
 
         conn.connect("vm-added", self.vm_added)
         conn.connect("vm-removed", self.vm_removed)
+        conn.connect("vm-renamed", self.vm_renamed)
         conn.connect("resources-sampled", self.conn_row_updated)
         conn.connect("state-changed", self.conn_state_changed)
 
@@ -657,30 +704,44 @@ class vmmManager(vmmGObjectUI):
             self.vm_added(conn, vm.get_connkey())
 
     def _conn_removed(self, _src, uri):
-        conn_row = None
-        for row in self.model:
-            if row[ROW_IS_CONN] and row[ROW_HANDLE].get_uri() == uri:
-                conn_row = row
-                break
+        conn_row = self._get_row_by_key((uri, None))
         if conn_row is None:
             return
 
-        child = self.model.iter_children(conn_row.iter)
-        while child is not None:
-            self.model.remove(child)
-            child = self.model.iter_children(conn_row.iter)
-        self.model.remove(conn_row.iter)
+        self._remove_conn_children(conn_row)
+        self._remove_row(conn_row.iter)
 
 
     #############################
     # State/UI updating methods #
     #############################
 
-    def vm_row_updated(self, vm):
-        row = self.get_row(vm)
-        if row is None:
+    def _queue_row_update(self, conn_or_vm):
+        """
+        Stats ticks emit resources-sampled for every VM in a row, so
+        batch up the row_changed emissions into one idle callback
+        """
+        self._pending_row_updates.add(self._row_key(conn_or_vm))
+        if self._row_update_scheduled:
+            return
+        self._row_update_scheduled = True
+        self.idle_add(self._flush_row_updates)
+
+    def _flush_row_updates(self):
+        self._row_update_scheduled = False
+        if self._pending_row_updates is None:
             return
-        self.model.row_changed(row.path, row.iter)
+        keys = self._pending_row_updates
+        self._pending_row_updates = set()
+
+        for key in keys:
+            row = self._get_row_by_key(key)
+            if row is None:
+                continue
+            self.model.row_changed(row.path, row.iter)
+
+    def vm_row_updated(self, vm):
+        self._queue_row_update(vm)
 
     def vm_changed(self, vm):
         row = self.get_row(vm)
@@ -742,22 +803,17 @@ class vmmManager(vmmGObjectUI):
         row[ROW_HINT] = self._build_conn_hint(conn)
 
         if not conn.is_active():
-            child = self.model.iter_children(row.iter)
-            while child is not None:
-                self.model.remove(child)
-                child = self.model.iter_children(row.iter)
+            self._remove_conn_children(row)
 
         self.conn_row_updated(conn)
         self.update_current_selection()
 
     def conn_row_updated(self, conn):
-        row = self.get_row(conn)
-
         self.max_disk_rate = max(self.max_disk_rate, conn.disk_io_max_rate())
         self.max_net_rate = max(self.max_net_rate,
                                 conn.network_traffic_max_rate())
 
-        self.model.row_changed(row.path, row.iter)
+        self._queue_row_update(conn)
 
     def change_run_text(self, can_restore):
         if can_restore:
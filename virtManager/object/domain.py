@@ -99,6 +99,11 @@ class vmmDomainSnapshot(vmmLibvirtObject):
         vmmLibvirtObject.__init__(self, conn, backend, backend.getName(),
                                   DomainSnapshot)
 
+        # Set by vmmDomain.list_snapshots if it could determine these
+        # without fetching the snapshot XML
+        self._is_current = None
+        self._is_external = None
+
 
     ##########################
     # Required class methods #
@@ -158,9 +163,26 @@ class vmmDomainSnapshot(vmmLibvirtObject):
             status = libvirt.VIR_DOMAIN_NOSTATE
         return LibvirtEnumMap.VM_STATUS_ICONS[status]
 
+    def set_list_info(self, is_current, is_external):
+        self._is_current = is_current
+        self._is_external = is_external
+
+    def is_xml_loaded(self):
+        return self._xmlobj is not None
+
     def is_current(self):
+        if self._is_current is not None:
+            return self._is_current
         return self._backend.isCurrent()
-    def is_external(self):
+    def is_external(self, fetch=True):
+        """
+        :param fetch: If False and the answer would need the XML, which
+            isn't fetched yet, return False rather than fetching it
+        """
+        if self._is_external is not None:
+            return self._is_external
+        if not fetch and not self.is_xml_loaded():
+            return False
         if self.get_xmlobj().memory_type == "external":
             return True
         for disk in self.get_xmlobj().disks:
@@ -189,20 +211,27 @@ class vmmDomain(vmmLibvirtObject):
         self._uuid = None
         self._has_managed_save = None
         self._snapshot_list = None
+        self._snapshot_cache = {}
         self._autostart = None
         self._domain_caps = None
         self._status_reason = None
         self._ip_cache = None
 
+        # (state, reason, ID) seen by the last tick, and when the XML
+        # was last invalidated from tick()
+        self._tick_state_marker = None
+        self._tick_xml_time = 0
+
         self.managedsave_supported = False
         self._domain_state_supported = False
 
         self.inspection = vmmInspectionData()
 
     def _cleanup(self):
-        for snap in self._snapshot_list or []:
+        for snap in self._snapshot_cache.values():
             snap.cleanup()
         self._snapshot_list = None
+        self._snapshot_cache = {}
         vmmLibvirtObject._cleanup(self)
 
     def _init_libvirt_state(self):
@@ -1034,14 +1063,58 @@ class vmmDomain(vmmLibvirtObject):
 
         return self._backend.openGraphicsFD(0, flags)
 
+    def _list_snapshot_info(self):
+        """
+        Return the name of the current snapshot, and the set of external
+        snapshot names, or None if the latter can't be listed directly.
+        At most three RPCs, no matter how many snapshots there are
+        """
+        current = None
+        try:
+            if self._backend.hasCurrentSnapshot():
+                current = self._backend.snapshotCurrent().getName()
+        except libvirt.libvirtError as e:
+            log.debug("Error looking up current snapshot: %s", e)
+
+        external = None
+        flag = getattr(libvirt, "VIR_DOMAIN_SNAPSHOT_LIST_EXTERNAL", None)
+        if flag is not None:
+            try:
+                external = set(s.getName() for s in
+                               self._backend.listAllSnapshots(flag))
+            except libvirt.libvirtError as e:
+                log.debug("Error listing external snapshots: %s", e)
+        return current, external
+
     def list_snapshots(self):
+        """
+        Return the domain's snapshots. Only the snapshot list is fetched,
+        each snapshot's XML is fetched on first access. Snapshot objects,
+        and with them their parsed XML, are reused by name across
+        refresh_snapshots() calls
+        """
         if self._snapshot_list is None:
-            newlist = []
-            for rawsnap in self._backend.listAllSnapshots():
-                obj = vmmDomainSnapshot(self.conn, rawsnap)
-                obj.init_libvirt_state()
-                newlist.append(obj)
-            self._snapshot_list = newlist
+            rawsnaps = self._backend.listAllSnapshots()
+            current, external = None, None
+            if rawsnaps:
+                current, external = self._list_snapshot_info()
+
+            newcache = {}
+            for rawsnap in rawsnaps:
+                name = rawsnap.getName()
+                obj = self._snapshot_cache.pop(name, None)
+                if obj:
+                    obj.change_name_backend(rawsnap)
+                else:
+                    obj = vmmDomainSnapshot(self.conn, rawsnap)
+                obj.set_list_info(name == current,
+                        None if external is None else name in external)
+                newcache[name] = obj
+
+            for obj in self._snapshot_cache.values():
+                obj.cleanup()
+            self._snapshot_cache = newcache
+            self._snapshot_list = list(newcache.values())
         return self._snapshot_list[:]
 
     @vmmLibvirtObject.lifecycle_action
@@ -1401,6 +1474,17 @@ class vmmDomain(vmmLibvirtObject):
     def disk_write_rate(self):
         return self._get_stats().get_record("diskWrRate")
 
+    def network_dev_rates(self):
+        """
+        Return {target_dev: (rx KiB/s, tx KiB/s)} for the latest sample
+        """
+        return self._get_stats().get_dev_rates("netDevRates")
+    def disk_dev_rates(self):
+        """
+        Return {target: (read KiB/s, write KiB/s)} for the latest sample
+        """
+        return self._get_stats().get_dev_rates("diskDevRates")
+
     def network_traffic_rate(self):
         return self.network_tx_rate() + self.network_rx_rate()
     def network_traffic_max_rate(self):
@@ -1535,6 +1619,45 @@ class vmmDomain(vmmLibvirtObject):
     # Polling helpers #
     ###################
 
+    # Without events, the XML is refetched at least this often even
+    # if the state didn't change, to pick up config changes made
+    # by other clients
+    _TICK_XML_MAX_AGE = 60
+
+    def _tick_refresh_status(self):
+        """
+        Refresh status for conns without domain events. The state comes
+        from the conn wide getAllDomainStats() call the stats manager
+        already made this tick, so there's no per domain RPC. The XML
+        is only invalidated if state, reason or ID changed, or it's
+        older than _TICK_XML_MAX_AGE.
+        """
+        allstats = self.conn.statsmanager.get_vm_all_stats(self)
+        if allstats:
+            state = allstats.state
+            marker = (allstats.state, allstats.reason, allstats.domid)
+        else:
+            state = self._backend.info()[0]
+            marker = None
+
+        now = time.time()
+        if (marker is None or
+            marker != self._tick_state_marker or
+            now - self._tick_xml_time > self._TICK_XML_MAX_AGE):
+            self._invalidate_xml()
+            self._tick_xml_time = now
+        self._tick_state_marker = marker
+
+        ret = self._refresh_status(newstatus=state, cansignal=False)
+
+        # Set these after _refresh_status, which invalidates the XML
+        # and with it the cached reason and ID if the state changed
+        if allstats:
+            self._id = allstats.domid
+            if self._domain_state_supported:
+                self._status_reason = allstats.reason
+        return ret
+
     def tick(self, stats_update=True):
         if (not self._using_events() and
             not stats_update):
@@ -1542,12 +1665,7 @@ class vmmDomain(vmmLibvirtObject):
 
         dosignal = False
         if not self._using_events():
-            # For domains it's pretty important that we are always using
-            # the latest XML, but other objects probably don't want to do
-            # this since it could be a performance hit.
-            self._invalidate_xml()
-            info = self._backend.info()
-            dosignal = self._refresh_status(newstatus=info[0], cansignal=False)
+            dosignal = self._tick_refresh_status()
 
         if stats_update:
             self.conn.statsmanager.refresh_vm_stats(self)
@@ -73,6 +73,25 @@ class vmmStorageVolume(vmmLibvirtObject):
     # Actions #
     ###########
 
+    def refresh_if_changed(self):
+        """
+        Compare the volume's info() against the cached XML, and refetch
+        the XML only if the key, capacity or allocation changed. Returns
+        True if the XML was refreshed
+        """
+        xmlobj = self._xmlobj
+        if xmlobj is None:
+            # Never fetched, that happens on first access
+            return False
+
+        ignore, capacity, allocation = self._backend.info()
+        if (xmlobj.key == self._backend.key() and
+            xmlobj.capacity == capacity and
+            xmlobj.allocation == allocation):
+            return False
+        self.ensure_latest_xml(nosignal=True)
+        return True
+
     def get_parent_pool(self):
         name = self._backend.storagePoolLookupByVolume().name()
         for pool in self.conn.list_pools():
@@ -155,6 +174,7 @@ class vmmStoragePool(vmmLibvirtObject):
 
         self._last_refresh_time = 0
         self._volumes = None
+        self._volumes_stale = False
 
 
     ##########################
@@ -194,7 +214,9 @@ class vmmStoragePool(vmmLibvirtObject):
 
     def _invalidate_xml(self):
         vmmLibvirtObject._invalidate_xml(self)
-        self._volumes = None
+        # Keep the volume objects around, so the next update can reuse
+        # the ones that didn't change
+        self._volumes_stale = True
 
     def _cleanup(self):
         vmmLibvirtObject._cleanup(self)
@@ -267,14 +289,46 @@ class vmmStoragePool(vmmLibvirtObject):
         if not self.is_active():
             self._volumes = []
             return
-        if not force and self._volumes is not None:
+        if (not force and
+            self._volumes is not None and
+            not self._volumes_stale):
             return
 
         keymap = dict((o.get_connkey(), o) for o in self._volumes or [])
-        (ignore, ignore, allvols) = pollhelpers.fetch_volumes(
+        (ignore, newvols, allvols) = pollhelpers.fetch_volumes(
             self.conn.get_backend(), self.get_backend(), keymap,
-            lambda obj, key: vmmStorageVolume(self.conn, obj, key))
+            lambda obj, key: vmmStorageVolume(self.conn, obj, key),
+            pollcache=self.conn.get_poll_cache(),
+            statekey=("volume", self.get_uuid()))
+        if force and self._volumes is not None:
+            self._refresh_changed_volumes(allvols, newvols)
         self._volumes = allvols
+        self._volumes_stale = False
+
+    def _refresh_changed_volumes(self, allvols, newvols):
+        """
+        After a pool refresh, fetch XML for the new volumes and for the
+        known ones whose info() changed. Unchanged volumes keep their
+        object and parsed XML, so UI lists can skip them too.
+        """
+        pollcache = self.conn.get_poll_cache()
+        newvols = set(newvols)
+        changed = 0
+        for vol in allvols:
+            if vol in newvols:
+                vol.init_libvirt_state()
+                continue
+
+            try:
+                if pollcache:
+                    pollcache.count_rpc()
+                if vol.refresh_if_changed():
+                    changed += 1
+            except Exception as e:
+                log.debug("Error refreshing volume %s: %s", vol, e)
+
+        log.debug("Refreshed pool=%s volumes: total=%d new=%d changed=%d",
+                  self.get_name(), len(allvols), len(newvols), changed)
 
 
     #########################
@@ -5,9 +5,6 @@
 
 # pylint: disable=wrong-import-position
 
-import gi
-gi.require_version('Libosinfo', '1.0')
-
 from virtinst.buildconfig import BuildConfig
 
 
@@ -57,8 +54,6 @@ from virtinst.storage import StoragePool, StorageVolume
 
 from virtinst.devices import *  # pylint: disable=wildcard-import
 
-from virtinst.install.installer import Installer
-
 from virtinst.guest import Guest
 from virtinst.cloner import Cloner
 from virtinst.snapshot import DomainSnapshot
@@ -66,3 +61,12 @@ from virtinst.snapshot import DomainSnapshot
 from virtinst.connection import VirtinstConnection
 
 from virtinst.logger import log
+
+
+def __getattr__(name):
+    # The install/ subpackage pulls in requests, libosinfo and friends,
+    # only import it for the callers that actually install something
+    if name == "Installer":
+        from virtinst.install.installer import Installer
+        return Installer
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
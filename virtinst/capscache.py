@@ -0,0 +1,138 @@
+#
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from .logger import log
+
+
+class CapsCache(object):
+    """
+    On disk cache of a connection's capabilities and domcapabilities XML.
+
+    Fetching these is a noticeable chunk of CLI startup over remote
+    connections, and they only change when the host changes. There's one
+    cache file per URI, holding the capabilities and the domcapabilities
+    for every (emulator, arch, machine, virttype) that was asked for.
+    Its content is only used if the connection still reports the same
+    libvirt daemon and hypervisor versions, and if it's not older than
+    MAX_AGE. The versions are fetched on connect anyway, so checking
+    them doesn't add a round trip.
+
+    Some changes don't bump any version, like installing firmware
+    packages or loading the kvm module, or a different host showing up
+    behind the same URI. Those are only picked up once MAX_AGE passes,
+    or with --no-cache.
+
+    We store the raw XML rather than parsed objects: our XML objects can't
+    be serialized, so only the round trip is saved, not the parsing.
+    """
+    MAX_AGE = 24 * 60 * 60
+    _CAPS_KEY = "capabilities"
+
+    def __init__(self, conn, cachedir):
+        self._conn = conn
+        urihash = hashlib.sha256(conn.uri.encode("utf-8")).hexdigest()
+        self._path = os.path.join(cachedir, "capabilities",
+                                  urihash + ".json")
+        self._data = None
+
+    def _get_key(self):
+        return {
+            "uri": self._conn.uri,
+            "daemon_version": self._conn.daemon_version(),
+            "conn_version": self._conn.conn_version(),
+        }
+
+    def _new_data(self):
+        return {
+            "key": self._get_key(),
+            "timestamp": time.time(),
+            "entries": {},
+        }
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return None
+
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+        except Exception as e:
+            log.debug("Error reading caps cache %s: %s", self._path, e)
+            return None
+
+        age = time.time() - data.get("timestamp", 0)
+        if data.get("key") != self._get_key():
+            log.debug("caps cache %s is for a different host version",
+                    self._path)
+            return None
+        if age < 0 or age > self.MAX_AGE:
+            log.debug("caps cache %s has expired", self._path)
+            return None
+        if not isinstance(data.get("entries"), dict):
+            return None
+        return data
+
+    def _save(self):
+        # Write to a temporary file and rename it into place, so
+        # concurrent processes never see partially written content
+        tmpname = None
+        try:
+            dirname = os.path.dirname(self._path)
+            os.makedirs(dirname, 0o700, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f)
+            os.replace(tmpname, self._path)
+            tmpname = None
+        except Exception as e:
+            log.debug("Error writing caps cache %s: %s", self._path, e)
+        finally:
+            if tmpname:
+                os.unlink(tmpname)
+
+    def _get_data(self):
+        if self._data is None:
+            self._data = self._load() or self._new_data()
+        return self._data
+
+    def _lookup(self, name, fetch_cb):
+        data = self._get_data()
+        if name in data["entries"]:
+            log.debug("Using cached %s from %s", name, self._path)
+            return data["entries"][name]
+
+        xml = fetch_cb()
+        data["entries"][name] = xml
+        self._save()
+        return xml
+
+    def get_capabilities(self, fetch_cb):
+        """
+        Return the capabilities XML, calling fetch_cb to get it if
+        it isn't cached
+        """
+        return self._lookup(self._CAPS_KEY, fetch_cb)
+
+    def get_domain_capabilities(self, emulator, arch, machine, virttype,
+                                fetch_cb):
+        """
+        Return the domcapabilities XML for the passed parameters, calling
+        fetch_cb to get it if it isn't cached
+        """
+        name = "domcapabilities:%s:%s:%s:%s" % (
+                emulator, arch, machine, virttype)
+        return self._lookup(name, fetch_cb)
+
+    def clear(self):
+        self._data = None
+        if os.path.exists(self._path):
+            os.unlink(self._path)
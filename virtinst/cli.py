@@ -12,6 +12,7 @@ import os
 import re
 import shlex
 import shutil
+import subprocess
 import sys
 import traceback
 import types
@@ -27,7 +28,6 @@ from .logger import log
 from .nodedev import NodeDevice
 from .osdict import OSDB
 from .storage import StoragePool, StorageVolume
-from .install.unattended import UnattendedData
 
 
 HAS_VIRTVIEWER = shutil.which("virt-viewer")
@@ -122,6 +122,57 @@ def earlyLogging():
     logging.basicConfig(level=logging.DEBUG, format='%(message)s')
 
 
+def profile_startup(appname):
+    """
+    Handle --profile-startup: run the command again in a child python
+    with '-X importtime' and cProfile enabled, save both reports to the
+    app cache dir, and return the child's exit code. Returns None if
+    the option wasn't passed.
+
+    This needs to happen before argument parsing and, in the child,
+    before any imports, so it can't be a regular option handler.
+    """
+    if "--profile-startup" not in sys.argv[1:]:
+        return None
+
+    args = [a for a in sys.argv[1:] if a != "--profile-startup"]
+    outdir = VirtinstConnection.get_app_cache_dir()
+    os.makedirs(outdir, 0o751, exist_ok=True)
+    proffile = os.path.join(outdir, appname + "-startup.prof")
+    importfile = os.path.join(outdir, appname + "-startup.importtime")
+
+    cmd = [sys.executable, "-X", "importtime", "-m", "cProfile",
+           "-o", proffile, sys.argv[0]] + args
+    proc = subprocess.run(cmd, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+    # importtime output goes to stderr, split it from the app's output
+    imports = []
+    with open(importfile, "w") as f:
+        for line in proc.stderr.splitlines(True):
+            if not line.startswith("import time:"):
+                sys.stderr.write(line)
+                continue
+            f.write(line)
+            fields = line.split(":", 1)[1].split("|")
+            try:
+                imports.append((int(fields[1]), fields[2].strip()))
+            except ValueError:
+                # The header line
+                continue
+
+    # Logging isn't set up yet, so print directly rather than
+    # through print_stderr, which would log everything twice
+    lines = [_("Imported %(count)d modules. Slowest imports "
+               "(cumulative usec):") % {"count": len(imports)}]
+    for usec, name in sorted(imports, reverse=True)[:10]:
+        lines.append("  %10d  %s" % (usec, name))
+    lines.append(_("Import times written to %s") % importfile)
+    lines.append(_("cProfile data written to %s") % proffile)
+    print("\n".join(lines), file=sys.stderr)
+    return proc.returncode
+
+
 def setupLogging(appname, debug_stdout, do_quiet, cli_app=True):
     _reset_global_state()
     get_global_state().quiet = do_quiet
@@ -216,7 +267,7 @@ def in_testsuite():
 # Libvirt connection helpers #
 ##############################
 
-def getConnection(uri, conn=None):
+def getConnection(uri, conn=None, use_cache=True):
     if conn:
         # preopened connection passed in via test suite
         return conn
@@ -225,6 +276,9 @@ def getConnection(uri, conn=None):
     conn = VirtinstConnection(uri)
     conn.open(_openauth_cb, None)
     log.debug("Received libvirt URI %s", conn.uri)
+    if use_cache:
+        conn.enable_caps_cache()
+        conn.enable_download_cache()
 
     return conn
 
@@ -548,6 +602,9 @@ def add_connect_option(parser, invoker=None):
     else:
         parser.add_argument("--connect", metavar="URI",
                 help=_("Connect to hypervisor with libvirt URI"))
+    parser.add_argument("--no-cache", action="store_true",
+            help=_("Don't use or update the on-disk caches of host "
+                   "capabilities and downloaded install files"))
 
 
 def add_misc_options(grp, prompt=False, replace=False,
@@ -609,6 +666,9 @@ def add_misc_options(grp, prompt=False, replace=False,
                    help=_("Suppress non-error output"))
     grp.add_argument("-d", "--debug", action="store_true",
                    help=_("Print debugging information"))
+    grp.add_argument("--profile-startup", action="store_true",
+                   help=_("Report module import times and a cProfile "
+                          "dump of this command's execution"))
 
 
 def add_metadata_option(grp):
@@ -1514,6 +1574,7 @@ class ParserUnattended(VirtCLIParser):
 
 
 def parse_unattended(optstr):
+    from .install.unattended import UnattendedData
     ret = UnattendedData()
     if optstr == 1:
         # This means bare --unattended, so there's nothing to parse
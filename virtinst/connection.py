@@ -5,12 +5,15 @@
 # See the COPYING file in the top-level directory.
 
 import os
+import sys
 import weakref
 
 import libvirt
 
+from . import capscache
 from . import pollhelpers
 from . import support
+from . import resourceindex
 from . import Capabilities
 from .guest import Guest
 from .logger import log
@@ -44,12 +47,12 @@ class VirtinstConnection(object):
     @staticmethod
     def get_app_cache_dir():
         ret = ""
-        try:
-            # We don't want to depend on glib for virt-install
+        # We don't want to depend on glib for virt-install, and
+        # importing it is slow. Only ask it if the app already loaded it,
+        # otherwise the XDG lookup below gives the same answer
+        if "gi.repository.GLib" in sys.modules:
             from gi.repository import GLib
             ret = GLib.get_user_cache_dir()
-        except ImportError:
-            pass
 
         if not ret:
             ret = os.environ.get("XDG_CACHE_HOME")
@@ -91,8 +94,12 @@ class VirtinstConnection(object):
         self._libvirtconn = None
         self._uriobj = URI(self._uri)
         self._caps = None
+        self._caps_cache = None
+        self._download_cache_dir = None
 
         self._fetch_cache = {}
+        self._domain_index = resourceindex.DomainIndex()
+        self._volume_index = resourceindex.VolumeIndex()
 
         # These let virt-manager register a callback which provides its
         # own cached object lists, rather than doing fresh calls
@@ -123,8 +130,7 @@ class VirtinstConnection(object):
 
     def _get_caps(self):
         if not self._caps:
-            self._caps = Capabilities(self,
-                self._libvirtconn.getCapabilities())
+            self._caps = Capabilities(self, self.getCapabilities())
         return self._caps
     caps = property(_get_caps)
 
@@ -145,7 +151,10 @@ class VirtinstConnection(object):
             ret = self._libvirtconn.close()
         self._libvirtconn = None
         self._uri = None
+        self._caps_cache = None
         self._fetch_cache = {}
+        self._domain_index = resourceindex.DomainIndex()
+        self._volume_index = resourceindex.VolumeIndex()
         return ret
 
     def fake_conn_predictable(self):
@@ -153,6 +162,35 @@ class VirtinstConnection(object):
 
     def invalidate_caps(self):
         self._caps = None
+        if self._caps_cache:
+            self._caps_cache.clear()
+
+    def enable_caps_cache(self):
+        """
+        Cache capabilities and domcapabilities XML on disk, so later
+        processes connecting to the same host can skip fetching them.
+        Must be called after open()
+        """
+        if self.in_testsuite():
+            return
+        self._caps_cache = capscache.CapsCache(self,
+                self.get_app_cache_dir())
+
+    def enable_download_cache(self):
+        """
+        Cache kernels and initrds fetched from network install trees
+        on disk, so repeated installs from the same tree skip the download
+        """
+        if self.in_testsuite():
+            return
+        self._download_cache_dir = os.path.join(
+                self.get_app_cache_dir(), "downloads")
+
+    def get_download_cache_dir(self):
+        """
+        Directory for urlfetcher's download cache, or None if disabled
+        """
+        return self._download_cache_dir
 
     def is_open(self):
         return bool(self._libvirtconn)
@@ -313,6 +351,25 @@ class VirtinstConnection(object):
         return self._fetch_cache[key][:]
 
 
+    def fetch_domain_index(self):
+        """
+        Returns a DomainIndex of the disk paths and MAC addresses used
+        by all domains. It is brought up to date with the current
+        fetch_all_domains() output on every call, re-indexing only
+        objects that are new since the previous call.
+        """
+        self._domain_index.sync(self.fetch_all_domains())
+        return self._domain_index
+
+    def fetch_volume_index(self):
+        """
+        Returns a VolumeIndex of all storage volumes, kept up to date
+        like fetch_domain_index
+        """
+        self._volume_index.sync(self.fetch_all_vols())
+        return self._volume_index
+
+
     #########################
     # Libvirt API overrides #
     #########################
@@ -320,6 +377,22 @@ class VirtinstConnection(object):
     def getURI(self):
         return self._uri
 
+    def getCapabilities(self):
+        if not self._caps_cache:
+            return self._libvirtconn.getCapabilities()
+        return self._caps_cache.get_capabilities(
+            self._libvirtconn.getCapabilities)
+
+    def getDomainCapabilities(self, emulator, arch, machine, virttype,
+                              flags=0):
+        def _fetch():
+            return self._libvirtconn.getDomainCapabilities(
+                emulator, arch, machine, virttype, flags)
+        if not self._caps_cache or flags:
+            return _fetch()
+        return self._caps_cache.get_domain_capabilities(
+                emulator, arch, machine, virttype, _fetch)
+
 
     #########################
     # Public version checks #
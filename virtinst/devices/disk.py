@@ -160,43 +160,34 @@ class DeviceDisk(Device):
         if not path:
             return []
 
-        # Find all volumes that have 'path' somewhere in their backing chain
-        vols = []
-        volmap = dict((vol.backing_store, vol)
-                      for vol in conn.fetch_all_vols() if vol.backing_store)
-        backpath = path
-        while backpath in volmap:
-            vol = volmap[backpath]
-            if vol in vols:
-                break
-            backpath = vol.target_path
-            vols.append(backpath)
-
-        ret = []
-        vms = conn.fetch_all_domains()
-        for vm in vms:
-            if not read_only:
-                if path in [vm.os.kernel, vm.os.initrd, vm.os.dtb]:
-                    ret.append(vm.name)
-                    continue
-
-            for disk in vm.devices.disk:
-                if disk.path in vols and vm.name not in ret:
-                    # VM uses the path indirectly via backing store
-                    ret.append(vm.name)
-                    break
+        # Find all volumes that have 'path' somewhere in their backing
+        # chain. A VM using any of those uses the path indirectly
+        backing_paths = conn.fetch_volume_index().get_backed_paths(path)
 
-                if disk.path != path:
-                    continue
+        vms = conn.fetch_domain_index().get_path_users(
+                path, shareable, read_only, backing_paths)
+        return [vm.name for vm in vms]
 
-                if shareable and disk.shareable:
-                    continue
-                if read_only and disk.read_only:
-                    continue
+    @staticmethod
+    def paths_in_use_by(conn, paths):
+        """
+        Like path_in_use_by, for many paths at once. The domain and
+        volume indexes are only brought up to date once, rather than
+        on every lookup.
 
-                ret.append(vm.name)
-                break
+        :returns: dict of path -> list of VM names
+        """
+        volindex = conn.fetch_volume_index()
+        domindex = conn.fetch_domain_index()
 
+        ret = {}
+        for path in paths:
+            if not path:
+                ret[path] = []
+                continue
+            backing_paths = volindex.get_backed_paths(path)
+            vms = domindex.get_path_users(path, False, False, backing_paths)
+            ret[path] = [vm.name for vm in vms]
         return ret
 
     @staticmethod
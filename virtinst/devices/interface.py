@@ -144,14 +144,10 @@ class DeviceInterface(Device):
         """
         Raise RuntimeError if the passed mac conflicts with a defined VM
         """
-        vms = conn.fetch_all_domains()
-        for vm in vms:
-            for nic in vm.devices.interface:
-                nicmac = nic.macaddr or ""
-                if nicmac.lower() == searchmac.lower():
-                    raise RuntimeError(
-                            _("The MAC address '%s' is in use "
-                              "by another virtual machine.") % searchmac)
+        if conn.fetch_domain_index().get_mac_users(searchmac):
+            raise RuntimeError(
+                    _("The MAC address '%s' is in use "
+                      "by another virtual machine.") % searchmac)
 
 
     ###############
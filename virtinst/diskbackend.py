@@ -6,6 +6,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import errno
+import fcntl
 import os
 import re
 import stat
@@ -172,10 +174,8 @@ def path_is_network_vol(conn, path):
     if not path:
         return False
 
-    for volxml in conn.fetch_all_vols():
-        if volxml.target_path == path:
-            return volxml.type == "network"
-    return False
+    volxml = conn.fetch_volume_index().get_vol(path)
+    return bool(volxml and volxml.type == "network")
 
 
 def _get_dev_type(path, vol_xml, vol_object, pool_xml, remote):
@@ -494,6 +494,174 @@ class _StorageCreator(_StorageBase):
         return False
 
 
+# ioctl number for FICLONE, from linux/fs.h
+_FICLONE = 0x40049409
+
+
+def _reflink(src_fd, dst_fd):
+    """
+    Try to make dst_fd a copy-on-write clone of src_fd. Only works on
+    filesystems like btrfs and XFS. The whole content of dst_fd is
+    replaced, so callers only use this on a freshly created, still
+    empty destination
+    """
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return True
+    except OSError as e:
+        log.debug("FICLONE reflink not available: %s", e)
+        return False
+
+
+class _LocalCopier(object):
+    """
+    Copy the contents of src_fd to dst_fd for CloneStorageCreator.
+
+    Only the data extents of the source, found via SEEK_DATA/SEEK_HOLE,
+    are read. If sparse=True, the destination is expected to be a freshly
+    truncated file: source holes and all zero blocks are skipped, so they
+    stay holes. Otherwise holes are written out as zeros, so the
+    destination ends up fully allocated. Data extents are copied
+    in-kernel with copy_file_range or sendfile when possible.
+    """
+    CHUNK_SIZE = 1024 * 1024 * 10
+    ZERO_BLOCK_SIZE = 4096
+    _ZEROS = bytes(CHUNK_SIZE)
+
+    def __init__(self, src_fd, dst_fd, sparse, meter):
+        self._src_fd = src_fd
+        self._dst_fd = dst_fd
+        self._sparse = sparse
+        self._meter = meter
+        self._copy_methods = [self._copy_file_range,
+                              self._sendfile,
+                              self._readwrite]
+
+    def copy(self):
+        srcsize = os.lseek(self._src_fd, 0, os.SEEK_END)
+        pos = 0
+        for start, end in self._data_extents(srcsize):
+            self._copy_hole(pos, start)
+            self._copy_data(start, end)
+            pos = end
+        self._copy_hole(pos, srcsize)
+
+    def _data_extents(self, srcsize):
+        """
+        Yield (start, end) offsets of every data extent in the source.
+        Falls back to a single extent if SEEK_DATA isn't supported
+        """
+        seek_data = getattr(os, "SEEK_DATA", None)
+        seek_hole = getattr(os, "SEEK_HOLE", None)
+        pos = 0
+        while pos < srcsize:
+            if seek_data is None:
+                yield pos, srcsize
+                return
+            try:
+                start = os.lseek(self._src_fd, pos, seek_data)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # No data past pos
+                    return
+                if e.errno not in [errno.EINVAL, errno.ENOTSUP]:
+                    raise
+                log.debug("SEEK_DATA not supported: %s", e)
+                seek_data = None
+                continue
+            end = min(os.lseek(self._src_fd, start, seek_hole), srcsize)
+            yield start, end
+            pos = end
+
+    def _pwrite_all(self, data, offset):
+        view = memoryview(data)
+        while view:
+            ret = os.pwrite(self._dst_fd, view, offset)
+            view = view[ret:]
+            offset += ret
+
+    def _copy_hole(self, start, end):
+        if self._sparse:
+            self._meter.update(end)
+            return
+        pos = start
+        while pos < end:
+            count = min(self.CHUNK_SIZE, end - pos)
+            self._pwrite_all(memoryview(self._ZEROS)[:count], pos)
+            pos += count
+            self._meter.update(pos)
+
+    def _copy_data(self, start, end):
+        pos = start
+        while pos < end:
+            count = min(self.CHUNK_SIZE, end - pos)
+            if self._sparse:
+                ret = self._copy_sparse_chunk(pos, count)
+            else:
+                ret = self._copy_chunk(pos, count)
+            if not ret:
+                # Source shrunk underneath us
+                return
+            pos += ret
+            self._meter.update(pos)
+
+    def _copy_sparse_chunk(self, pos, count):
+        """
+        Copy a chunk, skipping every all zero block
+        """
+        data = os.pread(self._src_fd, count, pos)
+        if data == memoryview(self._ZEROS)[:len(data)]:
+            return len(data)
+
+        view = memoryview(data)
+        blocksize = self.ZERO_BLOCK_SIZE
+        zeroblock = self._ZEROS[:blocksize]
+        runstart = None
+        for offset in range(0, len(data), blocksize):
+            block = view[offset:offset + blocksize]
+            iszero = (block == zeroblock[:len(block)])
+            if iszero and runstart is not None:
+                self._pwrite_all(view[runstart:offset], pos + runstart)
+                runstart = None
+            elif not iszero and runstart is None:
+                runstart = offset
+        if runstart is not None:
+            self._pwrite_all(view[runstart:], pos + runstart)
+        return len(data)
+
+    def _copy_chunk(self, pos, count):
+        """
+        Copy a chunk using the first method that works, dropping
+        methods that the kernel or filesystem doesn't support
+        """
+        while True:
+            method = self._copy_methods[0]
+            try:
+                return method(pos, count)
+            except OSError as e:
+                if (method == self._readwrite or
+                    e.errno not in [errno.ENOSYS, errno.EXDEV, errno.EINVAL,
+                                    errno.ENOTSUP, errno.EBADF]):
+                    raise
+                log.debug("%s failed, falling back: %s", method.__name__, e)
+                self._copy_methods.pop(0)
+
+    def _copy_file_range(self, pos, count):
+        if not hasattr(os, "copy_file_range"):
+            raise OSError(errno.ENOSYS, "copy_file_range not available")
+        return os.copy_file_range(self._src_fd, self._dst_fd, count,
+                                  pos, pos)
+
+    def _sendfile(self, pos, count):
+        os.lseek(self._dst_fd, pos, os.SEEK_SET)
+        return os.sendfile(self._dst_fd, self._src_fd, pos, count)
+
+    def _readwrite(self, pos, count):
+        data = os.pread(self._src_fd, count, pos)
+        self._pwrite_all(data, pos)
+        return len(data)
+
+
 class CloneStorageCreator(_StorageCreator):
     """
     Handles manually copying local files for Cloner
@@ -557,27 +725,10 @@ class CloneStorageCreator(_StorageCreator):
 
         # If a destination file exists and sparse flag is True,
         # this priority takes an existing file.
+        sparse = (not os.path.exists(self._output_path) and self._sparse)
 
-        if (not os.path.exists(self._output_path) and self._sparse):
-            clone_block_size = 4096
-            sparse = True
-            fd = None
-            try:
-                fd = os.open(self._output_path, os.O_WRONLY | os.O_CREAT,
-                             0o640)
-                os.ftruncate(fd, size_bytes)
-            finally:
-                if fd:
-                    os.close(fd)
-        else:
-            clone_block_size = 1024 * 1024 * 10
-            sparse = False
-
-        log.debug("Local Cloning %s to %s, sparse=%s, block_size=%s",
-                      self._input_path, self._output_path,
-                      sparse, clone_block_size)
-
-        zeros = '\0' * 4096
+        log.debug("Local Cloning %s to %s, sparse=%s",
+                      self._input_path, self._output_path, sparse)
 
         src_fd, dst_fd = None, None
         try:
@@ -585,25 +736,16 @@ class CloneStorageCreator(_StorageCreator):
                 src_fd = os.open(self._input_path, os.O_RDONLY)
                 dst_fd = os.open(self._output_path,
                                  os.O_WRONLY | os.O_CREAT, 0o640)
-
-                i = 0
-                while 1:
-                    l = os.read(src_fd, clone_block_size)
-                    s = len(l)
-                    if s == 0:
+                if sparse:
+                    if _reflink(src_fd, dst_fd):
+                        log.debug("Cloned with a FICLONE reflink")
                         meter.end(size_bytes)
-                        break
-                    # check sequence of zeros
-                    if sparse and zeros == l:
-                        os.lseek(dst_fd, s, 1)
-                    else:
-                        b = os.write(dst_fd, l)
-                        if s != b:
-                            meter.end(i)
-                            break
-                    i += s
-                    if i < size_bytes:
-                        meter.update(i)
+                        return
+                    # Everything we don't write stays a hole
+                    os.ftruncate(dst_fd, size_bytes)
+
+                _LocalCopier(src_fd, dst_fd, sparse, meter).copy()
+                meter.end(size_bytes)
             except OSError as e:
                 raise RuntimeError(_("Error cloning diskimage %s to %s: %s") %
                                 (self._input_path, self._output_path, str(e)))
@@ -47,7 +47,7 @@ class InstallerTreeMedia(object):
 
       - A network URL: http://dl.fedoraproject.org/...
       - A local directory
-      - A local .iso file, which will be accessed with isoinfo
+      - A local .iso file, which will be accessed with isoreader
     """
 
     @staticmethod
@@ -156,13 +156,14 @@ class InstallerTreeMedia(object):
 
         if not self._cached_fetcher:
             scratchdir = InstallerTreeMedia.make_scratchdir(guest)
+            cachedir = guest.conn.get_download_cache_dir()
 
             if self._media_type == MEDIA_KERNEL:
                 self._cached_fetcher = urlfetcher.DirectFetcher(
-                    None, scratchdir, meter)
+                    None, scratchdir, meter, cachedir=cachedir)
             else:
                 self._cached_fetcher = urlfetcher.fetcherForURI(
-                    self.location, scratchdir, meter)
+                    self.location, scratchdir, meter, cachedir=cachedir)
 
         self._cached_fetcher.meter = meter
         return self._cached_fetcher
@@ -0,0 +1,327 @@
+#
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+#
+# Pure python reader for ISO9660 images, with Joliet and Rock Ridge names
+
+import mmap
+import os
+import struct
+
+from ..logger import log
+
+
+_SECTOR_SIZE = 2048
+_FIRST_VD_SECTOR = 16
+_VD_PRIMARY = 1
+_VD_SUPPLEMENTARY = 2
+_VD_TERMINATOR = 255
+_JOLIET_ESCAPES = [b"%/@", b"%/C", b"%/E"]
+
+_FLAG_DIRECTORY = 0x02
+_FLAG_MULTI_EXTENT = 0x80
+
+
+class _DirRecord(object):
+    """
+    A single ISO9660 directory record
+    """
+    def __init__(self, data, offset):
+        length = data[offset]
+        self.extent = struct.unpack_from("<I", data, offset + 2)[0]
+        self.size = struct.unpack_from("<I", data, offset + 10)[0]
+        self.flags = data[offset + 25]
+        namelen = data[offset + 32]
+        self.rawname = bytes(data[offset + 33:offset + 33 + namelen])
+
+        sustart = offset + 33 + namelen
+        if not namelen % 2:
+            sustart += 1
+        self.sysuse = bytes(data[sustart:offset + length])
+
+    def is_dir(self):
+        return bool(self.flags & _FLAG_DIRECTORY)
+
+    def is_special(self):
+        # The '.' and '..' entries
+        return self.rawname in [b"\x00", b"\x01"]
+
+
+class ISOReader(object):
+    """
+    Read only access to the files of an ISO9660 image.
+
+    The image is mmap'd once. The first lookup walks the directory tree
+    and builds an index of every path, after that hasFile is a dict
+    lookup and file content is served as memoryview slices of the map,
+    without copying or reading the rest of the image.
+
+    Names are taken from Rock Ridge NM entries if the image has them,
+    from the Joliet tree otherwise, matching what 'isoinfo -J' lists,
+    and finally from plain ISO9660 names.
+    """
+    def __init__(self, path):
+        self._path = path
+        self._fileobj = None
+        self._map = None
+        self._view = None
+        self._index = None
+        self._blocksize = _SECTOR_SIZE
+        self._susp_skip = 0
+
+    def _open(self):
+        if self._map is not None:
+            return
+
+        self._fileobj = open(self._path, "rb")
+        # os.path.getsize doesn't work for block devices like /dev/cdrom
+        size = self._fileobj.seek(0, os.SEEK_END)
+        if size < (_FIRST_VD_SECTOR + 1) * _SECTOR_SIZE:
+            self.close()
+            raise RuntimeError("%s is too small to be an ISO9660 image" %
+                    self._path)
+        self._map = mmap.mmap(self._fileobj.fileno(), size,
+                              access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._view.release()
+                self._map.close()
+            except BufferError:  # pragma: no cover
+                # Some iter_file slices are still alive, the map
+                # is unmapped once they are garbage collected
+                log.debug("ISO %s map still in use", self._path)
+        if self._fileobj:
+            self._fileobj.close()
+        self._map = None
+        self._view = None
+        self._fileobj = None
+        self._index = None
+
+
+    ######################
+    # Volume descriptors #
+    ######################
+
+    def _find_root_records(self):
+        """
+        Return (primary root, joliet root or None), and the logical
+        block size
+        """
+        primary = None
+        joliet = None
+        blocksize = _SECTOR_SIZE
+
+        sector = _FIRST_VD_SECTOR
+        while (sector + 1) * _SECTOR_SIZE <= len(self._map):
+            offset = sector * _SECTOR_SIZE
+            vdtype = self._map[offset]
+            if self._map[offset + 1:offset + 6] != b"CD001":
+                break
+            if vdtype == _VD_TERMINATOR:
+                break
+
+            if vdtype == _VD_PRIMARY:
+                blocksize = struct.unpack_from("<H", self._map,
+                                               offset + 128)[0]
+                primary = _DirRecord(self._view, offset + 156)
+            elif (vdtype == _VD_SUPPLEMENTARY and
+                  self._map[offset + 88:offset + 91] in _JOLIET_ESCAPES):
+                joliet = _DirRecord(self._view, offset + 156)
+            sector += 1
+
+        if not primary:
+            raise RuntimeError("%s is not an ISO9660 image" % self._path)
+        return primary, joliet, blocksize
+
+
+    ##############
+    # Rock Ridge #
+    ##############
+
+    def _susp_entries(self, sysuse, skip):
+        """
+        Yield (signature, data) of every SUSP entry in sysuse, following
+        CE continuation areas
+        """
+        pending = [sysuse[skip:]]
+        while pending:
+            data = pending.pop(0)
+            pos = 0
+            while pos + 4 <= len(data):
+                sig = data[pos:pos + 2]
+                length = data[pos + 2]
+                if length < 4:
+                    break
+                entry = data[pos:pos + length]
+                if sig == b"CE":
+                    block, ign, ceoffset, ign, celen = struct.unpack_from(
+                            "<IIIII", entry, 4)
+                    start = block * self._blocksize + ceoffset
+                    pending.append(self._map[start:start + celen])
+                elif sig == b"ST":
+                    break
+                yield sig, entry
+                pos += length
+
+    def _rr_name(self, record):
+        name = b""
+        found = False
+        for sig, entry in self._susp_entries(record.sysuse, self._susp_skip):
+            if sig != b"NM":
+                continue
+            flags = entry[4]
+            if flags & 0x06:
+                # CURRENT or PARENT, only used for '.' and '..'
+                return None
+            name += entry[5:]
+            found = True
+        if not found:
+            return None
+        return name.decode("utf-8", "replace")
+
+    def _check_rock_ridge(self, root):
+        """
+        Rock Ridge images start the system use area of the root
+        directory's '.' record with an SP entry. Returns whether it
+        was found, and sets the number of bytes to skip in every other
+        system use area
+        """
+        self._susp_skip = 0
+        data = self._view[root.extent * self._blocksize:
+                          root.extent * self._blocksize + root.size]
+        if not len(data) or not data[0]:
+            return False  # pragma: no cover
+
+        dot = _DirRecord(data, 0)
+        if (dot.sysuse[0:2] != b"SP" or
+            dot.sysuse[4:6] != b"\xbe\xef"):
+            return False
+        self._susp_skip = dot.sysuse[6]
+        return any(sig in [b"RR", b"NM", b"PX"] for sig, ign in
+                   self._susp_entries(dot.sysuse, 0))
+
+
+    ###################
+    # Directory index #
+    ###################
+
+    def _record_name(self, record, mode):
+        if mode == "rockridge":
+            name = self._rr_name(record)
+            if name is not None:
+                return name
+        if mode == "joliet":
+            name = record.rawname.decode("utf-16-be", "replace")
+        else:
+            name = record.rawname.decode("ascii", "replace")
+        # Strip the ';1' version suffix, and the trailing '.' of
+        # extensionless ISO9660 names
+        if not record.is_dir():
+            name = name.split(";")[0]
+            if mode != "joliet" and name.endswith("."):
+                name = name[:-1]
+        return name
+
+    def _read_dir(self, record):
+        start = record.extent * self._blocksize
+        data = self._view[start:start + record.size]
+        offset = 0
+        while offset < len(data):
+            length = data[offset]
+            if not length:
+                # Records never cross a sector boundary, the rest of
+                # this sector is padding
+                offset = (offset // _SECTOR_SIZE + 1) * _SECTOR_SIZE
+                continue
+            yield _DirRecord(data, offset)
+            offset += length
+
+    def _build_index(self, root, mode):
+        index = {"/": None}
+        pending = [("", root)]
+        seen = set()
+        while pending:
+            dirpath, dirrecord = pending.pop(0)
+            if dirrecord.extent in seen:
+                continue  # pragma: no cover
+            seen.add(dirrecord.extent)
+
+            extents = []
+            for record in self._read_dir(dirrecord):
+                if record.is_special():
+                    continue
+                extents.append((record.extent * self._blocksize,
+                                record.size))
+                if record.flags & _FLAG_MULTI_EXTENT:
+                    # Large file split across several records, which
+                    # all carry the same name. Keep collecting
+                    continue
+
+                path = dirpath + "/" + self._record_name(record, mode)
+                if record.is_dir():
+                    index[path] = None
+                    pending.append((path, record))
+                else:
+                    index[path] = extents
+                extents = []
+        return index
+
+    def _get_index(self):
+        if self._index is not None:
+            return self._index
+
+        self._open()
+        primary, joliet, self._blocksize = self._find_root_records()
+        mode = "iso9660"
+        root = primary
+        if self._check_rock_ridge(primary):
+            mode = "rockridge"
+        elif joliet:
+            mode = "joliet"
+            root = joliet
+
+        self._index = self._build_index(root, mode)
+        log.debug("Indexed %d paths of %s using %s names",
+                  len(self._index), self._path, mode)
+        return self._index
+
+
+    ##############
+    # Public API #
+    ##############
+
+    def get_paths(self):
+        """
+        Return a list of all file and directory paths in the image
+        """
+        return list(self._get_index())
+
+    def has_file(self, path):
+        return path in self._get_index()
+
+    def get_size(self, path):
+        return sum(size for ign, size in self._get_extents(path))
+
+    def _get_extents(self, path):
+        extents = self._get_index().get(path)
+        if extents is None:
+            raise RuntimeError("File %s not found in %s" %
+                               (path, self._path))
+        return extents
+
+    def iter_file(self, path, blocksize):
+        """
+        Yield the content of the file at path as memoryview slices of
+        at most blocksize bytes. The slices are only valid until close()
+        """
+        for offset, size in self._get_extents(path):
+            end = offset + size
+            while offset < end:
+                chunk = min(blocksize, end - offset)
+                yield self._view[offset:offset + chunk]
+                offset += chunk
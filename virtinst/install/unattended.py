@@ -12,9 +12,8 @@ import os
 import pwd
 import tempfile
 
-from gi.repository import Libosinfo
-
 from ..logger import log
+from ..osdict import Libosinfo
 
 
 def _make_installconfig(script, osobj, unattended_data, arch, hostname, url):
@@ -6,6 +6,7 @@
 
 import configparser
 import re
+import time
 
 from ..logger import log
 from ..osdict import OSDB
@@ -15,10 +16,19 @@ from ..osdict import OSDB
 # Helpers for detecting distro from given URL #
 ###############################################
 
+# Probed file contents of network trees, keyed by location URL, so
+# detecting the same tree again doesn't repeat the round trips. Only
+# successful fetches and files the server reported missing are stored,
+# transport and server errors are retried next time
+_PROBE_CACHE = {}
+_TREEINFO_PATHS = [".treeinfo", "treeinfo"]
+
+
 class _DistroCache(object):
     def __init__(self, fetcher):
         self._fetcher = fetcher
         self._filecache = {}
+        self.probe_timings = {}
 
         self._treeinfo = None
         self.treeinfo_family = None
@@ -33,6 +43,35 @@ class _DistroCache(object):
         self.libosinfo_os_variant = None
         self.libosinfo_mediaobj = None
 
+    def prefetch(self, paths):
+        """
+        Fetch all the passed paths concurrently up front, so the distro
+        classes' checks run against the in memory results
+        """
+        location = self._fetcher.location
+        memoize = "://" in location
+        if memoize and location in _PROBE_CACHE:
+            log.debug("Using memoized probe results for %s", location)
+            self._filecache.update(_PROBE_CACHE[location])
+
+        paths = [p for p in paths if p not in self._filecache]
+        if not paths:
+            return
+
+        start = time.time()
+        results = self._fetcher.acquireFileContents(paths)
+        self._filecache.update(results)
+        for path in paths:
+            self.probe_timings[path] = self._fetcher.probe_timings.get(path)
+        log.debug("Probed %d paths in %.3fs, found: %s",
+                  len(paths), time.time() - start,
+                  [p for p in paths if results[p] is not None])
+
+        if memoize:
+            _PROBE_CACHE.setdefault(location, {}).update(
+                (path, results[path]) for path in paths
+                if path not in self._fetcher.probe_errors)
+
     def acquire_file_content(self, path):
         if path not in self._filecache:
             try:
@@ -56,8 +95,8 @@ class _DistroCache(object):
         #
         # Anaconda is the canonical treeinfo consumer and they check for both
         # locations, so we need to do the same
-        treeinfostr = (self.acquire_file_content(".treeinfo") or
-            self.acquire_file_content("treeinfo"))
+        treeinfostr = (self.acquire_file_content(_TREEINFO_PATHS[0]) or
+            self.acquire_file_content(_TREEINFO_PATHS[1]))
         if treeinfostr is None:
             return None
 
@@ -285,6 +324,12 @@ def getDistroStore(guest, fetcher, skip_error):
     stores = _build_distro_list(osobj)
     cache = _DistroCache(fetcher)
 
+    probe_files = []
+    for sclass in stores:
+        probe_files += [p for p in sclass.PROBE_FILES
+                        if p not in probe_files]
+    cache.prefetch(probe_files)
+
     for sclass in stores:
         if not sclass.is_valid(cache):
             continue
@@ -325,6 +370,10 @@ class _DistroTree(object):
     PRETTY_NAME = None
     matching_distros = []
 
+    # Files is_valid() may read. The union over all candidate classes
+    # is fetched concurrently before any class is checked
+    PROBE_FILES = []
+
     def __init__(self, location, arch, vmtype, cache):
         self.type = vmtype
         self.arch = arch
@@ -391,6 +440,7 @@ class _DistroTree(object):
 class _FedoraDistro(_DistroTree):
     PRETTY_NAME = "Fedora"
     matching_distros = ["fedora"]
+    PROBE_FILES = _TREEINFO_PATHS
 
     @classmethod
     def is_valid(cls, cache):
@@ -426,6 +476,7 @@ class _FedoraDistro(_DistroTree):
 class _RHELDistro(_DistroTree):
     PRETTY_NAME = "Red Hat Enterprise Linux"
     matching_distros = ["rhel"]
+    PROBE_FILES = _TREEINFO_PATHS
     _variant_prefix = "rhel"
 
     @classmethod
@@ -470,6 +521,7 @@ class _SuseDistro(_RHELDistro):
     PRETTY_NAME = None
     _suse_regex = []
     matching_distros = []
+    PROBE_FILES = _TREEINFO_PATHS + ["content"]
     _variant_prefix = NotImplementedError
     famregex = NotImplementedError
 
@@ -627,6 +679,7 @@ class _DebianDistro(_DistroTree):
     # daily builds: https://d-i.debian.org/daily-images/amd64/
     PRETTY_NAME = "Debian"
     matching_distros = ["debian"]
+    PROBE_FILES = ["current/images/MANIFEST", "daily/MANIFEST", ".disk/info"]
     _debname = "debian"
 
     @classmethod
@@ -774,6 +827,7 @@ class _MageiaDistro(_DistroTree):
     # https://distro.ibiblio.org/mageia/distrib/cauldron/x86_64/
     PRETTY_NAME = "Mageia"
     matching_distros = ["mageia"]
+    PROBE_FILES = ["VERSION"]
 
     @classmethod
     def is_valid(cls, cache):
@@ -791,6 +845,7 @@ class _GenericTreeinfoDistro(_DistroTree):
     """
     PRETTY_NAME = "Generic Treeinfo"
     matching_distros = []
+    PROBE_FILES = _TREEINFO_PATHS
 
     @classmethod
     def is_valid(cls, cache):
@@ -6,15 +6,22 @@
 #
 # Backends for the various URL types we support (http, https, ftp, local)
 
+import concurrent.futures
+import contextlib
+import fcntl
 import ftplib
+import hashlib
 import io
+import json
 import os
-import subprocess
+import queue
+import shutil
 import tempfile
+import threading
+import time
 import urllib
 
-import requests
-
+from . import isoreader
 from ..logger import log
 
 
@@ -84,6 +91,211 @@ class _MockFTPSession:
         return os.path.getsize(path)
 
 
+##################
+# Download cache #
+##################
+
+class _RemoteFileInfo(object):
+    """
+    Size, validators and range support of a remote file, as reported
+    by the headers of a HEAD request. url is where the HEAD request
+    ended up after redirects
+    """
+    def __init__(self, headers, url=None):
+        self.url = url
+        try:
+            self.size = int(headers.get("content-length"))
+        except Exception:
+            self.size = None
+        self.etag = headers.get("etag")
+        self.last_modified = headers.get("last-modified")
+        self.accept_ranges = (
+                (headers.get("accept-ranges") or "").lower() == "bytes")
+
+    def get_validators(self):
+        return {
+            "size": self.size,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+        }
+
+    def can_validate(self):
+        """
+        If the server gave us enough to tell whether a cached copy
+        is still current. Size alone is too weak
+        """
+        return bool(self.size is not None and
+                    (self.etag or self.last_modified))
+
+
+class _DownloadCache(object):
+    """
+    Content addressed on disk cache of files fetched over HTTP.
+
+    index.json maps each URL to the validators the server reported for
+    it (ETag, Last-Modified, size) and the sha256 of its content. The
+    content lives in objects/<sha256>, so the same kernel fetched from
+    different mirrors is only stored once. A cached file is only used if
+    the server still reports the same validators.
+
+    Downloads in progress go to partial/<urlhash>, with a .json sidecar
+    recording the validators and the completed byte ranges, so an
+    interrupted download can be resumed by a later run. A .lock sidecar
+    is flock()ed for the whole download and commit, so concurrent
+    processes fetching the same URL wait for each other instead of
+    writing the same partial file.
+    """
+    MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+    def __init__(self, cachedir):
+        self._cachedir = cachedir
+        self._lock = threading.Lock()
+        self._indexpath = os.path.join(cachedir, "index.json")
+        for subdir in ["objects", "partial"]:
+            os.makedirs(os.path.join(cachedir, subdir), 0o700,
+                        exist_ok=True)
+
+    def _read_json(self, path):
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception as e:
+            log.debug("Error reading download cache file %s: %s", path, e)
+            return {}
+
+    def _write_json(self, path, data):
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(path),
+                                       suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmpname, path)
+        except Exception:  # pragma: no cover
+            os.unlink(tmpname)
+            raise
+
+    def _object_path(self, sha256):
+        return os.path.join(self._cachedir, "objects", sha256)
+
+    def _partial_path(self, url):
+        urlhash = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self._cachedir, "partial", urlhash)
+
+    @contextlib.contextmanager
+    def lock_partial(self, url):
+        """
+        Hold an exclusive lock on the partial download of url, across
+        processes. The lock file is never removed, doing that races
+        with other processes opening it
+        """
+        with open(self._partial_path(url) + ".lock", "a") as lockfile:
+            fcntl.flock(lockfile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    def lookup(self, url, info):
+        """
+        Return the path of the cached content of url, or None if it
+        isn't cached or the server reports it has changed
+        """
+        entry = self._read_json(self._indexpath).get(url)
+        if not entry or entry.get("validators") != info.get_validators():
+            return None
+        path = self._object_path(entry.get("sha256", ""))
+        if (not os.path.exists(path) or
+            os.path.getsize(path) != info.size):
+            return None
+        os.utime(path)
+        return path
+
+    def open_partial(self, url, info):
+        """
+        Return (path, done) for downloading url, where done is the list
+        of (start, end) byte ranges already fetched by an earlier run.
+        Stale partial content is thrown away. Must be called with
+        lock_partial held
+        """
+        path = self._partial_path(url)
+        state = self._read_json(path + ".json")
+        if (state.get("validators") != info.get_validators() or
+            not os.path.exists(path) or
+            # A single stream fallback truncated it, see _download
+            (state.get("done") and os.path.getsize(path) != info.size)):
+            state = {"validators": info.get_validators(), "done": []}
+            open(path, "wb").close()
+            self._write_json(path + ".json", state)
+        done = [tuple(segment) for segment in state["done"]]
+        if done:
+            log.debug("Resuming download of %s, %d ranges already fetched",
+                      url, len(done))
+        return path, done
+
+    def segment_done(self, url, segment):
+        path = self._partial_path(url)
+        with self._lock:
+            state = self._read_json(path + ".json")
+            state.setdefault("done", []).append(list(segment))
+            self._write_json(path + ".json", state)
+
+    def commit(self, url, info):
+        """
+        Move the completed partial download of url into the object
+        store, and return the object path. Must be called with
+        lock_partial held
+        """
+        path = self._partial_path(url)
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(data)
+        sha256 = sha.hexdigest()
+
+        objpath = self._object_path(sha256)
+        os.replace(path, objpath)
+        os.unlink(path + ".json")
+
+        with self._lock:
+            index = self._read_json(self._indexpath)
+            index[url] = {
+                "validators": info.get_validators(),
+                "sha256": sha256,
+            }
+            self._prune(index, keep=objpath)
+            self._write_json(self._indexpath, index)
+        log.debug("Cached %s as %s", url, objpath)
+        return objpath
+
+    def _prune(self, index, keep):
+        """
+        Drop the least recently used objects until the cache is
+        below MAX_SIZE
+        """
+        objdir = os.path.join(self._cachedir, "objects")
+        objs = []
+        for name in os.listdir(objdir):
+            path = os.path.join(objdir, name)
+            stat = os.stat(path)
+            objs.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(o[1] for o in objs)
+        for ignore, size, path in sorted(objs):
+            if total <= self.MAX_SIZE:
+                break
+            if path == keep:
+                continue
+            log.debug("Pruning download cache object %s", path)
+            os.unlink(path)
+            total -= size
+
+        for url in list(index):
+            if not os.path.exists(self._object_path(index[url]["sha256"])):
+                del(index[url])
+
+
 ###########################
 # Fetcher implementations #
 ###########################
@@ -96,10 +308,13 @@ class _URLFetcher(object):
     _block_size = 16384
     _is_iso = False
 
-    def __init__(self, location, scratchdir, meter):
+    def __init__(self, location, scratchdir, meter, cachedir=None):
         self.location = location
         self.scratchdir = scratchdir
         self.meter = meter
+        self.cachedir = cachedir
+        self.probe_timings = {}
+        self.probe_errors = {}
 
         log.debug("Using scratchdir=%s", scratchdir)
         self._prepare()
@@ -236,34 +451,137 @@ class _URLFetcher(object):
         self._grabURL(filename, fileobj)
         return fileobj.getvalue().decode("utf-8")
 
+    def _probe_content(self, filename):
+        return self.acquireFileContent(filename)
+
+    def _is_missing_error(self, error):
+        """
+        Whether error means the file definitely doesn't exist, rather
+        than a transport or server problem that might go away
+        """
+        ignore = error
+        return False
+
+    def _timed_probe(self, filename, *args):
+        start = time.time()
+        try:
+            content = self._probe_content(filename, *args)
+            self.probe_errors.pop(filename, None)
+        except Exception as e:
+            log.debug("Failed to acquire file=%s: %s", filename, e)
+            content = None
+            if self._is_missing_error(e):
+                self.probe_errors.pop(filename, None)
+            else:
+                self.probe_errors[filename] = str(e)
+        self.probe_timings[filename] = time.time() - start
+        log.debug("Probe of %s took %.3fs, found=%s", filename,
+                  self.probe_timings[filename], content is not None)
+        return content
+
+    def acquireFileContents(self, filenames):
+        """
+        Grab all the passed filenames, like acquireFileContent. Returns
+        a dict of filename -> content, or None if it couldn't be fetched.
+        How long each fetch took is recorded in self.probe_timings.
+        Files that couldn't be fetched for any reason other than not
+        existing are recorded in self.probe_errors
+        """
+        return dict((filename, self._timed_probe(filename))
+                    for filename in filenames)
+
+
+class _RangeIgnoredError(RuntimeError):
+    """
+    The server answered a Range request with the whole file
+    """
+
 
 class _HTTPURLFetcher(_URLFetcher):
+    """
+    Large files are fetched as several HTTP Range requests in parallel,
+    if the server supports it. Interrupted transfers are resumed from
+    where they stopped. Sessions are kept open across files so their
+    connections are reused.
+
+    If we were passed a cachedir, files are cached there, see
+    _DownloadCache. acquireFileContent is only used for small metadata
+    files like .treeinfo, so those are always fetched fresh
+    """
     _session = None
+    _worker_sessions = None
+    _segment_min_size = 32 * 1024 * 1024
+    _max_segments = 4
+    _max_retries = 3
+    _max_probes = 8
 
-    def _prepare(self):
+    def _new_session(self):
         if _in_testsuite():
-            self._session = _MockRequestsSession()
-        else:
-            self._session = requests.Session()
+            return _MockRequestsSession()
+        # requests is slow to import, and only needed for http installs
+        import requests
+        return requests.Session()  # pragma: no cover
+
+    def _prepare(self):
+        self._session = self._new_session()
+        self._worker_sessions = []
+        self._head_cache = {}
+        self._cache = None
+        if self.cachedir:
+            try:
+                self._cache = _DownloadCache(self.cachedir)
+            except Exception as e:  # pragma: no cover
+                log.debug("Error creating download cache %s: %s",
+                          self.cachedir, e)
 
     def _cleanup(self):
-        if self._session:
+        for session in [self._session] + (self._worker_sessions or []):
+            if not session:
+                continue  # pragma: no cover
             try:
-                self._session.close()
+                session.close()
             except Exception:  # pragma: no cover
                 log.debug("Error closing requests.session", exc_info=True)
         self._session = None
+        self._worker_sessions = []
+
+    def _get_worker_session(self, idx):
+        """
+        Session for parallel segment idx. These are kept around for
+        the next file, like self._session
+        """
+        if idx == 0:
+            return self._session
+        while len(self._worker_sessions) < idx:
+            self._worker_sessions.append(self._new_session())
+        return self._worker_sessions[idx - 1]
 
     def can_access(self):
         return self.hasFile("")
 
+    def _head(self, url):
+        if url not in self._head_cache:
+            response = self._session.head(url, allow_redirects=True)
+            response.raise_for_status()
+            self._head_cache[url] = _RemoteFileInfo(response.headers,
+                    getattr(response, "url", None) or url)
+        return self._head_cache[url]
+
+    def _is_missing_error(self, error):
+        # acquireFileContent wraps the requests error in a ValueError
+        while error:
+            response = getattr(error, "response", None)
+            if getattr(response, "status_code", None) in [404, 410]:
+                return True
+            error = error.__cause__ or error.__context__
+        return False
+
     def _hasFile(self, url):
         """
         We just do a HEAD request to see if the file exists
         """
         try:
-            response = self._session.head(url, allow_redirects=True)
-            response.raise_for_status()
+            self._head(url)
         except Exception as e:  # pragma: no cover
             log.debug("HTTP hasFile request failed: %s", str(e))
             return False
@@ -293,6 +611,198 @@ class _HTTPURLFetcher(_URLFetcher):
             self.meter.update(total)
         return total
 
+    def _grabURL(self, filename, fileobj, fullurl=None):
+        if isinstance(fileobj, io.BytesIO):
+            # acquireFileContent, a single stream is all we need
+            return super()._grabURL(filename, fileobj, fullurl=fullurl)
+
+        url = fullurl or self._make_full_url(filename)
+        try:
+            info = self._head(url)
+        except Exception as e:
+            # Some servers and presigned URLs reject HEAD, so fall
+            # back to a plain GET without ranges or caching
+            log.debug("HEAD request for %s failed: %s. Falling back "
+                      "to a single GET", url, e)
+            return super()._grabURL(filename, fileobj, fullurl=fullurl)
+
+        log.debug("Fetching URI: %s", url)
+        self.meter.start(
+            text=_("Retrieving file %s...") % os.path.basename(filename),
+            size=info.size)
+
+        if self._cache and info.can_validate():
+            total = self._cached_download(url, info, fileobj)
+        else:
+            total = self._download(url, info, fileobj, [])
+        self.meter.end(total)
+
+    def _fetch_to_cache(self, url, info):
+        with self._cache.lock_partial(url):
+            # Another process may have fetched it while we waited
+            path = self._cache.lookup(url, info)
+            if path:
+                return path
+
+            partial, done = self._cache.open_partial(url, info)
+            with open(partial, "r+b") as target:
+                self._download(url, info, target, done,
+                        lambda seg: self._cache.segment_done(url, seg))
+            return self._cache.commit(url, info)
+
+    def _cached_download(self, url, info, fileobj):
+        path = self._cache.lookup(url, info)
+        if path:
+            log.debug("Using cached copy %s of %s", path, url)
+        else:
+            path = self._fetch_to_cache(url, info)
+
+        # Copy rather than link, the caller may alter the file,
+        # like initrd injections do
+        with open(path, "rb") as src:
+            shutil.copyfileobj(src, fileobj)
+        fileobj.flush()
+        self.meter.update(info.size)
+        return info.size
+
+    def _probe_content(self, filename, session=None):
+        if session is None:
+            return super()._probe_content(filename)
+        response = session.get(self._make_full_url(filename), stream=True)
+        response.raise_for_status()
+        return b"".join(response.iter_content(
+            chunk_size=self._block_size)).decode("utf-8")
+
+    def acquireFileContents(self, filenames):
+        """
+        Fetch all the files concurrently, one session per worker.
+        The sessions are kept for later files like usual
+        """
+        if len(filenames) <= 1:
+            return super().acquireFileContents(filenames)
+
+        sessions = queue.Queue()
+        count = min(len(filenames), self._max_probes)
+        for idx in range(count):
+            sessions.put(self._get_worker_session(idx))
+
+        def _probe(filename):
+            session = sessions.get()
+            try:
+                return self._timed_probe(filename, session)
+            finally:
+                sessions.put(session)
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=count) as executor:
+            results = list(executor.map(_probe, filenames))
+        return dict(zip(filenames, results))
+
+    def _make_segments(self, size):
+        count = 1
+        if size >= self._segment_min_size:
+            count = self._max_segments
+        step = -(-size // count)
+        return [(start, min(start + step, size))
+                for start in range(0, size, step)]
+
+    def _download_single(self, url, target):
+        target.seek(0)
+        target.truncate()
+        urlobj, ignore = self._grabber(url)
+        return self._write(urlobj, target)
+
+    def _download(self, url, info, target, done, done_cb=None):
+        """
+        Fetch url into the file object target. done is the list of
+        (start, end) ranges that target already contains. done_cb is
+        called with every range once it is complete.
+
+        Ranges are requested from the URL that the HEAD request was
+        redirected to, so all segments come from the same mirror
+        """
+        url = info.url or url
+        if not info.accept_ranges or not info.size:
+            return self._download_single(url, target)
+
+        segments = [s for s in self._make_segments(info.size)
+                    if s not in done]
+        target.truncate(info.size)
+        target.flush()
+
+        lock = threading.Lock()
+        progress = [info.size - sum(end - start for start, end in segments)]
+        def _progress_cb(count):
+            with lock:
+                progress[0] += count
+                self.meter.update(progress[0])
+
+        def _fetch(idx, segment):
+            self._fetch_segment(self._get_worker_session(idx),
+                    url, segment, target.fileno(), _progress_cb)
+            if done_cb:
+                done_cb(segment)
+
+        # Create the sessions up front, workers shouldn't race on it
+        for idx in range(len(segments)):
+            self._get_worker_session(idx)
+        if len(segments) > 1:
+            log.debug("Fetching %s in %d parallel segments",
+                      url, len(segments))
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(len(segments), 1)) as executor:
+                futures = [executor.submit(_fetch, idx, segment)
+                           for idx, segment in enumerate(segments)]
+                for future in futures:
+                    future.result()
+        except _RangeIgnoredError as e:
+            log.debug("%s. Fetching %s with a single request", e, url)
+            return self._download_single(url, target)
+        return info.size
+
+    def _fetch_segment(self, session, url, segment, fd, progress_cb):
+        """
+        Fetch the byte range segment of url into fd at the same offset.
+        A dropped transfer is resumed from the last received byte
+        """
+        offset, end = segment
+        retries = 0
+        while offset < end:
+            startoffset = offset
+            try:
+                response = session.get(url, stream=True, headers={
+                    "Range": "bytes=%d-%d" % (offset, end - 1)})
+                response.raise_for_status()
+                if response.status_code != 206:
+                    # Retrying won't change the server's mind
+                    response.close()
+                    raise _RangeIgnoredError(
+                        "Server ignored range request, status=%s" %
+                        response.status_code)
+
+                for data in response.iter_content(
+                        chunk_size=self._block_size):
+                    data = data[:end - offset]
+                    os.pwrite(fd, data, offset)
+                    offset += len(data)
+                    progress_cb(len(data))
+                    if offset >= end:
+                        break
+                if offset < end:
+                    raise RuntimeError("transfer ended at byte %d" % offset)
+            except _RangeIgnoredError:
+                raise
+            except Exception as e:
+                if offset > startoffset:
+                    retries = 0
+                retries += 1
+                if retries > self._max_retries:
+                    raise
+                log.debug("Fetching %s bytes %d-%d interrupted: %s. "
+                          "Resuming at byte %d", url, segment[0], end,
+                          str(e), offset)
+
 
 class _FTPURLFetcher(_URLFetcher):
     _ftp = None
@@ -372,36 +882,42 @@ class _LocalURLFetcher(_URLFetcher):
 
 
 class _ISOURLFetcher(_URLFetcher):
-    _cache_file_list = None
+    """
+    For grabbing files from a local ISO image or CDROM device,
+    see isoreader.ISOReader
+    """
     _is_iso = True
+    _reader = None
 
-    def _grabber(self, url):
-        """
-        Use isoinfo to grab the file
-        """
-        if not self._hasFile(url):
-            raise RuntimeError("isoinfo didn't find file=%s" % url)
-
-        cmd = ["isoinfo", "-J", "-i", self.location, "-x", url]
+    def _prepare(self):
+        self._reader = isoreader.ISOReader(self.location)
 
-        log.debug("Running isoinfo: %s", cmd)
-        output = subprocess.check_output(cmd)
+    def _cleanup(self):
+        if self._reader:
+            self._reader.close()
+        self._reader = None
 
-        return io.BytesIO(output), len(output)
+    def _grabber(self, url):
+        if not self._hasFile(url):
+            raise RuntimeError("ISO %s doesn't contain file=%s" %
+                    (self.location, url))
+        return (self._reader.iter_file(url, self._block_size),
+                self._reader.get_size(url))
 
-    def _hasFile(self, url):
+    def _write(self, urlobj, fileobj):
         """
-        Use isoinfo to list and search for the file
+        urlobj is the iterator of memoryview slices from ISOReader,
+        so file content is written straight from the mapped image
         """
-        if not self._cache_file_list:
-            cmd = ["isoinfo", "-J", "-i", self.location, "-f"]
-
-            log.debug("Running isoinfo: %s", cmd)
-            output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
-
-            self._cache_file_list = output.splitlines(False)
+        total = 0
+        for data in urlobj:
+            fileobj.write(data)
+            total += len(data)
+            self.meter.update(total)
+        return total
 
-        return url.encode("ascii") in self._cache_file_list
+    def _hasFile(self, url):
+        return self._reader.has_file(url)
 
 
 class DirectFetcher(_URLFetcher):
@@ -411,7 +927,8 @@ class DirectFetcher(_URLFetcher):
     def acquireFile(self, filename, fullurl=None):
         fullurl = filename
         filename = os.path.basename(filename)
-        fetcher = fetcherForURI(fullurl, self.scratchdir, self.meter, direct=True)
+        fetcher = fetcherForURI(fullurl, self.scratchdir, self.meter,
+                direct=True, cachedir=self.cachedir)
         return fetcher.acquireFile(filename, fullurl)  # pylint: disable=protected-access
 
     def _hasFile(self, url):
@@ -422,7 +939,7 @@ class DirectFetcher(_URLFetcher):
                 "DirectFetcher shouldn't be used for file access.")
 
 
-def fetcherForURI(uri, scratchdir, meter, direct=False):
+def fetcherForURI(uri, scratchdir, meter, direct=False, cachedir=None):
     if uri.startswith("http://") or uri.startswith("https://"):
         fclass = _HTTPURLFetcher
     elif uri.startswith("ftp://"):
@@ -433,4 +950,4 @@ def fetcherForURI(uri, scratchdir, meter, direct=False):
     else:
         # Pointing to a path (e.g. iso), or a block device (e.g. /dev/cdrom)
         fclass = _ISOURLFetcher
-    return fclass(uri, scratchdir, meter)
+    return fclass(uri, scratchdir, meter, cachedir=cachedir)
@@ -10,8 +10,6 @@ import datetime
 import os
 import re
 
-from gi.repository import Libosinfo
-
 from .logger import log
 
 
@@ -19,6 +17,26 @@ def _in_testsuite():
     return "VIRTINST_TEST_SUITE" in os.environ
 
 
+class _LazyLibosinfo(object):
+    """
+    Stand-in for gi.repository.Libosinfo that imports it on first
+    attribute access. Loading gi and the typelib is a large part of CLI
+    startup, and plenty of commands never need osinfo data
+    """
+    _module = None
+
+    def __getattr__(self, name):
+        if not _LazyLibosinfo._module:
+            import gi
+            gi.require_version('Libosinfo', '1.0')
+            from gi.repository import Libosinfo as _Libosinfo
+            _LazyLibosinfo._module = _Libosinfo
+        return getattr(_LazyLibosinfo._module, name)
+
+
+Libosinfo = _LazyLibosinfo()
+
+
 ###################
 # Sorting helpers #
 ###################
@@ -120,6 +138,9 @@ class _OSDB(object):
     def __init__(self):
         self.__os_loader = None
         self.__all_variants = None
+        self.__full_id_map = None
+        self.__sorted_variants = None
+        self.__default_variants = None
 
     # This is only for back compatibility with pre-libosinfo support.
     # This should never change.
@@ -183,6 +204,13 @@ class _OSDB(object):
         ret[v.name] = v
         return ret
 
+    @property
+    def _default_variants(self):
+        # Looking these up doesn't need the libosinfo DB loaded
+        if not self.__default_variants:
+            self.__default_variants = self._make_default_variants()
+        return self.__default_variants
+
     @property
     def _os_loader(self):
         if not self.__os_loader:
@@ -196,7 +224,7 @@ class _OSDB(object):
     def _all_variants(self):
         if not self.__all_variants:
             loader = self._os_loader
-            allvariants = self._make_default_variants()
+            allvariants = self._default_variants.copy()
             db = loader.get_db()
             oslist = db.get_os_list()
             for o in _OsinfoIter(oslist):
@@ -204,17 +232,28 @@ class _OSDB(object):
                 allvariants[osi.name] = osi
 
             self.__all_variants = allvariants
+            log.debug("Loaded %d OS variants from libosinfo",
+                      len(allvariants))
         return self.__all_variants
 
+    @property
+    def _full_id_map(self):
+        # Guest XML stores the full ID, so index by that as well
+        if self.__full_id_map is None:
+            self.__full_id_map = dict(
+                    (osobj.full_id, osobj) for osobj in
+                    self._all_variants.values() if osobj.full_id)
+        return self.__full_id_map
+
 
     ###############
     # Public APIs #
     ###############
 
     def lookup_os_by_full_id(self, full_id, raise_error=False):
-        for osobj in self._all_variants.values():
-            if osobj.full_id == full_id:
-                return osobj
+        osobj = self._full_id_map.get(full_id)
+        if osobj:
+            return osobj
         if raise_error:
             raise ValueError(_("Unknown libosinfo ID '%s'") % full_id)
 
@@ -227,7 +266,9 @@ class _OSDB(object):
                   "This alias will be removed in the future."), key, alias)
             key = alias
 
-        ret = self._all_variants.get(key)
+        ret = self._default_variants.get(key)
+        if ret is None:
+            ret = self._all_variants.get(key)
         if ret is None and raise_error:
             raise ValueError(_("Unknown OS name '%s'. "
                     "See `osinfo-query os` for valid values.") % key)
@@ -269,12 +310,10 @@ class _OSDB(object):
         """
         List all OSes in the DB
         """
-        sortmap = {}
-
-        for name, osobj in self._all_variants.items():
-            sortmap[name] = osobj
-
-        return _sort(sortmap)
+        # Sorting does regex and string work for every OS, only do it once
+        if self.__sorted_variants is None:
+            self.__sorted_variants = _sort(self._all_variants)
+        return self.__sorted_variants[:]
 
 
 OSDB = _OSDB()
@@ -356,7 +395,7 @@ class _OsVariant(object):
         self.distro = self._os and self._os.get_distro() or ""
         self.version = self._os and self._os.get_version() or None
 
-        self.eol = self._get_eol()
+        self.__eol = None
 
     def __repr__(self):
         return "<%s name=%s>" % (self.__class__.__name__, self.name)
@@ -422,6 +461,14 @@ class _OsVariant(object):
     # Cached APIs #
     ###############
 
+    @property
+    def eol(self):
+        # Date parsing for every OS adds up, and only the OS list UI
+        # cares, so do it on first access
+        if self.__eol is None:
+            self.__eol = self._get_eol()
+        return self.__eol
+
     def _get_eol(self):
         eol = self._os and self._os.get_eol_date() or None
         rel = self._os and self._os.get_release_date() or None
@@ -5,6 +5,8 @@
 # See the COPYING file in the top-level directory.
 #
 
+import threading
+
 from .logger import log
 
 
@@ -13,19 +15,158 @@ from .logger import log
 FORCE_OLD_POLL = False
 
 
-def _new_poll_helper(origmap, typename, listfunc, buildfunc):
+class _PollState(object):
+    """
+    Incremental polling state for one object type (or one pool's
+    volumes). Tracks the fingerprint of the last list result, and the
+    identity->connkey mapping of the objects it contained.
+    """
+    def __init__(self):
+        self.fingerprint = None
+        self.idmap = {}
+
+    def is_unchanged(self, fingerprint, origmap):
+        """
+        Return True if the list result is identical to the previous poll,
+        and the caller's object map still matches what we reported.
+        """
+        if fingerprint != self.fingerprint:
+            return False
+        if len(origmap) != len(self.idmap):
+            return False
+        for connkey in self.idmap.values():
+            if connkey not in origmap:
+                return False
+        return True
+
+
+class PollCache(object):
+    """
+    Per-connection cache for incremental polling. Passing one of these
+    to the fetch_* functions lets them key objects on their UUID, skip
+    all per-object work when the list result hasn't changed since the
+    previous poll, and count the RPCs issued.
+
+    The fingerprint includes each object's name, which libvirt keeps
+    locally in the object handle. An object renamed outside of our
+    control, like with 'virsh domrename', is reported as gone under its
+    old connkey and new under its new one, the same as without a
+    PollCache.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+        self._poll_start_count = 0
+        self.rpc_count = 0
+        self.last_poll_rpc_count = 0
+
+    def get_state(self, statekey):
+        with self._lock:
+            if statekey not in self._states:
+                self._states[statekey] = _PollState()
+            return self._states[statekey]
+
+    def remove_state(self, statekey):
+        with self._lock:
+            self._states.pop(statekey, None)
+
+    def clear(self):
+        with self._lock:
+            self._states = {}
+
+    def count_rpc(self, count=1):
+        with self._lock:
+            self.rpc_count += count
+
+    def start_poll(self):
+        with self._lock:
+            self._poll_start_count = self.rpc_count
+
+    def finish_poll(self):
+        """
+        Record and return the number of RPCs issued since start_poll
+        """
+        with self._lock:
+            self.last_poll_rpc_count = (self.rpc_count -
+                                        self._poll_start_count)
+            return self.last_poll_rpc_count
+
+
+def _count_rpc(pollcache, count=1):
+    if pollcache:
+        pollcache.count_rpc(count)
+
+
+def _uuid_id(obj):
+    return obj.UUIDString()
+
+
+def _volume_id(obj):
+    return obj.key()
+
+
+def _name_id(obj):
+    return obj.name()
+
+
+def _incremental_new_poll(origmap, objs, buildfunc, state, idfunc):
+    idlist = [idfunc(obj) for obj in objs]
+    # name() doesn't issue an RPC
+    namelist = [obj.name() for obj in objs]
+    fingerprint = frozenset(zip(idlist, namelist))
+    if state.is_unchanged(fingerprint, origmap):
+        return [], [], list(origmap.values())
+
+    current = {}
+    new = {}
+    idmap = {}
+    for obj, objid, name in zip(objs, idlist, namelist):
+        connkey = state.idmap.get(objid)
+        if connkey != name:
+            # Unknown UUID, or the object was renamed outside of our
+            # control. The old connkey is left in origmap and
+            # reported as gone
+            connkey = name
+
+        if connkey in current:
+            continue
+        if connkey not in origmap:
+            # Object is brand new this period
+            current[connkey] = buildfunc(obj, connkey)
+            new[connkey] = current[connkey]
+        else:
+            # Previously known object
+            current[connkey] = origmap.pop(connkey)
+        idmap[objid] = connkey
+
+    state.fingerprint = fingerprint
+    state.idmap = idmap
+    return (list(origmap.values()), list(new.values()), list(current.values()))
+
+
+def _new_poll_helper(origmap, typename, listfunc, buildfunc,
+                     pollcache=None, statekey=None, idfunc=_uuid_id):
     """
     Helper for new style listAll* APIs
+
+    If @pollcache is passed, poll incrementally: objects are matched on
+    @idfunc (their UUID by default) and nothing beyond the list call is
+    done if the result is unchanged since the last poll.
     """
     current = {}
     new = {}
     objs = []
 
     try:
+        _count_rpc(pollcache)
         objs = listfunc()
     except Exception as e:
         log.debug("Unable to list all %ss: %s", typename, e)
 
+    if pollcache:
+        state = pollcache.get_state(statekey or typename)
+        return _incremental_new_poll(origmap, objs, buildfunc, state, idfunc)
+
     for obj in objs:
         connkey = obj.name()
 
@@ -43,7 +184,8 @@ def _new_poll_helper(origmap, typename, listfunc, buildfunc):
 
 def _old_poll_helper(origmap, typename,
                      active_list, inactive_list,
-                     lookup_func, build_func):
+                     lookup_func, build_func,
+                     pollcache=None, statekey=None):
     """
     Helper routine for old style split API libvirt polling.
     @origmap: Pre-existing mapping of objects, with connkey->obj mapping.
@@ -55,6 +197,7 @@ def _old_poll_helper(origmap, typename,
     @lookup_func: Function to get an object handle for the passed name
     @build_func: Function that builds a new object class. It is passed
         args of (raw libvirt object, connkey)
+    @pollcache: Optional PollCache, see _new_poll_helper
     """
     current = {}
     new = {}
@@ -62,20 +205,30 @@ def _old_poll_helper(origmap, typename,
     newInactiveNames = []
 
     try:
+        _count_rpc(pollcache)
         newActiveNames = active_list()
     except Exception as e:
         log.debug("Unable to list active %ss: %s", typename, e)
     try:
+        _count_rpc(pollcache)
         newInactiveNames = inactive_list()
     except Exception as e:
         log.debug("Unable to list inactive %ss: %s", typename, e)
 
+    state = None
+    if pollcache:
+        state = pollcache.get_state(statekey or typename)
+        fingerprint = frozenset(newActiveNames + newInactiveNames)
+        if state.is_unchanged(fingerprint, origmap):
+            return [], [], list(origmap.values())
+
     def check_obj(name):
         obj = None
         connkey = name
 
         if connkey not in origmap:
             try:
+                _count_rpc(pollcache)
                 obj = lookup_func(name)
             except Exception as e:
                 log.debug("Could not fetch %s '%s': %s",
@@ -96,15 +249,19 @@ def _old_poll_helper(origmap, typename,
         except Exception:
             log.exception("Couldn't fetch %s '%s'", typename, name)
 
+    if state:
+        state.fingerprint = fingerprint
+        state.idmap = dict((connkey, connkey) for connkey in current)
     return (list(origmap.values()), list(new.values()), list(current.values()))
 
 
-def fetch_nets(backend, origmap, build_func):
+def fetch_nets(backend, origmap, build_func, pollcache=None):
     name = "network"
 
     if backend.support.conn_listallnetworks() and not FORCE_OLD_POLL:
         return _new_poll_helper(origmap, name,
-                                backend.listAllNetworks, build_func)
+                                backend.listAllNetworks, build_func,
+                                pollcache=pollcache)
     else:
         active_list = backend.listNetworks
         inactive_list = backend.listDefinedNetworks
@@ -112,15 +269,17 @@ def fetch_nets(backend, origmap, build_func):
 
         return _old_poll_helper(origmap, name,
                                 active_list, inactive_list,
-                                lookup_func, build_func)
+                                lookup_func, build_func,
+                                pollcache=pollcache)
 
 
-def fetch_pools(backend, origmap, build_func):
+def fetch_pools(backend, origmap, build_func, pollcache=None):
     name = "pool"
 
     if backend.support.conn_listallstoragepools() and not FORCE_OLD_POLL:
         return _new_poll_helper(origmap, name,
-                                backend.listAllStoragePools, build_func)
+                                backend.listAllStoragePools, build_func,
+                                pollcache=pollcache)
     else:
         active_list = backend.listStoragePools
         inactive_list = backend.listDefinedStoragePools
@@ -128,15 +287,19 @@ def fetch_pools(backend, origmap, build_func):
 
         return _old_poll_helper(origmap, name,
                                 active_list, inactive_list,
-                                lookup_func, build_func)
+                                lookup_func, build_func,
+                                pollcache=pollcache)
 
 
-def fetch_volumes(backend, pool, origmap, build_func):
+def fetch_volumes(backend, pool, origmap, build_func,
+                  pollcache=None, statekey=None):
     name = "volume"
 
     if backend.support.pool_listallvolumes(pool) and not FORCE_OLD_POLL:
         return _new_poll_helper(origmap, name,
-                                pool.listAllVolumes, build_func)
+                                pool.listAllVolumes, build_func,
+                                pollcache=pollcache, statekey=statekey,
+                                idfunc=_volume_id)
     else:
         active_list = pool.listVolumes
         def inactive_list():
@@ -144,15 +307,18 @@ def fetch_volumes(backend, pool, origmap, build_func):
         lookup_func = pool.storageVolLookupByName
         return _old_poll_helper(origmap, name,
                                 active_list, inactive_list,
-                                lookup_func, build_func)
+                                lookup_func, build_func,
+                                pollcache=pollcache, statekey=statekey)
 
 
-def fetch_interfaces(backend, origmap, build_func):
+def fetch_interfaces(backend, origmap, build_func, pollcache=None):
     name = "interface"
 
     if backend.support.conn_listallinterfaces() and not FORCE_OLD_POLL:
         return _new_poll_helper(origmap, name,
-                                backend.listAllInterfaces, build_func)
+                                backend.listAllInterfaces, build_func,
+                                pollcache=pollcache,
+                                idfunc=_name_id)
     else:
         active_list = backend.listInterfaces
         inactive_list = backend.listDefinedInterfaces
@@ -160,14 +326,17 @@ def fetch_interfaces(backend, origmap, build_func):
 
         return _old_poll_helper(origmap, name,
                                 active_list, inactive_list,
-                                lookup_func, build_func)
+                                lookup_func, build_func,
+                                pollcache=pollcache)
 
 
-def fetch_nodedevs(backend, origmap, build_func):
+def fetch_nodedevs(backend, origmap, build_func, pollcache=None):
     name = "nodedev"
     if backend.support.conn_listalldevices() and not FORCE_OLD_POLL:
         return _new_poll_helper(origmap, name,
-                                backend.listAllDevices, build_func)
+                                backend.listAllDevices, build_func,
+                                pollcache=pollcache,
+                                idfunc=_name_id)
     else:
         def active_list():
             return backend.listDevices(None, 0)
@@ -176,10 +345,11 @@ def fetch_nodedevs(backend, origmap, build_func):
         lookup_func = backend.nodeDeviceLookupByName
         return _old_poll_helper(origmap, name,
                                 active_list, inactive_list,
-                                lookup_func, build_func)
+                                lookup_func, build_func,
+                                pollcache=pollcache)
 
 
-def _old_fetch_vms(backend, origmap, build_func):
+def _old_fetch_vms(backend, origmap, build_func, pollcache):
     # We can't easily use _old_poll_helper here because the domain API
     # doesn't always return names like other objects, it returns
     # IDs for active VMs
@@ -199,15 +369,24 @@ def _old_fetch_vms(backend, origmap, build_func):
             oldInactiveNames[vm.get_name()] = vm
 
     try:
+        _count_rpc(pollcache)
         newActiveIDs = backend.listDomainsID()
     except Exception as e:
         log.debug("Unable to list active domains: %s", e)
 
     try:
+        _count_rpc(pollcache)
         newInactiveNames = backend.listDefinedDomains()
     except Exception as e:
         log.exception("Unable to list inactive domains: %s", e)
 
+    state = None
+    if pollcache:
+        state = pollcache.get_state("domain")
+        fingerprint = (frozenset(newActiveIDs), frozenset(newInactiveNames))
+        if state.is_unchanged(fingerprint, origmap):
+            return [], [], list(origmap.values())
+
     def add_vm(vm):
         connkey = vm.get_name()
 
@@ -232,6 +411,7 @@ def _old_fetch_vms(backend, origmap, build_func):
         else:
             # Check if domain is brand new, or old one that changed state
             try:
+                _count_rpc(pollcache)
                 vm = backend.lookupByID(_id)
                 connkey = vm.name()
 
@@ -248,6 +428,7 @@ def _old_fetch_vms(backend, origmap, build_func):
         else:
             # Check if domain is brand new, or old one that changed state
             try:
+                _count_rpc(pollcache)
                 vm = backend.lookupByName(name)
                 connkey = name
 
@@ -255,13 +436,17 @@ def _old_fetch_vms(backend, origmap, build_func):
             except Exception:
                 log.exception("Couldn't fetch domain '%s'", name)
 
+    if state:
+        state.fingerprint = fingerprint
+        state.idmap = dict((connkey, connkey) for connkey in current)
     return (list(origmap.values()), list(new.values()), list(current.values()))
 
 
-def fetch_vms(backend, origmap, build_func):
+def fetch_vms(backend, origmap, build_func, pollcache=None):
     name = "domain"
     if backend.support.conn_listalldomains():
         return _new_poll_helper(origmap, name,
-                                backend.listAllDomains, build_func)
+                                backend.listAllDomains, build_func,
+                                pollcache=pollcache)
     else:
-        return _old_fetch_vms(backend, origmap, build_func)
+        return _old_fetch_vms(backend, origmap, build_func, pollcache)
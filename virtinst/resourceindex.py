@@ -0,0 +1,156 @@
+#
+# Copyright (C) 2026 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import collections
+import threading
+
+
+class _ResourceIndex(object):
+    """
+    Base class for lookup tables built from a connection's fetch_all_*
+    object lists.
+
+    Every sync() is passed the current object list. Objects are tracked
+    by identity: virt-manager hands out a new xmlobj whenever an object's
+    XML changes, and the plain virtinst fetch cache only ever grows, so
+    only added and removed objects need their entries indexed or
+    dropped. Unchanged objects cost nothing beyond a set lookup.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._order = {}
+        self._tables = {}
+
+    def _index_obj(self, obj):
+        """
+        Return a list of (tablename, key, value) entries for obj
+        """
+        raise NotImplementedError()
+
+    def _table(self, tablename):
+        return self._tables.setdefault(tablename,
+                collections.defaultdict(list))
+
+    def _lookup(self, tablename, key):
+        return self._table(tablename).get(key, [])
+
+    def _sort(self, objs):
+        # Report results in the order of the fetch_all_* list, like
+        # a linear scan over it would
+        return sorted(objs, key=lambda o: self._order.get(o, 0))
+
+    def sync(self, objs):
+        with self._lock:
+            self._order = dict((obj, idx) for idx, obj in enumerate(objs))
+
+            for obj in list(self._entries):
+                if obj in self._order:
+                    continue
+                for tablename, key, value in self._entries.pop(obj):
+                    table = self._table(tablename)
+                    table[key].remove(value)
+                    if not table[key]:
+                        del(table[key])
+
+            for obj in objs:
+                if obj in self._entries:
+                    continue
+                entries = self._index_obj(obj)
+                for tablename, key, value in entries:
+                    self._table(tablename)[key].append(value)
+                self._entries[obj] = entries
+
+
+class DomainIndex(_ResourceIndex):
+    """
+    Index of the host resources used by every defined domain
+    """
+    def _index_obj(self, obj):
+        ret = []
+        for path in set([obj.os.kernel, obj.os.initrd, obj.os.dtb]):
+            if path:
+                ret.append(("ospath", path, obj))
+        for disk in obj.devices.disk:
+            if disk.path:
+                ret.append(("diskpath", disk.path,
+                            (obj, disk.shareable, disk.read_only)))
+        for nic in obj.devices.interface:
+            if nic.macaddr:
+                ret.append(("mac", nic.macaddr.lower(), obj))
+        return ret
+
+    def get_path_users(self, path, shareable, read_only, backing_paths):
+        """
+        Return the list of domains using path, following the same
+        rules as DeviceDisk.path_in_use_by
+        """
+        with self._lock:
+            users = set()
+            if not read_only:
+                users.update(self._lookup("ospath", path))
+
+            for backpath in backing_paths:
+                for vm, ignore, ignore in self._lookup("diskpath", backpath):
+                    users.add(vm)
+
+            for vm, vmshareable, vmread_only in self._lookup(
+                    "diskpath", path):
+                if shareable and vmshareable:
+                    continue
+                if read_only and vmread_only:
+                    continue
+                users.add(vm)
+            return self._sort(users)
+
+    def get_mac_users(self, mac):
+        """
+        Return the list of domains with a NIC using the passed MAC
+        """
+        with self._lock:
+            return self._sort(set(self._lookup("mac", mac.lower())))
+
+
+class VolumeIndex(_ResourceIndex):
+    """
+    Index of all storage volumes by target path, plus the graph of
+    backing store relationships
+    """
+    def _index_obj(self, obj):
+        ret = []
+        if obj.target_path:
+            ret.append(("path", obj.target_path, obj))
+        if obj.backing_store:
+            ret.append(("backing", obj.backing_store, obj))
+        return ret
+
+    def get_vol(self, path):
+        """
+        Return the volume with target_path=path, or None
+        """
+        with self._lock:
+            vols = self._sort(self._lookup("path", path))
+            return vols and vols[0] or None
+
+    def get_backed_paths(self, path):
+        """
+        Return the target paths of all volumes that have path somewhere
+        in their backing chain
+        """
+        with self._lock:
+            ret = []
+            seen = set()
+            pending = [path]
+            while pending:
+                backpath = pending.pop(0)
+                for vol in self._sort(self._lookup("backing", backpath)):
+                    if vol in seen:
+                        continue
+                    seen.add(vol)
+                    if vol.target_path:
+                        ret.append(vol.target_path)
+                        pending.append(vol.target_path)
+            return ret
@@ -6,6 +6,7 @@
 
 import os
 import threading
+import weakref
 
 import libvirt
 
@@ -420,6 +421,115 @@ class StoragePool(_StorageObject):
 
 
 
+class _VolumeProgressEntry(object):
+    """
+    A single in-flight volume creation tracked by _VolumeProgressMonitor
+    """
+    def __init__(self, pool, name, meter):
+        self.pool = pool
+        self.name = name
+        self.meter = meter
+        self.vol = None
+        self.allocation = None
+
+
+class _VolumeProgressMonitor(object):
+    """
+    Drives the progress meters for every in-flight StorageVolume.install
+    on a connection from one shared thread, rather than one polling
+    thread per volume.
+
+    Each sweep looks up volumes that haven't appeared yet and calls
+    info() once for every volume that has. The sweep interval is short
+    while volumes are still appearing, backs off while allocations stop
+    changing, and grows with the number of volumes so the total RPC rate
+    against the daemon stays bounded.
+    """
+    MIN_INTERVAL = .2
+    PROGRESS_INTERVAL = 1.0
+    MAX_INTERVAL = 5.0
+    MAX_CALLS_PER_SECOND = 20.0
+
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, conn):
+        with cls._instances_lock:
+            if conn not in cls._instances:
+                cls._instances[conn] = cls()
+            return cls._instances[conn]
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, pool, name, meter):
+        entry = _VolumeProgressEntry(pool, name, meter)
+        with self._lock:
+            self._entries.append(entry)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run,
+                        name="Checking storage allocation")
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup.set()
+        return entry
+
+    def remove(self, entry):
+        """
+        Stop tracking entry. Its meter is never updated after this returns
+        """
+        with self._lock:
+            if entry in self._entries:
+                self._entries.remove(entry)
+        self._wakeup.set()
+
+    def _sweep(self, entries):
+        progressed = False
+        for entry in entries:
+            try:
+                if not entry.vol:
+                    entry.vol = entry.pool.storageVolLookupByName(entry.name)
+                allocation = entry.vol.info()[2]
+            except Exception:
+                # Volume doesn't exist yet, or creation just failed
+                continue
+
+            with self._lock:
+                if entry not in self._entries:
+                    continue
+                if allocation != entry.allocation:
+                    progressed = True
+                entry.allocation = allocation
+                entry.meter.update(allocation)
+        return progressed
+
+    def _run(self):
+        interval = self.MIN_INTERVAL
+        while True:
+            with self._lock:
+                entries = self._entries[:]
+                if not entries:
+                    self._thread = None
+                    return
+
+            progressed = self._sweep(entries)
+            if [e for e in entries if not e.vol]:
+                interval = self.MIN_INTERVAL
+            elif progressed:
+                interval = self.PROGRESS_INTERVAL
+            else:
+                interval = min(interval * 2, self.MAX_INTERVAL)
+            interval = max(interval,
+                           len(entries) / self.MAX_CALLS_PER_SECOND)
+
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+
 class StorageVolume(_StorageObject):
     """
     Base class for building and installing libvirt storage volume xml
@@ -479,8 +589,6 @@ class StorageVolume(_StorageObject):
         self._pool_xml = None
         self._reflink = False
 
-        self._install_finished = threading.Event()
-
 
     ######################
     # Non XML properties #
@@ -642,11 +750,10 @@ class StorageVolume(_StorageObject):
         log.debug("Creating storage volume '%s' with xml:\n%s",
                       self.name, xml)
 
-        t = threading.Thread(target=self._progress_thread,
-                             name="Checking storage allocation",
-                             args=(meter,))
-        t.setDaemon(True)
-
+        monitor = None
+        monitor_entry = None
+        if meter:
+            monitor = _VolumeProgressMonitor.get_instance(self.conn)
         meter = progress.ensure_meter(meter)
 
         cloneflags = 0
@@ -665,10 +772,10 @@ class StorageVolume(_StorageObject):
                 "VIR_STORAGE_VOL_CREATE_REFLINK", 1)
 
         try:
-            self._install_finished.clear()
-            t.start()
             meter.start(size=self.capacity,
                         text=_("Allocating '%s'") % self.name)
+            if monitor:
+                monitor_entry = monitor.add(self.pool, self.name, meter)
 
             if self.conn.is_really_test():
                 # Test suite doesn't support any flags, so reset them
@@ -681,8 +788,8 @@ class StorageVolume(_StorageObject):
                 log.debug("Using vol create flags=%s", createflags)
                 vol = self.pool.createXML(xml, createflags)
 
-            self._install_finished.set()
-            t.join()
+            if monitor_entry:
+                monitor.remove(monitor_entry)
             meter.end(self.capacity)
             log.debug("Storage volume '%s' install complete.", self.name)
             return vol
@@ -690,32 +797,9 @@ class StorageVolume(_StorageObject):
             log.debug("Error creating storage volume", exc_info=True)
             raise RuntimeError("Couldn't create storage volume "
                                "'%s': '%s'" % (self.name, str(e)))
-
-    def _progress_thread(self, meter):
-        vol = None
-        if not meter:
-            return
-
-        while True:
-            try:
-                if not vol:
-                    vol = self.pool.storageVolLookupByName(self.name)
-                vol.info()  # pragma: no cover
-                break  # pragma: no cover
-            except Exception:
-                if self._install_finished.wait(.2):
-                    break
-
-        if vol is None:
-            log.debug("Couldn't lookup storage volume in prog thread.")
-            return
-
-        while True:  # pragma: no cover
-            ignore, ignore, alloc = vol.info()
-            meter.update(alloc)
-            if self._install_finished.wait(1):
-                break
-
+        finally:
+            if monitor_entry:
+                monitor.remove(monitor_entry)
 
     def is_size_conflict(self):
         """
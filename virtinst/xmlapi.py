@@ -81,6 +81,27 @@ class _XPath(object):
         return self.join(self.segments[:-1])
 
 
+# xpath strings used by XMLProperty are static, so parsed _XPath objects
+# can be shared module wide. Cap the size in case a caller generates
+# unbounded unique xpaths
+_XPATH_CACHE = {}
+_XPATH_CACHE_MAX = 20000
+
+
+def _get_xpath(fullxpath):
+    """
+    Return a cached _XPath object for the passed xpath string. The
+    returned object must be treated as read only
+    """
+    ret = _XPATH_CACHE.get(fullxpath)
+    if ret is None:
+        if len(_XPATH_CACHE) >= _XPATH_CACHE_MAX:
+            _XPATH_CACHE.clear()
+        ret = _XPath(fullxpath)
+        _XPATH_CACHE[fullxpath] = ret
+    return ret
+
+
 class _XMLBase(object):
     NAMESPACES = {}
     @classmethod
@@ -134,7 +155,7 @@ class _XMLBase(object):
             return None
         if is_bool:
             return True
-        xpathobj = _XPath(xpath)
+        xpathobj = _get_xpath(xpath)
         if xpathobj.is_prop:
             return self._node_get_property(node, xpathobj.propname)
         return self._node_get_text(node)
@@ -175,7 +196,7 @@ class _XMLBase(object):
         of whether it has children or not, and then clean up the XML
         chain
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _get_xpath(fullxpath)
         parentnode = self._find(xpathobj.parent_xpath())
         childnode = self._find(fullxpath)
         if parentnode is None or childnode is None:
@@ -191,7 +212,7 @@ class _XMLBase(object):
             (expected_root_name, rootname))
 
     def _node_set_content(self, xpath, node, setval):
-        xpathobj = _XPath(xpath)
+        xpathobj = _get_xpath(xpath)
         if setval is not None:
             setval = str(setval)
         if xpathobj.is_prop:
@@ -221,7 +242,7 @@ class _XMLBase(object):
         Even if <bar> didn't exist before. So we fill in the dependent property
         expression values
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _get_xpath(fullxpath)
         parentxpath = "."
         parentnode = self._find(parentxpath)
         xmlutil.raise_programming_error(not parentnode,
@@ -254,7 +275,7 @@ class _XMLBase(object):
         if it doesn't have any children or attributes, so we don't
         leave stale elements in the XML
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _get_xpath(fullxpath)
         segments = xpathobj.segments[:]
         parent = None
         while segments:
@@ -286,6 +307,10 @@ class _Libxml2API(_XMLBase):
         # would take some investigation
         libxml2.keepBlanksDefault(1)
 
+        # Maps normalized xpath -> node (or None). Any change to the
+        # document must call _invalidate_node_cache
+        self._node_cache = {}
+
         self._doc = libxml2.parseDoc(xml)
         self._ctx = self._doc.xpathNewContext()
         self._ctx.setContextNode(self._doc.children)
@@ -296,6 +321,7 @@ class _Libxml2API(_XMLBase):
         if not hasattr(self, "_doc"):
             # Incase we error when parsing the doc
             return
+        self._node_cache = None
         self._doc.freeDoc()
         self._doc = None
         self._ctx.xpathFreeContext()
@@ -309,10 +335,20 @@ class _Libxml2API(_XMLBase):
     def copy_api(self):
         return _Libxml2API(self._doc.children.serialize())
 
+    def _invalidate_node_cache(self):
+        if self._node_cache:
+            self._node_cache = {}
+
     def _find(self, fullxpath):
-        xpath = _XPath(fullxpath).xpath
+        xpath = _get_xpath(fullxpath).xpath
+        try:
+            return self._node_cache[xpath]
+        except KeyError:
+            pass
         node = self._ctx.xpathEval(xpath)
-        return (node and node[0] or None)
+        node = (node and node[0] or None)
+        self._node_cache[xpath] = node
+        return node
 
     def count(self, xpath):
         return len(self._ctx.xpathEval(xpath))
@@ -325,6 +361,7 @@ class _Libxml2API(_XMLBase):
     def _node_get_text(self, node):
         return node.content
     def _node_set_text(self, node, setval):
+        self._invalidate_node_cache()
         if setval is not None:
             setval = xmlutil.xml_escape(setval)
         node.setContent(setval)
@@ -334,6 +371,7 @@ class _Libxml2API(_XMLBase):
         if prop:
             return prop.content
     def _node_set_property(self, node, propname, setval):
+        self._invalidate_node_cache()
         if setval is None:
             prop = node.hasProp(propname)
             if prop:
@@ -364,6 +402,7 @@ class _Libxml2API(_XMLBase):
 
     def node_clear(self, xpath):
         node = self._find(xpath)
+        self._invalidate_node_cache()
         if node:
             propnames = [p.name for p in (node.properties or [])]
             for p in propnames:
@@ -377,6 +416,7 @@ class _Libxml2API(_XMLBase):
         return node.name
 
     def _node_remove_child(self, parentnode, childnode):
+        self._invalidate_node_cache()
         node = childnode
 
         # Look for preceding whitespace and remove it
@@ -392,6 +432,7 @@ class _Libxml2API(_XMLBase):
 
     def _node_add_child(self, parentxpath, parentnode, newnode):
         ignore = parentxpath
+        self._invalidate_node_cache()
         if not node_is_text(parentnode.get_last()):
             prevsib = parentnode.get_prev()
             if node_is_text(prevsib):
@@ -407,6 +448,7 @@ class _Libxml2API(_XMLBase):
 
     def _node_replace_child(self, xpath, newnode):
         oldnode = self._find(xpath)
+        self._invalidate_node_cache()
         oldnode.replaceNode(newnode)
 
 
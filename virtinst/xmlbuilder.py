@@ -134,8 +134,9 @@ class XMLChildProperty(_XMLPropertyBase):
 
 
     def _get(self, xmlbuilder):
-        if self.propname not in xmlbuilder._propstore and not self.is_single:
-            xmlbuilder._propstore[self.propname] = []
+        if self.propname not in xmlbuilder._propstore:
+            # Child objects are only parsed on first access
+            xmlbuilder._parse_child_prop(self)
         return xmlbuilder._propstore[self.propname]
 
     def _fget(self, xmlbuilder):
@@ -486,7 +487,6 @@ class XMLBuilder(object):
                                    relative_object_xpath)
 
         self._validate_xmlbuilder()
-        self._initial_child_parse()
 
     def _validate_xmlbuilder(self):
         # This is one time validation we run once per XMLBuilder class
@@ -511,28 +511,30 @@ class XMLBuilder(object):
 
         setattr(self.__class__, cachekey, True)
 
-    def _initial_child_parse(self):
-        # Walk the XML tree and hand of parsing to any registered
-        # child classes
-        for xmlprop in list(self._all_child_props().values()):
-            child_class = xmlprop.child_class
-            prop_path = xmlprop.get_prop_xpath(self, child_class)
-
-            if xmlprop.is_single:
-                obj = child_class(self.conn,
-                    parentxmlstate=self._xmlstate,
-                    relative_object_xpath=prop_path)
-                xmlprop.set(self, obj)
-                continue
+    def _parse_child_prop(self, xmlprop):
+        # Hand off parsing of the XML subtree to the registered child
+        # class. This is done lazily on first access of the child
+        # property, so callers that only want a few top level values
+        # don't pay for instantiating every device
+        child_class = xmlprop.child_class
+        prop_path = xmlprop.get_prop_xpath(self, child_class)
+
+        if xmlprop.is_single:
+            obj = child_class(self.conn,
+                parentxmlstate=self._xmlstate,
+                relative_object_xpath=prop_path)
+            xmlprop.set(self, obj)
+            return
 
-            nodecount = self._xmlstate.xmlapi.count(
-                self._xmlstate.make_abs_xpath(prop_path))
-            for idx in range(nodecount):
-                idxstr = "[%d]" % (idx + 1)
-                obj = child_class(self.conn,
-                    parentxmlstate=self._xmlstate,
-                    relative_object_xpath=(prop_path + idxstr))
-                xmlprop.append(self, obj)
+        objs = []
+        nodecount = self._xmlstate.xmlapi.count(
+            self._xmlstate.make_abs_xpath(prop_path))
+        for idx in range(nodecount):
+            idxstr = "[%d]" % (idx + 1)
+            objs.append(child_class(self.conn,
+                parentxmlstate=self._xmlstate,
+                relative_object_xpath=(prop_path + idxstr)))
+        xmlprop.set(self, objs)
 
     def __repr__(self):
         return "<%s %s %s>" % (self.__class__.__name__.split(".")[-1],
@@ -630,6 +632,14 @@ class XMLBuilder(object):
         """
         return _PropCache.get_child_props(self)
 
+    def _parsed_child_objs(self, propname):
+        """
+        Return the child objects of the passed XMLChildProperty name, but
+        only if they were already parsed. Unparsed children will be
+        created with correct state whenever they are first accessed.
+        """
+        return xmlutil.listify(self._propstore.get(propname))
+
     def _find_child_prop(self, child_class):
         xmlprops = self._all_child_props()
         ret = None
@@ -651,7 +661,7 @@ class XMLBuilder(object):
         if relative_object_xpath != -1:
             self._xmlstate.set_relative_object_xpath(relative_object_xpath)
         for propname in self._all_child_props():
-            for p in xmlutil.listify(getattr(self, propname, [])):
+            for p in self._parsed_child_objs(propname):
                 p._set_xpaths(self._xmlstate.abs_xpath())
 
     def _set_child_xpaths(self):
@@ -662,7 +672,7 @@ class XMLBuilder(object):
         """
         typecount = {}
         for propname, xmlprop in self._all_child_props().items():
-            for obj in xmlutil.listify(getattr(self, propname)):
+            for obj in self._parsed_child_objs(propname):
                 idxstr = ""
                 if not xmlprop.is_single:
                     class_type = obj.__class__
@@ -681,7 +691,7 @@ class XMLBuilder(object):
         """
         self._xmlstate.parse(*args, **kwargs)
         for propname in self._all_child_props():
-            for p in xmlutil.listify(getattr(self, propname, [])):
+            for p in self._parsed_child_objs(propname):
                 p._parse_with_children(None, self._xmlstate)
 
     def add_child(self, obj, idx=None):
@@ -791,5 +801,6 @@ class XMLBuilder(object):
             if key in xmlprops:
                 xmlprops[key]._set_xml(self, self._propstore[key])
             elif key in childprops:
-                for obj in xmlutil.listify(getattr(self, key)):
+                # Unparsed children can't have any pending changes
+                for obj in self._parsed_child_objs(key):
                     obj._add_parse_bits(self._xmlstate.xmlapi)